@@ -38,6 +38,22 @@ EXTERNAL_CONNECTION_WEB = False
 
 SIMULATION_PAUSE_TIMEOUT = 600
 
+# Run the pay as bid matching in a separate process that reads the order books of the areas
+# from shared memory
+SHARED_MEMORY_MATCHING = False
+
+# Forward orders through all levels of the grid in the tick that they are placed, instead of
+# one level per tick after the min offer / bid age
+SINGLE_TICK_PROPAGATION = False
+
+# Group template devices of the same class and price settings under an area to fleets that
+# share their price update schedule and per tick calculations
+FLEET_MODE = False
+
+# Match new offers of one-sided markets with the demand that the loads registered in the market,
+# instead of notifying every load about every offer
+DEMAND_QUEUE = False
+
 D3A_TEST_RUN = False
 KAFKA_MOCK = False
 
@@ -0,0 +1,57 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from collections import deque
+from time import perf_counter
+
+from d3a.d3a_core.synthetic_grid import create_synthetic_grid
+from d3a.models.area import Area
+
+
+def build_area_tree(area_count, children_per_area, config=None):
+    """Build a grid of area_count areas without strategies, breadth first.
+
+    Every area gets children_per_area children (the last one fewer), that are appended one by
+    one like live events and setups that add areas do.
+    """
+    root = Area("Grid", config=config)
+    parents = deque([root])
+    created_count = 1
+    while created_count < area_count:
+        parent = parents.popleft()
+        for _ in range(min(children_per_area, area_count - created_count)):
+            child = Area(f"Area {created_count}", config=config)
+            child.parent = parent
+            parent.children.append(child)
+            parents.append(child)
+            created_count += 1
+    return root
+
+
+def benchmark_area_tree(area_count, children_per_area, config=None):
+    """Return the time in seconds that building the area tree takes."""
+    start_time = perf_counter()
+    build_area_tree(area_count, children_per_area, config)
+    return perf_counter() - start_time
+
+
+def benchmark_synthetic_grid(options, config=None):
+    """Return the synthetic grid of the options and the time in seconds that creating it
+    takes."""
+    start_time = perf_counter()
+    area = create_synthetic_grid(options, config)
+    return area, perf_counter() - start_time
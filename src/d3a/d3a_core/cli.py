@@ -19,6 +19,7 @@ import logging
 import platform
 import multiprocessing
 import click
+import d3a.constants
 
 from click.types import Choice
 from click_default_group import DefaultGroup
@@ -34,6 +35,12 @@ from d3a.d3a_core.util import IntervalType, read_settings_from_file, \
     update_advanced_settings, convert_str_to_pause_after_interval,\
     DateType, available_simulation_scenarios
 from d3a.d3a_core.simulation import run_simulation
+from d3a.models.myco_matcher.order_flow_replay import (
+    OrderFlowReplay, create_replay_matcher, REPLAY_MATCHERS)
+from d3a.d3a_core.area_tree_benchmark import benchmark_area_tree, benchmark_synthetic_grid
+from d3a.d3a_core.area_serializer import area_to_string
+from d3a.d3a_core.synthetic_grid import (
+    SyntheticGridOptions, SyntheticGridException, parse_device_mix)
 from d3a.constants import TIME_ZONE, DATE_TIME_FORMAT, DATE_FORMAT, TIME_FORMAT
 from d3a_interface.settings_validators import validate_global_settings
 
@@ -97,18 +104,34 @@ _setup_modules = available_simulation_scenarios
               help="Compare alternative pricing schemes")
 @click.option('--enable-external-connection', is_flag=True, default=False,
               help="External Agents interaction to simulation during runtime")
+@click.option('--single-tick-propagation', is_flag=True, default=False,
+              help="Forward offers and bids through all grid levels within one tick")
+@click.option('--fleet-mode', is_flag=True, default=False,
+              help="Group homogeneous template devices of an area to fleets")
+@click.option('--demand-queue', is_flag=True, default=False,
+              help="Match offers of one-sided markets with the registered demand of the loads")
+@click.option('--shared-memory-matching', is_flag=True, default=False,
+              help="Run the pay as bid matching in a separate process over shared memory")
+@click.option('--record-order-flow', type=str, default=None,
+              help="Record all order book mutations to the given binary log file, "
+                   "trades are then not logged as text")
 @click.option('--start-date', type=DateType(DATE_FORMAT),
               default=today(tz=TIME_ZONE).format(DATE_FORMAT), show_default=True,
               help=f"Start date of the Simulation ({DATE_FORMAT})")
 def run(setup_module_name, settings_file, duration, slot_length, tick_length,
         market_count, cloud_coverage, compare_alt_pricing, enable_external_connection, start_date,
-        pause_at, slot_length_realtime, **kwargs):
+        pause_at, slot_length_realtime, shared_memory_matching, single_tick_propagation,
+        fleet_mode, demand_queue, **kwargs):
 
     # Force the multiprocessing start method to be 'fork' on macOS.
     if platform.system() == 'Darwin':
         multiprocessing.set_start_method('fork')
 
     try:
+        d3a.constants.SHARED_MEMORY_MATCHING = shared_memory_matching
+        d3a.constants.SINGLE_TICK_PROPAGATION = single_tick_propagation
+        d3a.constants.FLEET_MODE = fleet_mode
+        d3a.constants.DEMAND_QUEUE = demand_queue
         if settings_file is not None:
             simulation_settings, advanced_settings = read_settings_from_file(settings_file)
             update_advanced_settings(advanced_settings)
@@ -153,3 +176,76 @@ def run(setup_module_name, settings_file, duration, slot_length, tick_length,
 
     except D3AException as ex:
         raise click.BadOptionUsage(ex.args[0])
+
+
+@main.command("replay-order-flow")
+@click.argument("order_flow_file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--matcher", "matcher_name", default="pay_as_bid", show_default=True,
+              help=f"Matcher to replay the order flow with: [{', '.join(REPLAY_MATCHERS)}] "
+                   f"or the dotted path of a BaseMatcher subclass")
+def replay_order_flow(order_flow_file, matcher_name):
+    """Replay a recorded order flow log into a matcher and report its clearing results."""
+    try:
+        matcher = create_replay_matcher(matcher_name)
+    except (ValueError, ImportError, AttributeError) as ex:
+        raise click.BadOptionUsage("matcher", str(ex))
+    results = OrderFlowReplay(matcher).run(order_flow_file)
+    log.info(results.summary())
+
+
+@main.command("bench-area-tree")
+@click.option("--areas", "area_counts", type=int, multiple=True, default=(10000, 100000),
+              show_default=True, help="Number of areas of a benchmarked grid (repeatable)")
+@click.option("--children", "children_per_area", type=int, default=50, show_default=True,
+              help="Number of children of every area")
+def bench_area_tree(area_counts, children_per_area):
+    """Measure how long building grids of the given number of areas takes."""
+    if children_per_area < 1:
+        raise click.BadOptionUsage("children", "Every area needs at least one child")
+    for area_count in area_counts:
+        duration = benchmark_area_tree(area_count, children_per_area)
+        log.info("Built a grid of %s areas in %.3f s", area_count, duration)
+
+
+@main.command("bench-synthetic-grid")
+@click.option("--communities", type=int, default=10, show_default=True,
+              help="Number of communities")
+@click.option("--houses", "houses_per_community", type=int, default=100, show_default=True,
+              help="Number of houses per community")
+@click.option("--depth", type=int, default=3, show_default=True,
+              help="Number of area levels above the devices (2-8)")
+@click.option("--device-mix", default="load=1,pv=1,storage=0.5", show_default=True,
+              help="Average number of devices of each type per house")
+@click.option("--profiles", "profile_count", type=int, default=10, show_default=True,
+              help="Number of parameter variants of each device type")
+@click.option("--seed", type=int, default=0, show_default=True,
+              help="Random seed of the grid")
+@click.option("--output", type=click.Path(dir_okay=False, writable=True), default=None,
+              help="Write the grid as JSON to this file, e.g. for the json_file setup")
+def bench_synthetic_grid(communities, houses_per_community, depth, device_mix, profile_count,
+                         seed, output):
+    """Measure how long creating a synthetic grid takes, and optionally store it.
+
+    The market type is not part of the grid; it is set by the synthetic_grid setup, or by the
+    settings of the simulation that runs the stored grid.
+    """
+    try:
+        options = SyntheticGridOptions(
+            communities=communities, houses_per_community=houses_per_community, depth=depth,
+            device_mix=parse_device_mix(device_mix), profile_count=profile_count, seed=seed)
+        area, duration = benchmark_synthetic_grid(options)
+    except SyntheticGridException as ex:
+        raise click.BadParameter(str(ex))
+    device_count = sum(1 for _ in _iterate_devices(area))
+    log.info("Created a synthetic grid of %s devices in %.3f s", device_count, duration)
+    if output is not None:
+        with open(output, "w") as output_file:
+            output_file.write(area_to_string(area))
+        log.info("Wrote the synthetic grid to %s", output)
+
+
+def _iterate_devices(area):
+    if area.strategy is not None:
+        yield area
+    for child in area.children:
+        yield from _iterate_devices(child)
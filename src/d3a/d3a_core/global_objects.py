@@ -15,7 +15,7 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from d3a.d3a_core.util import find_object_of_same_weekday_and_time
+from d3a.d3a_core.profile_store import find_profile_value
 from d3a.d3a_core.util import get_market_maker_rate_from_config, ExternalTickCounter
 
 
@@ -42,8 +42,7 @@ class ExternalConnectionGlobalStatistics:
         for child in area.children:
             if isinstance(child.strategy, InfiniteBusStrategy):
                 self.current_feed_in_tariff = \
-                    find_object_of_same_weekday_and_time(child.strategy.energy_buy_rate,
-                                                         current_market_slot)
+                    find_profile_value(child.strategy.energy_buy_rate, current_market_slot)
                 return
 
     def buffer_market_maker_rate(self):
@@ -19,6 +19,9 @@ class CreateAreaEvent:
         self.area_representation = area_representation
         self.created_area = area_from_dict(self.area_representation, self.config)
 
+    def target_area(self, area_index):
+        return area_index.areas.get(self.parent_uuid)
+
     def apply(self, area):
         if area.uuid != self.parent_uuid:
             return False
@@ -47,7 +50,18 @@ class UpdateAreaEvent:
         self.area_uuid = area_uuid
         self.area_params = area_params
 
-    def apply(self, area):
+    def target_area(self, area_index):
+        return area_index.areas.get(self.area_uuid)
+
+    def can_merge(self, other):
+        """Return whether the other update can be applied together with this one."""
+        return (isinstance(other, UpdateAreaEvent) and other.area_uuid == self.area_uuid and
+                "type" not in self.area_params and "type" not in other.area_params)
+
+    def merge(self, other):
+        self.area_params.update(other.area_params)
+
+    def apply(self, area, update_prices=True):
         if area.uuid != self.area_uuid:
             return False
         area_type = self.area_params.pop("type", None)
@@ -69,7 +83,10 @@ class UpdateAreaEvent:
                 area.strategy.event_activate()
                 area.strategy.event_market_cycle()
 
-        area.area_reconfigure_event(**self.area_params)
+        area.area_reconfigure_event(update_prices=update_prices, **self.area_params)
+        if area.parent is not None:
+            # The strategy may have been replaced or may have left its fleet
+            area.parent.update_strategy_fleets()
 
         return True
 
@@ -87,11 +104,15 @@ class DeleteAreaEvent:
     def __init__(self, area_uuid):
         self.area_uuid = area_uuid
 
+    def target_area(self, area_index):
+        return area_index.parents.get(self.area_uuid)
+
     def apply(self, area):
         if self.area_uuid not in [c.uuid for c in area.children]:
             return False
 
         area.children = [c for c in area.children if c.uuid != self.area_uuid]
+        area.update_strategy_fleets()
         if len(area.children) == 0:
             area.dispatcher = DispatcherFactory(area)()
         return True
@@ -100,6 +121,62 @@ class DeleteAreaEvent:
         return f"<DeleteAreaEvent - area UUID({self.area_uuid})>"
 
 
+class AreaIndex:
+    """Areas of the grid and their parents by uuid, kept up to date while live events are
+    applied."""
+
+    def __init__(self, root_area):
+        self.areas = {}
+        self.parents = {}
+        self.add(root_area, None)
+
+    def add(self, area, parent):
+        areas = [(area, parent)]
+        while areas:
+            area, parent = areas.pop()
+            self.areas[area.uuid] = area
+            self.parents[area.uuid] = parent
+            areas.extend((child, area) for child in area.children)
+
+    def remove(self, area_uuid):
+        area_uuids = [area_uuid]
+        while area_uuids:
+            area = self.areas.pop(area_uuids.pop(), None)
+            if area is not None:
+                self.parents.pop(area.uuid, None)
+                area_uuids.extend(child.uuid for child in area.children)
+
+    def has_ancestor_in(self, area, area_uuids):
+        parent = self.parents.get(area.uuid)
+        while parent is not None:
+            if parent.uuid in area_uuids:
+                return True
+            parent = self.parents.get(parent.uuid)
+        return False
+
+
+def merge_area_updates(events):
+    """Merge consecutive updates of the same area into one update.
+
+    Updates are only merged while no area is created or deleted in between, and updates that
+    change the type of the area are applied on their own.
+    """
+    merged_events = []
+    pending_updates = {}
+    for event in events:
+        if not isinstance(event, UpdateAreaEvent):
+            pending_updates.clear()
+            merged_events.append(event)
+            continue
+        pending_update = pending_updates.get(event.area_uuid)
+        if pending_update is not None and pending_update.can_merge(event):
+            pending_update.merge(event)
+            continue
+        pending_updates[event.area_uuid] = event
+        merged_events.append(event)
+    return merged_events
+
+
 class LiveEvents:
     def __init__(self, config):
         self.event_buffer = []
@@ -126,24 +203,56 @@ class LiveEvents:
                     self.event_buffer = []
                 raise Exception(e)
 
-    def _handle_event(self, area, event):
+    def handle_all_events(self, root_area):
+        """Apply all buffered events as one batch.
+
+        The target of each event is looked up in an index of the grid, and the prices of the
+        strategies below the reconfigured areas are updated once, after all events were
+        applied.
+        """
+        with self.lock:
+            if not self.event_buffer:
+                return
+            area_index = AreaIndex(root_area)
+            reconfigured_areas = {}
+            for event in merge_area_updates(self.event_buffer):
+                if self._apply_event(area_index, event, reconfigured_areas) is False:
+                    logging.warning(f"Event {event} not applied.")
+            self._update_strategy_prices(area_index, reconfigured_areas)
+            self.event_buffer.clear()
+
+    @staticmethod
+    def _apply_event(area_index, event, reconfigured_areas):
+        area = event.target_area(area_index)
+        if area is None:
+            return False
         try:
-            if event.apply(area) is True:
-                return True
+            if isinstance(event, UpdateAreaEvent):
+                if event.apply(area, update_prices=False) is False:
+                    return False
+                if area.strategy is None:
+                    reconfigured_areas[area.uuid] = area
+            elif event.apply(area) is False:
+                return False
         except Exception as e:
             logging.error(f"Event {event} failed to apply on area {area.name}. "
                           f"Exception: {e}. Traceback: {traceback.format_exc()}")
             return False
-        if not area.children:
-            return False
-        for child in area.children:
-            if self._handle_event(child, event) is True:
-                return True
-        return False
+        # Children and strategies may have changed, as well as the dispatcher of the area
+        area.dispatcher.invalidate_event_routing()
+        if area.parent is not None:
+            area.parent.dispatcher.invalidate_event_routing()
+        if isinstance(event, CreateAreaEvent):
+            area_index.add(event.created_area, area)
+        elif isinstance(event, DeleteAreaEvent):
+            area_index.remove(event.area_uuid)
+        return True
 
-    def handle_all_events(self, root_area):
-        with self.lock:
-            for event in self.event_buffer:
-                if self._handle_event(root_area, event) is False:
-                    logging.warning(f"Event {event} not applied.")
-            self.event_buffer.clear()
+    @staticmethod
+    def _update_strategy_prices(area_index, reconfigured_areas):
+        """Update the strategy prices once per subtree of the reconfigured areas."""
+        for area in reconfigured_areas.values():
+            if area.uuid not in area_index.areas or \
+                    area_index.has_ancestor_in(area, reconfigured_areas):
+                continue
+            area._update_descendants_strategy_prices()
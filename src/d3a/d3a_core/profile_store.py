@@ -0,0 +1,166 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from collections.abc import Mapping
+from datetime import datetime
+from numbers import Real
+from weakref import WeakValueDictionary
+
+import numpy as np
+from d3a_interface.constants_limits import GlobalConfig
+from d3a_interface.read_user_profile import read_arbitrary_profile
+from d3a_interface.utils import find_object_of_same_weekday_and_time
+
+
+class SlotProfile(Mapping):
+    """
+    Read-only time series profile whose values are stored in an array on a regular slot grid.
+
+    Behaves like the {DateTime: value} dicts that read_arbitrary_profile returns, but looks
+    values up by their index on the slot grid. Instances are shared between all devices with
+    the same profile and must therefore never be changed; copies return the same instance.
+    """
+    __slots__ = ("start_timestamp", "slot_length_seconds", "values", "_time_slots",
+                 "__weakref__")
+
+    def __init__(self, time_slots, values, slot_length_seconds):
+        self._time_slots = time_slots
+        self.start_timestamp = time_slots[0].timestamp()
+        self.slot_length_seconds = slot_length_seconds
+        self.values = values
+        self.values.flags.writeable = False
+
+    def _index(self, time_slot):
+        if not isinstance(time_slot, datetime):
+            return None
+        index, remainder = divmod(time_slot.timestamp() - self.start_timestamp,
+                                  self.slot_length_seconds)
+        if remainder != 0 or not 0 <= index < len(self.values):
+            return None
+        return int(index)
+
+    def __getitem__(self, time_slot):
+        index = self._index(time_slot)
+        if index is None:
+            raise KeyError(time_slot)
+        return self.values[index].item()
+
+    def get(self, time_slot, default=None):
+        index = self._index(time_slot)
+        return default if index is None else self.values[index].item()
+
+    def __contains__(self, time_slot):
+        return self._index(time_slot) is not None
+
+    def __iter__(self):
+        return iter(self._time_slots)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __eq__(self, other):
+        if other is self:
+            return True
+        if isinstance(other, SlotProfile):
+            return (self.start_timestamp == other.start_timestamp and
+                    self.slot_length_seconds == other.slot_length_seconds and
+                    np.array_equal(self.values, other.values))
+        return super().__eq__(other)
+
+    __hash__ = None
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}({len(self)} slots from "
+                f"{self._time_slots[0] if self._time_slots else None})")
+
+
+class ProfileStore:
+    """
+    Interns time series profiles, so that identical profiles are only held once.
+
+    Profiles that lie on the slot grid of the simulation and only hold numbers are converted
+    to SlotProfiles. All other profiles are returned unchanged. The store only holds weak
+    references, profiles that are not used by any device anymore are released.
+
+    Profiles that are read from a file or a string are additionally cached by their source,
+    so that devices that use the same profile file only read it once.
+    """
+
+    def __init__(self):
+        self._profiles = WeakValueDictionary()
+        self._read_profiles = WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def intern(self, profile):
+        """Return the shared instance of the profile."""
+        if isinstance(profile, SlotProfile) or not isinstance(profile, dict) or not profile:
+            return profile
+        slot_length_seconds = GlobalConfig.slot_length.total_seconds()
+        time_slots = sorted(profile.keys())
+        if not all(isinstance(time_slot, datetime) for time_slot in time_slots) or \
+                not all(isinstance(value, Real) for value in profile.values()):
+            return profile
+        start_timestamp = time_slots[0].timestamp()
+        if any(time_slot.timestamp() - start_timestamp != index * slot_length_seconds
+               for index, time_slot in enumerate(time_slots)):
+            return profile
+        values = np.array([profile[time_slot] for time_slot in time_slots], dtype=np.float64)
+        key = (start_timestamp, slot_length_seconds, values.tobytes())
+        interned_profile = self._profiles.get(key)
+        if interned_profile is None:
+            interned_profile = SlotProfile(time_slots, values, slot_length_seconds)
+            self._profiles[key] = interned_profile
+        return interned_profile
+
+    def read(self, profile_type, profile):
+        """Read the profile with read_arbitrary_profile and return its shared instance."""
+        if not isinstance(profile, str):
+            return self.intern(read_arbitrary_profile(profile_type, profile))
+        # The read profile depends on the simulation time frame
+        key = (profile_type, profile, GlobalConfig.start_date, GlobalConfig.sim_duration,
+               GlobalConfig.slot_length, GlobalConfig.market_count,
+               GlobalConfig.IS_CANARY_NETWORK)
+        read_profile = self._read_profiles.get(key)
+        if read_profile is None:
+            read_profile = self.intern(read_arbitrary_profile(profile_type, profile))
+            if isinstance(read_profile, SlotProfile):
+                self._read_profiles[key] = read_profile
+        return read_profile
+
+
+def writable_profile(profile):
+    """Return a profile that can be changed, shared SlotProfiles are copied to a dict."""
+    return dict(profile) if isinstance(profile, SlotProfile) else profile
+
+
+def find_profile_value(profile, time_slot):
+    """Look up the value of the profile for the same weekday and time as the time slot.
+
+    Same as find_object_of_same_weekday_and_time, but answered with an index lookup for
+    SlotProfiles outside of the canary network.
+    """
+    if isinstance(profile, SlotProfile) and not GlobalConfig.IS_CANARY_NETWORK:
+        return profile.get(time_slot)
+    return find_object_of_same_weekday_and_time(profile, time_slot)
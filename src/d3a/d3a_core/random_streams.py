@@ -0,0 +1,79 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from hashlib import sha256
+from typing import List, Sequence, TypeVar  # noqa
+
+from numpy.random import Generator, SeedSequence, default_rng
+
+T = TypeVar("T")
+
+
+class RandomStreams:
+    """
+    Independent random number streams for the areas, markets and strategies of a simulation.
+
+    Every stream is derived from the root seed of the simulation and the key of its owner, and
+    not from the order in which the random numbers are drawn. The random numbers that one
+    owner draws therefore stay the same for a given seed, regardless of how often and in which
+    order the other owners draw theirs.
+    """
+
+    def __init__(self, seed=None):
+        self._root = SeedSequence(seed)
+
+    def seed(self, seed=None):
+        """Set the root seed. Streams that were created before keep their sequence."""
+        self._root = SeedSequence(seed)
+
+    def stream(self, key: str) -> Generator:
+        """Return a new random number generator for the given key."""
+        digest = sha256(key.encode("utf-8")).digest()
+        spawn_key = tuple(int.from_bytes(digest[i:i + 4], "little") for i in range(0, 16, 4))
+        return default_rng(SeedSequence(self._root.entropy, spawn_key=spawn_key))
+
+
+random_streams = RandomStreams()
+
+
+class RandomStreamMixin:
+    """Provide the rng attribute, a random number stream that is created on first use."""
+    _rng = None
+
+    @property
+    def random_stream_key(self) -> str:
+        raise NotImplementedError
+
+    @property
+    def rng(self) -> Generator:
+        if self._rng is None:
+            self._rng = random_streams.stream(self.random_stream_key)
+        return self._rng
+
+
+def shuffled(rng: Generator, items: Sequence[T]) -> List[T]:
+    """Return the items in random order, drawn with one permutation instead of a random key
+    per item."""
+    items = list(items)
+    if len(items) < 2:
+        return items
+    return [items[index] for index in rng.permutation(len(items))]
+
+
+def random_choice(rng: Generator, items: Sequence[T]) -> T:
+    """Return a random item of the non-empty sequence."""
+    return items[int(rng.integers(len(items)))]
@@ -34,6 +34,7 @@ from d3a.constants import TIME_ZONE, DATE_TIME_FORMAT, SIMULATION_PAUSE_TIMEOUT
 from d3a.d3a_core.exceptions import SimulationException
 from d3a.d3a_core.export import ExportAndPlot
 from d3a.d3a_core.live_events import LiveEvents
+from d3a.d3a_core.random_streams import random_streams
 from d3a.d3a_core.redis_connections.redis_communication import RedisSimulationCommunication
 from d3a.d3a_core.sim_results.endpoint_buffer import SimulationEndpointBuffer
 from d3a.d3a_core.sim_results.file_export_endpoints import FileExportEndpoints
@@ -43,6 +44,7 @@ from d3a.d3a_core.util import (
     get_market_slot_time_str, is_external_matching_enabled)
 from d3a.models.area.event_deserializer import deserialize_events_to_areas
 from d3a.models.config import SimulationConfig
+from d3a.models.market.order_flow import order_flow_recorder
 from d3a.models.power_flow.pandapower import PandaPowerFlow
 from d3a_interface.constants_limits import ConstSettings, GlobalConfig
 from d3a_interface.exceptions import D3AException
@@ -81,7 +83,7 @@ class Simulation:
                  paused: bool = False, pause_after: duration = None, repl: bool = False,
                  no_export: bool = False, export_path: str = None,
                  export_subdir: str = None, redis_job_id=None, enable_bc=False,
-                 slot_length_realtime=None):
+                 slot_length_realtime=None, record_order_flow: str = None):
         self.initial_params = dict(
             slot_length_realtime=slot_length_realtime,
             seed=seed,
@@ -106,6 +108,7 @@ class Simulation:
         self.setup_module_name = setup_module_name
         self.use_bc = enable_bc
         self.is_stopped = False
+        self.order_flow_path = record_order_flow
 
         self.live_events = LiveEvents(self.simulation_config)
         self.kafka_connection = kafka_connection_factory()
@@ -125,6 +128,10 @@ class Simulation:
 
     def _set_traversal_length(self):
         no_of_levels = self._get_setup_levels(self.area) + 1
+        if d3a.constants.SINGLE_TICK_PROPAGATION:
+            log.info(f'Setup has {no_of_levels} levels, offers/bids propagate to all levels '
+                     f'in the tick they are placed.')
+            return
         num_ticks_to_propagate = no_of_levels * 2
         time_to_propagate_minutes = num_ticks_to_propagate * \
             self.simulation_config.tick_length.seconds / 60.
@@ -157,9 +164,11 @@ class Simulation:
 
         if seed is not None:
             random.seed(int(seed))
+            random_streams.seed(int(seed))
         else:
             random_seed = random.randint(0, RANDOM_SEED_MAX_VALUE)
             random.seed(random_seed)
+            random_streams.seed(random_seed)
             self.initial_params["seed"] = random_seed
             log.info("Random seed: {}".format(random_seed))
 
@@ -187,6 +196,10 @@ class Simulation:
 
         self._set_traversal_length()
 
+        if self.order_flow_path is not None:
+            order_flow_recorder.start(self.order_flow_path,
+                                      self.simulation_config.tick_length.seconds)
+
         self.area.activate(self.bc, simulation_id=redis_job_id)
 
     @property
@@ -394,6 +407,9 @@ class Simulation:
 
         self.sim_status = "finished"
         self.deactivate_areas(self.area)
+        order_flow_recorder.stop()
+        if d3a.constants.SHARED_MEMORY_MATCHING:
+            bid_offer_matcher.match_algorithm.shutdown()
         self.simulation_config.external_redis_communicator.\
             publish_aggregator_commands_responses_events()
         if (self.simulation_config.external_connection_enabled and
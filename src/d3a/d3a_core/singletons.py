@@ -16,8 +16,11 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 from d3a.d3a_core.global_objects import ExternalConnectionGlobalStatistics
+from d3a.d3a_core.profile_store import ProfileStore
 from d3a.models.myco_matcher import MycoMatcher
 
 external_global_statistics = ExternalConnectionGlobalStatistics()
 
 bid_offer_matcher = MycoMatcher()
+
+profile_store = ProfileStore()
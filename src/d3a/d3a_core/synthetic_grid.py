@@ -0,0 +1,197 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+from dataclasses import dataclass, field, fields
+from math import ceil
+from typing import Dict, List  # noqa
+
+from d3a_interface.exceptions import D3AException
+from numpy.random import default_rng
+
+from d3a.models.area import Area
+from d3a.models.strategy.commercial_producer import CommercialStrategy
+from d3a.models.strategy.load_hours import LoadHoursStrategy
+from d3a.models.strategy.pv import PVStrategy
+from d3a.models.strategy.storage import StorageStrategy
+
+ENVIRONMENT_PREFIX = "D3A_SYNTHETIC_GRID_"
+DEVICE_TYPES = ("load", "pv", "storage")
+MIN_DEPTH = 2
+MAX_DEPTH = 8
+
+
+class SyntheticGridException(D3AException):
+    pass
+
+
+def parse_device_mix(device_mix: str) -> Dict[str, float]:
+    """Parse a device mix like 'load=1,pv=0.5,storage=0.2'.
+
+    The value of a device type is the average number of such devices per house. The integer
+    part is placed in every house, the fractional part is the probability of one more device.
+    """
+    result = {}
+    for item in device_mix.split(","):
+        if not item.strip():
+            continue
+        device_type, _, count = item.partition("=")
+        device_type = device_type.strip().lower()
+        if device_type not in DEVICE_TYPES:
+            raise SyntheticGridException(
+                f"Unknown device type '{device_type}', expected one of {DEVICE_TYPES}")
+        try:
+            result[device_type] = float(count)
+        except ValueError:
+            raise SyntheticGridException(f"Invalid device count '{count}' of '{device_type}'")
+        if result[device_type] < 0:
+            raise SyntheticGridException(f"Negative device count of '{device_type}'")
+    return result
+
+
+@dataclass
+class SyntheticGridOptions:
+    """
+    Shape of a synthetic grid.
+
+    depth is the number of area levels above the devices: 2 places the houses directly
+    under the grid, 3 adds the communities, and every further level adds a level of regions
+    that group the communities between the grid and the communities. market_type is not part
+    of the grid, the synthetic_grid setup applies it to the simulation.
+    """
+    communities: int = 10
+    houses_per_community: int = 100
+    depth: int = 3
+    device_mix: Dict[str, float] = field(
+        default_factory=lambda: {"load": 1, "pv": 1, "storage": 0.5})
+    profile_count: int = 10
+    market_type: int = 1
+    seed: int = 0
+
+    def validate(self):
+        if self.communities < 1 or self.houses_per_community < 1:
+            raise SyntheticGridException("A grid needs at least one community and one house")
+        if not MIN_DEPTH <= self.depth <= MAX_DEPTH:
+            raise SyntheticGridException(
+                f"The depth has to be between {MIN_DEPTH} and {MAX_DEPTH}")
+        if self.profile_count < 1:
+            raise SyntheticGridException("At least one profile is needed")
+        if self.market_type not in (1, 2, 3):
+            raise SyntheticGridException(f"Invalid market type {self.market_type}")
+
+    @classmethod
+    def from_environment(cls, environment=None) -> "SyntheticGridOptions":
+        """Read the options from D3A_SYNTHETIC_GRID_<OPTION> environment variables, e.g.
+        D3A_SYNTHETIC_GRID_COMMUNITIES=100."""
+        environment = os.environ if environment is None else environment
+        kwargs = {}
+        for option in fields(cls):
+            value = environment.get(ENVIRONMENT_PREFIX + option.name.upper())
+            if value is None:
+                continue
+            if option.name == "device_mix":
+                kwargs[option.name] = parse_device_mix(value)
+                continue
+            try:
+                kwargs[option.name] = int(value)
+            except ValueError:
+                raise SyntheticGridException(f"Invalid value '{value}' of {option.name}")
+        return cls(**kwargs)
+
+
+class _DeviceProfiles:
+    """Parameter variants of the devices, so that the devices of a grid don't all trade at
+    the same time and with the same energy."""
+
+    def __init__(self, rng, profile_count):
+        self.load = []
+        for _ in range(profile_count):
+            hours_per_day = int(rng.integers(4, 13))
+            first_hour = int(rng.integers(0, 25 - hours_per_day))
+            self.load.append({
+                "avg_power_W": int(rng.integers(1, 11)) * 100,
+                "hrs_per_day": hours_per_day,
+                "hrs_of_day": list(range(first_hour, first_hour + hours_per_day)),
+                "final_buying_rate": int(rng.integers(25, 36))})
+        self.pv = [{"panel_count": int(rng.integers(1, 11)),
+                    "final_selling_rate": int(rng.integers(0, 11))}
+                   for _ in range(profile_count)]
+        self.storage = [{"initial_soc": int(rng.integers(10, 91)),
+                         "battery_capacity_kWh": float(rng.choice([5, 10, 13.5]))}
+                        for _ in range(profile_count)]
+
+    def create_strategy(self, device_type, rng):
+        profiles = getattr(self, device_type)
+        profile = profiles[int(rng.integers(len(profiles)))]
+        if device_type == "load":
+            return LoadHoursStrategy(**profile)
+        elif device_type == "pv":
+            return PVStrategy(**profile)
+        return StorageStrategy(**profile)
+
+
+def _create_house(name, profiles, device_mix, rng):
+    devices = []
+    for device_type, device_count in device_mix.items():
+        count = int(device_count)
+        if rng.random() < device_count - count:
+            count += 1
+        for index in range(1, count + 1):
+            devices.append(Area(f"{name} {device_type.capitalize()} {index}",
+                                strategy=profiles.create_strategy(device_type, rng)))
+    return Area(name, children=devices)
+
+
+def _group_in_regions(areas, levels, name_prefix):
+    """Group the areas in the given number of region levels, with the same number of
+    children on every level."""
+    if levels == 0:
+        return areas
+    children_per_region = max(2, ceil(len(areas) ** (1 / (levels + 1))))
+    regions = []
+    for index in range(0, len(areas), children_per_region):
+        name = f"{name_prefix}{len(regions) + 1}"
+        regions.append(Area(f"Region {name}", children=_group_in_regions(
+            areas[index:index + children_per_region], levels - 1, f"{name}.")))
+    return regions
+
+
+def create_synthetic_grid(options: SyntheticGridOptions, config=None) -> Area:
+    """Create a grid of the shape of the options.
+
+    The devices are template strategy areas, plus a commercial producer under the grid, so
+    the grid can be serialized with area_serializer.area_to_string. The same options create
+    the same grid.
+    """
+    options.validate()
+    rng = default_rng(options.seed)
+    profiles = _DeviceProfiles(rng, options.profile_count)
+    houses_per_community = []  # type: List[List[Area]]
+    for community in range(1, options.communities + 1):
+        houses_per_community.append([
+            _create_house(f"C{community} House {house}", profiles, options.device_mix, rng)
+            for house in range(1, options.houses_per_community + 1)])
+
+    if options.depth == MIN_DEPTH:
+        children = [house for houses in houses_per_community for house in houses]
+    else:
+        communities = [Area(f"Community {index}", children=houses)
+                       for index, houses in enumerate(houses_per_community, 1)]
+        children = _group_in_regions(communities, options.depth - 3, "")
+    children.append(Area("Commercial Energy Producer",
+                         strategy=CommercialStrategy(energy_rate=30)))
+    return Area("Grid", children=children, config=config)
@@ -469,6 +469,18 @@ def short_offer_bid_log_str(offer_or_bid):
     return f"({{{offer_or_bid.id!s:.6s}}}: {offer_or_bid.energy} kWh)"
 
 
+class ShortLogStr:
+    """Log message argument that is formatted with short_offer_bid_log_str, only if the
+    message is emitted."""
+    __slots__ = ("offer_or_bid", )
+
+    def __init__(self, offer_or_bid):
+        self.offer_or_bid = offer_or_bid
+
+    def __str__(self):
+        return short_offer_bid_log_str(self.offer_or_bid)
+
+
 def export_default_settings_to_json_file():
     base_settings = {
             "sim_duration": f"{GlobalConfig.DURATION_D*24}h",
@@ -15,43 +15,82 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from typing import Union, List  # noqa
+from typing import FrozenSet, Union, List  # noqa
 from d3a.events.event_structures import MarketEvent, AreaEvent
 
 
+# Names of the handler methods of the events
+EVENT_HANDLER_NAMES = {
+    AreaEvent.TICK: "event_tick",
+    AreaEvent.MARKET_CYCLE: "event_market_cycle",
+    AreaEvent.BALANCING_MARKET_CYCLE: "event_balancing_market_cycle",
+    AreaEvent.ACTIVATE: "event_activate",
+    MarketEvent.OFFER: "event_offer",
+    MarketEvent.OFFER_SPLIT: "event_offer_split",
+    MarketEvent.OFFER_DELETED: "event_offer_deleted",
+    MarketEvent.TRADE: "event_trade",
+    MarketEvent.BID_TRADED: "event_bid_traded",
+    MarketEvent.BID_DELETED: "event_bid_deleted",
+    MarketEvent.BID_SPLIT: "event_bid_split",
+    MarketEvent.BID: "event_bid",
+    MarketEvent.BALANCING_OFFER: "event_balancing_offer",
+    MarketEvent.BALANCING_OFFER_SPLIT: "event_balancing_offer_split",
+    MarketEvent.BALANCING_OFFER_DELETED: "event_balancing_offer_deleted",
+    MarketEvent.BALANCING_TRADE: "event_balancing_trade",
+}
+
+
 class EventMixin:
 
     def _event_mapping(self, event):
-        if event == AreaEvent.TICK:
-            return self.event_tick
-        elif event == AreaEvent.MARKET_CYCLE:
-            return self.event_market_cycle
-        elif event == AreaEvent.BALANCING_MARKET_CYCLE:
-            return self.event_balancing_market_cycle
-        elif event == AreaEvent.ACTIVATE:
-            return self.event_activate
-        elif event == MarketEvent.OFFER:
-            return self.event_offer
-        elif event == MarketEvent.OFFER_SPLIT:
-            return self.event_offer_split
-        elif event == MarketEvent.OFFER_DELETED:
-            return self.event_offer_deleted
-        elif event == MarketEvent.TRADE:
-            return self.event_trade
-        elif event == MarketEvent.BID_TRADED:
-            return self.event_bid_traded
-        elif event == MarketEvent.BID_DELETED:
-            return self.event_bid_deleted
-        elif event == MarketEvent.BID_SPLIT:
-            return self.event_bid_split
-        elif event == MarketEvent.BALANCING_OFFER:
-            return self.event_balancing_offer
-        elif event == MarketEvent.BALANCING_OFFER_SPLIT:
-            return self.event_balancing_offer_split
-        elif event == MarketEvent.BALANCING_OFFER_DELETED:
-            return self.event_balancing_offer_deleted
-        elif event == MarketEvent.BALANCING_TRADE:
-            return self.event_balancing_trade
+        handler_name = EVENT_HANDLER_NAMES.get(event)
+        return getattr(self, handler_name) if handler_name is not None else None
+
+    @classmethod
+    def handled_event_types(cls) -> FrozenSet[Union[AreaEvent, MarketEvent]]:
+        """Return the event types whose handlers the class implements.
+
+        The handlers of EventMixin do nothing, so events whose handler is not overridden do not
+        need to be delivered to the class. Calculated once per class.
+        """
+        handled_event_types = cls.__dict__.get("_handled_event_types")
+        if handled_event_types is None:
+            handled_event_types = frozenset(
+                event_type for event_type, handler_name in EVENT_HANDLER_NAMES.items()
+                if getattr(cls, handler_name) is not getattr(EventMixin, handler_name))
+            cls._handled_event_types = handled_event_types
+        return handled_event_types
+
+    @classmethod
+    def handled_event_types_without(
+            cls, event_type: Union[AreaEvent, MarketEvent]
+    ) -> FrozenSet[Union[AreaEvent, MarketEvent]]:
+        """Return the handled event types except event_type. Calculated once per class."""
+        event_types_without = cls.__dict__.get("_handled_event_types_without")
+        if event_types_without is None:
+            event_types_without = {}
+            cls._handled_event_types_without = event_types_without
+        handled_event_types = event_types_without.get(event_type)
+        if handled_event_types is None:
+            handled_event_types = cls.handled_event_types() - {event_type}
+            event_types_without[event_type] = handled_event_types
+        return handled_event_types
+
+    def subscribed_event_types(self) -> FrozenSet[Union[AreaEvent, MarketEvent]]:
+        """Return the event types that should be delivered to the listener.
+
+        Defaults to the handled event types, listeners whose handlers do nothing in the current
+        configuration can unsubscribe from their events.
+        """
+        return self.handled_event_types()
+
+    def is_subscribed_to(self, event_type: Union[AreaEvent, MarketEvent]) -> bool:
+        if event_type in self.subscribed_event_types():
+            return True
+        # Handlers that were replaced on the instance receive their events as well
+        instance_attributes = getattr(self, "__dict__", {})
+        return ("event_listener" in instance_attributes or
+                EVENT_HANDLER_NAMES[event_type] in instance_attributes)
 
     def event_listener(self, event_type: Union[AreaEvent, MarketEvent], **kwargs):
         self.log.trace("Dispatching event %s", event_type.name)
@@ -90,6 +129,9 @@ class EventMixin:
     def event_bid_split(self, *, market_id, original_bid, accepted_bid, residual_bid):
         pass
 
+    def event_bid(self, *, market_id, bid):
+        pass
+
     def event_balancing_offer(self, *, market_id, offer):
         pass
 
@@ -102,3 +144,13 @@ class EventMixin:
 
     def event_balancing_trade(self, *, market_id, trade):
         pass
+
+
+def is_subscribed(listener, event_type: Union[AreaEvent, MarketEvent]) -> bool:
+    """Return whether the event should be delivered to the listener.
+
+    Listeners that do not derive from EventMixin receive all events.
+    """
+    if not issubclass(type(listener), EventMixin) or event_type not in EVENT_HANDLER_NAMES:
+        return True
+    return listener.is_subscribed_to(event_type)
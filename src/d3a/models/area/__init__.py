@@ -24,6 +24,7 @@ import d3a.constants
 from cached_property import cached_property
 from d3a.d3a_core.device_registry import DeviceRegistry
 from d3a.d3a_core.exceptions import AreaException
+from d3a.d3a_core.random_streams import RandomStreamMixin
 from d3a.d3a_core.singletons import bid_offer_matcher
 from d3a.d3a_core.util import TaggedLogWrapper, is_external_matching_enabled
 from d3a.events.event_structures import TriggerMixin
@@ -34,10 +35,13 @@ from d3a.models.area.redis_external_market_connection import RedisMarketExternal
 from d3a.models.area.stats import AreaStats
 from d3a.models.area.throughput_parameters import ThroughputParameters
 from d3a.models.config import SimulationConfig
+from d3a.models.market import GridFee
 from d3a.models.market.blockchain_interface import (
     NonBlockchainInterface, SubstrateBlockchainInterface)
+from d3a.models.market.order_flow import order_flow_recorder
 from d3a.models.strategy import BaseStrategy
 from d3a.models.strategy.external_strategies import ExternalMixin
+from d3a.models.strategy.fleet import MIN_FLEET_SIZE, create_strategy_fleets
 from d3a_interface.area_validator import validate_area
 from d3a_interface.constants_limits import ConstSettings, GlobalConfig
 from d3a_interface.utils import key_in_dict_and_not_none
@@ -69,6 +73,8 @@ def check_area_name_exists_in_parent_area(parent_area, name):
     :param name: New name of area
     :return: boolean
     """
+    if isinstance(parent_area.children, AreaChildrenList):
+        return name in parent_area.children.names
     for child in parent_area.children:
         if child.name == name:
             return True
@@ -76,10 +82,28 @@ def check_area_name_exists_in_parent_area(parent_area, name):
 
 
 class AreaChildrenList(list):
+    """
+    Children of an area, whose names have to be unique inside of the parent area.
+
+    The names of the children are kept in a set, so that adding a child doesn't compare its
+    name with all other children. The set is built on first use and dropped on every change
+    of the list that doesn't go through append or insert, and on the renaming of a child.
+    """
+
     def __init__(self, parent_area, *args, **kwargs):
         self.parent_area = parent_area
+        self._names = None
         super(AreaChildrenList, self).__init__(*args, **kwargs)
 
+    @property
+    def names(self):
+        if self._names is None:
+            self._names = {child.name for child in self}
+        return self._names
+
+    def invalidate_names(self):
+        self._names = None
+
     def _validate_before_insertion(self, item):
         if check_area_name_exists_in_parent_area(self.parent_area, item.name):
             raise AreaException("Area name should be unique inside the same Parent Area")
@@ -87,13 +111,47 @@ class AreaChildrenList(list):
     def append(self, item: "Area") -> None:
         self._validate_before_insertion(item)
         super(AreaChildrenList, self).append(item)
+        self.names.add(item.name)
 
     def insert(self, index, item):
         self._validate_before_insertion(item)
         super(AreaChildrenList, self).insert(index, item)
+        self.names.add(item.name)
+
+    def extend(self, items):
+        super(AreaChildrenList, self).extend(items)
+        self._names = None
+
+    def remove(self, item):
+        super(AreaChildrenList, self).remove(item)
+        self._names = None
+
+    def pop(self, *args):
+        self._names = None
+        return super(AreaChildrenList, self).pop(*args)
+
+    def clear(self):
+        super(AreaChildrenList, self).clear()
+        self._names = None
 
+    def __setitem__(self, index, item):
+        super(AreaChildrenList, self).__setitem__(index, item)
+        self._names = None
 
-class Area:
+    def __delitem__(self, index):
+        super(AreaChildrenList, self).__delitem__(index)
+        self._names = None
+
+    def __iadd__(self, items):
+        self._names = None
+        return super(AreaChildrenList, self).__iadd__(items)
+
+
+class Area(RandomStreamMixin):
+    # Incremented on every change of a grid fee or of a parent area, which invalidates the
+    # cached grid fee paths of all areas
+    _grid_fee_version = 0
+    _grid_fee_path = None
 
     def __init__(self, name: str = None, children: List["Area"] = None,
                  uuid: str = None,
@@ -107,8 +165,11 @@ class Area:
                  external_connection_available: bool = False,
                  throughput: ThroughputParameters = ThroughputParameters()
                  ):
-        validate_area(grid_fee_constant=grid_fee_constant,
-                      grid_fee_percentage=grid_fee_percentage)
+        # Areas without grid fees are the vast majority in large grids, and have nothing to
+        # validate
+        if grid_fee_constant is not None or grid_fee_percentage is not None:
+            validate_area(grid_fee_constant=grid_fee_constant,
+                          grid_fee_percentage=grid_fee_percentage)
         self.balancing_spot_trade_ratio = balancing_spot_trade_ratio
         self.active = False
         self.log = TaggedLogWrapper(log, name)
@@ -116,7 +177,6 @@ class Area:
         self.__name = name
         self.throughput = throughput
         self.uuid = uuid if uuid is not None else str(uuid4())
-        self.slug = slugify(name, to_lower=True)
         self.parent = None
         self.children = AreaChildrenList(self, children) if children is not None\
             else AreaChildrenList(self)
@@ -143,6 +203,8 @@ class Area:
             if external_connection_available and self.strategy is None else None
         self.should_update_child_strategies = False
         self.external_connection_available = external_connection_available
+        # Fleets of homogeneous devices among the children, only used in fleet mode
+        self.strategy_fleets = []
 
     @property
     def name(self):
@@ -154,6 +216,49 @@ class Area:
             raise AreaException("Area name should be unique inside the same Parent Area")
 
         self.__name = new_name
+        if self.parent is not None and isinstance(self.parent.children, AreaChildrenList):
+            self.parent.children.invalidate_names()
+
+    @cached_property
+    def slug(self):
+        return slugify(self.name, to_lower=True)
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent):
+        self._parent = parent
+        Area._grid_fee_version += 1
+
+    @property
+    def grid_fee_constant(self):
+        return self._grid_fee_constant
+
+    @grid_fee_constant.setter
+    def grid_fee_constant(self, grid_fee_constant):
+        self._grid_fee_constant = grid_fee_constant
+        Area._grid_fee_version += 1
+
+    @property
+    def grid_fee_percentage(self):
+        return self._grid_fee_percentage
+
+    @grid_fee_percentage.setter
+    def grid_fee_percentage(self, grid_fee_percentage):
+        self._grid_fee_percentage = grid_fee_percentage
+        Area._grid_fee_version += 1
+
+    @property
+    def random_stream_key(self):
+        # Area names are only unique inside of their parent area
+        names = []
+        area = self
+        while area is not None:
+            names.append(area.name)
+            area = area.parent
+        return "area:" + "/".join(reversed(names))
 
     def get_state(self):
         state = {}
@@ -172,8 +277,12 @@ class Area:
         if self.strategy is not None:
             self.strategy.restore_state(saved_state)
 
-    def area_reconfigure_event(self, **kwargs):
-        """Reconfigure the device properties at runtime using the provided arguments."""
+    def area_reconfigure_event(self, update_prices=True, **kwargs):
+        """Reconfigure the device properties at runtime using the provided arguments.
+
+        If update_prices is False, the prices of the descendant strategies are not updated to
+        the new grid fees, the caller has to call _update_descendants_strategy_prices.
+        """
         if self.strategy is not None:
             self.strategy.area_reconfigure_event(**kwargs)
             return True
@@ -217,7 +326,8 @@ class Area:
 
         self._set_grid_fees(grid_fee_constant, grid_fee_percentage)
         self.throughput = throughput
-        self._update_descendants_strategy_prices()
+        if update_prices:
+            self._update_descendants_strategy_prices()
 
     def _update_descendants_strategy_prices(self):
         try:
@@ -241,12 +351,28 @@ class Area:
         self.grid_fee_constant = grid_fee_const
         self.grid_fee_percentage = grid_fee_percentage
 
-    def get_path_to_root_fees(self):
-        if self.parent is not None:
+    def _get_grid_fee_path(self):
+        """Return the grid fees of the area and the sum of the constant fees up to the root.
+
+        The result is cached until any grid fee or parent area of the grid changes.
+        """
+        if self._grid_fee_path is None or self._grid_fee_path[0] != Area._grid_fee_version:
             grid_fee_constant = self.grid_fee_constant if self.grid_fee_constant else 0
-            return grid_fee_constant + self.parent.get_path_to_root_fees()
-        else:
-            return self.grid_fee_constant if self.grid_fee_constant else 0
+            if self.parent is not None:
+                path_to_root_fees = grid_fee_constant + self.parent.get_path_to_root_fees()
+            else:
+                path_to_root_fees = grid_fee_constant
+            grid_fees = GridFee(grid_fee_percentage=self.grid_fee_percentage,
+                                grid_fee_const=self.grid_fee_constant)
+            self._grid_fee_path = (Area._grid_fee_version, grid_fees, path_to_root_fees)
+        return self._grid_fee_path
+
+    @property
+    def grid_fees(self) -> GridFee:
+        return self._get_grid_fee_path()[1]
+
+    def get_path_to_root_fees(self):
+        return self._get_grid_fee_path()[2]
 
     def get_grid_fee(self):
         grid_fee_type = self.config.grid_fee_type \
@@ -258,6 +384,8 @@ class Area:
         self.events = Events(event_list, self)
 
     def activate(self, bc=None, current_tick=None, simulation_id=None):
+        # The strategies of the children may have been replaced and settings changed since
+        self.dispatcher.invalidate_event_routing()
         if current_tick is not None:
             self.current_tick = current_tick
         if bc:
@@ -287,9 +415,30 @@ class Area:
         self.active = True
         self.dispatcher.broadcast_activate(bc=bc, current_tick=self.current_tick,
                                            simulation_id=simulation_id)
+        if d3a.constants.FLEET_MODE and self.children:
+            self.strategy_fleets = create_strategy_fleets(self.children)
         if self.redis_ext_conn is not None:
             self.redis_ext_conn.sub_to_external_channels()
 
+    def update_strategy_fleets(self):
+        """Take the strategies that are no longer the strategy of a child out of the fleets,
+        and dissolve the fleets that have become too small. Has to be called after children
+        were deleted or their strategies were replaced."""
+        if not self.strategy_fleets:
+            return
+        child_strategies = {id(child.strategy) for child in self.children
+                            if child.strategy is not None}
+        strategy_fleets = []
+        for fleet in self.strategy_fleets:
+            for member in list(fleet.members):
+                if id(member) not in child_strategies:
+                    fleet.remove(member)
+            if len(fleet) >= MIN_FLEET_SIZE:
+                strategy_fleets.append(fleet)
+            else:
+                fleet.dissolve()
+        self.strategy_fleets = strategy_fleets
+
     def deactivate(self):
         self.cycle_markets(deactivate=True)
         if self.redis_ext_conn is not None:
@@ -321,6 +470,8 @@ class Area:
             now_value = datetime_at_the_slot_start
 
         self.events.update_events(now_value)
+        # Subscriptions depend on settings, which are checked again once per market slot
+        self.dispatcher.invalidate_event_routing()
 
         if not self.children:
             # Since children trade in markets we only need to populate them if there are any
@@ -392,10 +543,14 @@ class Area:
                 self.dispatcher.publish_market_clearing()
             else:
                 if is_external_matching_enabled():
-                    bid_offer_matcher.match_algorithm.area_uuid_markets_mapping.\
-                        update({self.uuid: self.all_markets})
+                    bid_offer_matcher.match_algorithm.update_area_markets(
+                        self.uuid, self.all_markets)
+                elif d3a.constants.SHARED_MEMORY_MATCHING:
+                    bid_offer_matcher.match_algorithm.match_markets(self.uuid, self.all_markets)
                 else:
                     for market in self.all_markets:
+                        if order_flow_recorder.is_recording:
+                            order_flow_recorder.record_clearing(market)
                         bid_offer_pairs = bid_offer_matcher.calculate_recommendation(
                             *market.open_bids_and_offers, self.now)
                         while bid_offer_pairs:
@@ -15,19 +15,22 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from numpy.random import random
-from typing import Union, Dict  # noqa
+from functools import partial
+from typing import Union, Dict, List  # noqa
 from logging import getLogger
 from pendulum import DateTime  # noqa
 
+from d3a.events import is_subscribed
 from d3a.events.event_structures import MarketEvent, AreaEvent
 from d3a.models.strategy.area_agents.one_sided_agent import OneSidedAgent
 from d3a.models.strategy.area_agents.one_sided_alternative_pricing_agent import \
     OneSidedAlternativePricingAgent
 from d3a.models.strategy.area_agents.two_sided_agent import TwoSidedAgent
 from d3a.models.strategy.area_agents.balancing_agent import BalancingAgent
+from d3a.models.strategy.area_agents.one_sided_engine import IAAEnginePool
 from d3a_interface.constants_limits import ConstSettings
 from d3a.d3a_core.exceptions import WrongMarketTypeException
+from d3a.d3a_core.random_streams import shuffled
 from d3a.d3a_core.util import create_subdict_or_update
 from d3a.models.area.redis_dispatcher.market_event_dispatcher import AreaRedisMarketEventDispatcher
 from d3a.models.area.redis_dispatcher.area_event_dispatcher import RedisAreaEventDispatcher
@@ -46,6 +49,10 @@ class AreaDispatcher:
     def __init__(self, area):
         self._inter_area_agents = {}  # type: Dict[DateTime, Dict[str, OneSidedAgent]]
         self._balancing_agents = {}  # type: Dict[DateTime, Dict[str, BalancingAgent]]
+        # Engines of the agents of past market slots, recycled for the agents of new slots
+        self._engine_pool = IAAEnginePool()
+        # Children whose strategies are subscribed to the market events, per event type
+        self._listening_children = {}  # type: Dict[MarketEvent, List]
         self.area = area
 
     @property
@@ -76,9 +83,12 @@ class AreaDispatcher:
         if not self.area.events.is_enabled and \
            event_type not in [AreaEvent.ACTIVATE, AreaEvent.MARKET_CYCLE]:
             return
-        # Broadcast to children in random order to ensure fairness
-        for child in sorted(self.area.children, key=lambda _: random()):
-            child.dispatcher.event_listener(event_type, **kwargs)
+        if event_type is AreaEvent.TICK and constants.FLEET_MODE and self.area.strategy_fleets:
+            self._broadcast_tick_to_children_and_fleets()
+        else:
+            # Broadcast to children in random order to ensure fairness
+            for child in self._event_listening_children(event_type):
+                child.dispatcher.event_listener(event_type, **kwargs)
         # Also broadcast to IAAs. Again in random order
         for time_slot, agents in self._inter_area_agents.items():
             if time_slot not in self.area._markets.markets:
@@ -87,8 +97,8 @@ class AreaDispatcher:
 
             if not self.area.events.is_connected:
                 break
-            for area_name in sorted(agents, key=lambda _: random()):
-                agents[area_name].event_listener(event_type, **kwargs)
+            for agent in self._event_listening_agents(agents, event_type):
+                agent.event_listener(event_type, **kwargs)
         # Also broadcast to BAs. Again in random order
         # TODO: Refactor to reuse the spot market mechanism
         for time_slot, agents in self._balancing_agents.items():
@@ -98,8 +108,43 @@ class AreaDispatcher:
 
             if not self.area.events.is_connected:
                 break
-            for area_name in sorted(agents, key=lambda _: random()):
-                agents[area_name].event_listener(event_type, **kwargs)
+            for agent in self._event_listening_agents(agents, event_type):
+                agent.event_listener(event_type, **kwargs)
+
+    def invalidate_event_routing(self):
+        """Drop the children that listen to the market events, has to be called after the
+        children, their strategies or the settings that their subscriptions depend on have
+        changed."""
+        self._listening_children = {}
+
+    def _event_listening_children(self, event_type):
+        """Return the children that listen to the event in random order."""
+        # Area events are also handled by the areas themselves, market events are only
+        # delivered to strategies that are subscribed to them
+        if not isinstance(event_type, MarketEvent):
+            return shuffled(self.area.rng, self.area.children)
+        children = self._listening_children.get(event_type)
+        if children is None:
+            children = [child for child in self.area.children
+                        if child.strategy is not None and
+                        is_subscribed(child.strategy, event_type)]
+            self._listening_children[event_type] = children
+        return shuffled(self.area.rng, children)
+
+    def _event_listening_agents(self, agents, event_type):
+        """Return the agents that are subscribed to the event in random order."""
+        return [agents[area_name] for area_name in shuffled(self.area.rng, agents)
+                if is_subscribed(agents[area_name], event_type)]
+
+    def _broadcast_tick_to_children_and_fleets(self):
+        # Members of a fleet are ticked by their fleet, the fleets take part in the random
+        # order of the children as a whole
+        tick_callbacks = [partial(child.dispatcher.event_listener, AreaEvent.TICK)
+                          for child in self.area.children
+                          if child.strategy is None or child.strategy.fleet is None]
+        tick_callbacks.extend(fleet.dispatch_tick for fleet in self.area.strategy_fleets)
+        for tick_callback in shuffled(self.area.rng, tick_callbacks):
+            tick_callback()
 
     def _should_dispatch_to_strategies(self, event_type, **kwargs):
         if event_type is AreaEvent.ACTIVATE:
@@ -116,19 +161,21 @@ class AreaDispatcher:
         elif event_type is AreaEvent.ACTIVATE:
             self.area.activate(**kwargs)
         if self._should_dispatch_to_strategies(event_type, **kwargs):
-            if self.area.strategy:
+            if self.area.strategy and is_subscribed(self.area.strategy, event_type):
                 self.area.strategy.event_listener(event_type, **kwargs)
         elif (not self.area.events.is_enabled or not self.area.events.is_connected) \
                 and event_type == AreaEvent.MARKET_CYCLE and self.area.strategy is not None:
             self.area.strategy.event_on_disabled_area()
 
     @staticmethod
-    def create_agent_object(owner, higher_market, lower_market, is_spot_market):
+    def create_agent_object(owner, higher_market, lower_market, is_spot_market,
+                            engine_pool=None):
         agent_constructor_arguments = {
             "owner": owner,
             "higher_market": higher_market,
             "lower_market": lower_market,
-            "min_offer_age": ConstSettings.IAASettings.MIN_OFFER_AGE
+            "min_offer_age": ConstSettings.IAASettings.MIN_OFFER_AGE,
+            "engine_pool": engine_pool
         }
         if is_spot_market:
             if ConstSettings.IAASettings.MARKET_TYPE == 1:
@@ -166,7 +213,8 @@ class AreaDispatcher:
                 owner=self.area,
                 higher_market=self.area.parent._markets.markets[market.time_slot],
                 lower_market=market,
-                is_spot_market=True
+                is_spot_market=True,
+                engine_pool=self._engine_pool
             )
 
             # Attach agent to own IAA list
@@ -186,7 +234,8 @@ class AreaDispatcher:
                 owner=self.area,
                 higher_market=self.area.parent._markets.balancing_markets[market.time_slot],
                 lower_market=market,
-                is_spot_market=False
+                is_spot_market=False,
+                engine_pool=self._engine_pool
             )
 
             self._balancing_agents = create_subdict_or_update(self._balancing_agents,
@@ -205,17 +254,9 @@ class AreaDispatcher:
                     agent = area_agent_member[pm][area_name]
                     if hasattr(agent, "offers"):
                         del agent.offers
-                    if hasattr(agent, "engines"):
-                        for engine in agent.engines:
-                            del engine.forwarded_offers
-                            del engine.offer_age
-                            del engine.trade_residual
-                            del engine.ignored_offers
-                            if hasattr(engine, "forwarded_bids"):
-                                del engine.forwarded_bids
-                                del engine.bid_age
-                                del engine.bid_trade_residual
-                        del agent.engines
+                    # The agent is listed by the dispatchers of its owner and of the parent,
+                    # the engines are only released once
+                    agent.release_engines()
                     agent.higher_market = None
                     agent.lower_market = None
                 del area_agent_member[pm]
@@ -18,7 +18,6 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from pendulum import DateTime # noqa
 from typing import Dict  # noqa
 
-from d3a.models.market import GridFee
 from d3a.models.market.two_sided import TwoSidedMarket
 from d3a.models.market.one_sided import OneSidedMarket
 from d3a.models.market.balancing import BalancingMarket
@@ -116,12 +115,12 @@ class AreaMarkets:
                     bc=area.bc,
                     notification_listener=area.dispatcher.broadcast_callback,
                     grid_fee_type=area.config.grid_fee_type,
-                    grid_fees=GridFee(grid_fee_percentage=area.grid_fee_percentage,
-                                      grid_fee_const=area.grid_fee_constant),
+                    grid_fees=area.grid_fees,
                     name=area.name,
                     in_sim_duration=is_timeslot_in_simulation_duration(area.config, timeframe)
                 )
 
+                market.area_random_stream_key = area.random_stream_key
                 area.dispatcher.create_area_agents(is_spot_market, market)
                 markets[timeframe] = market
                 changed = True
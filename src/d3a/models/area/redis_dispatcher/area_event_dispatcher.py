@@ -1,7 +1,7 @@
 import json
-from random import random
 from d3a.events import AreaEvent
 from d3a.d3a_core.exceptions import D3ARedisException
+from d3a.d3a_core.random_streams import shuffled
 from d3a.models.area.redis_dispatcher import RedisEventDispatcherBase
 
 
@@ -31,7 +31,7 @@ class RedisAreaEventDispatcher(RedisEventDispatcherBase):
         self.redis.publish(dispatch_chanel, json.dumps(send_data))
 
     def broadcast_event_redis(self, event_type: AreaEvent, **kwargs):
-        for child in sorted(self.area.children, key=lambda _: random()):
+        for child in shuffled(self.area.rng, self.area.children):
             self.publish_area_event(child.uuid, event_type, **kwargs)
             self.redis.wait()
             self.root_dispatcher.market_event_dispatcher.wait_for_futures()
@@ -44,7 +44,7 @@ class RedisAreaEventDispatcher(RedisEventDispatcherBase):
 
             if not self.area.events.is_connected:
                 break
-            for area_name in sorted(agents, key=lambda _: random()):
+            for area_name in shuffled(self.area.rng, agents):
                 agents[area_name].event_listener(event_type, **kwargs)
                 self.root_dispatcher.market_notify_event_dispatcher.wait_for_futures()
 
@@ -1,10 +1,10 @@
 import json
 import logging
-from random import random
 from threading import Event
 from concurrent.futures import TimeoutError, ThreadPoolExecutor
 from d3a.events import MarketEvent
 from d3a.d3a_core.exceptions import D3ARedisException
+from d3a.d3a_core.random_streams import shuffled
 from d3a.constants import MAX_WORKER_THREADS
 from d3a.models.area.redis_dispatcher import RedisEventDispatcherBase
 from d3a.models.market.market_structures import parse_event_and_parameters_from_json_string
@@ -64,7 +64,7 @@ class AreaRedisMarketEventDispatcher(RedisEventDispatcherBase):
         self.redis.publish(dispatch_channel, json.dumps(send_data))
 
     def broadcast_event_redis(self, event_type: MarketEvent, **kwargs):
-        for child in sorted(self.area.children, key=lambda _: random()):
+        for child in shuffled(self.area.rng, self.area.children):
             self.publish_event(child.uuid, event_type, **kwargs)
             self.child_response_events[event_type.value].wait()
             self.child_response_events[event_type.value].clear()
@@ -76,7 +76,7 @@ class AreaRedisMarketEventDispatcher(RedisEventDispatcherBase):
 
             if not self.area.events.is_connected:
                 break
-            for area_name in sorted(agents, key=lambda _: random()):
+            for area_name in shuffled(self.area.rng, agents):
                 agents[area_name].event_listener(event_type, **kwargs)
 
     def publish_response(self, event_type):
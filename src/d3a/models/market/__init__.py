@@ -17,17 +17,18 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import uuid
+from contextlib import contextmanager
 from logging import getLogger
 from typing import Dict, List  # noqa
 
 from d3a.d3a_core.exceptions import InvalidBidOfferPair
-from numpy.random import random
 from collections import namedtuple
 from pendulum import DateTime
 from functools import wraps
 from threading import RLock
 
 from d3a.d3a_core.device_registry import DeviceRegistry
+from d3a.d3a_core.random_streams import RandomStreamMixin, shuffled
 from d3a.constants import FLOATING_POINT_TOLERANCE, DATE_TIME_FORMAT
 from d3a.models.market.market_structures import Offer, Trade, Bid  # noqa
 from d3a.d3a_core.util import add_or_create_key, subtract_or_create_key
@@ -57,12 +58,14 @@ def lock_market_action(function):
     return wrapper
 
 
-class Market:
+class Market(RandomStreamMixin):
 
     def __init__(self, time_slot=None, bc=None, notification_listener=None, readonly=False,
                  grid_fee_type=ConstSettings.IAASettings.GRID_FEE_TYPE,
                  grid_fees: GridFee = None, name=None):
         self.name = name
+        # Set by the area that creates the market
+        self.area_random_stream_key = None
         self.bc_interface = bc
         self.id = str(uuid.uuid4())
         self.time_slot = time_slot
@@ -96,6 +99,8 @@ class Market:
         elif notification_listener:
             self.notification_listeners.append(notification_listener)
         self.current_tick_in_slot = 0
+        # Holds the buffered notifications while a bulk market operation is in progress
+        self._pending_notifications = None
         self.device_registry = DeviceRegistry.REGISTRY
         if ConstSettings.GeneralSettings.EVENT_DISPATCHING_VIA_REDIS:
             self.redis_api = MarketRedisEventSubscriber(self) \
@@ -122,6 +127,13 @@ class Market:
                     grid_fees.grid_fee_percentage / 100
                 )
 
+    @property
+    def random_stream_key(self):
+        # Area names are only unique inside of their parent area, so the key of the area is
+        # used if the market belongs to one
+        area_key = self.area_random_stream_key or self.name
+        return f"market:{area_key}:{self.time_slot_str}:{self.__class__.__name__}"
+
     @property
     def _is_constant_fees(self):
         return isinstance(self.fee_class, ConstantGridFees)
@@ -134,14 +146,52 @@ class Market:
         self.notification_listeners.append(listener)
 
     def _notify_listeners(self, event, **kwargs):
+        if self._pending_notifications is not None:
+            self._pending_notifications.append((event, kwargs))
+            return
         if ConstSettings.GeneralSettings.EVENT_DISPATCHING_VIA_REDIS:
             self.redis_publisher.publish_event(event, **kwargs)
         else:
             # Deliver notifications in random order to ensure fairness
-            for listener in sorted(self.notification_listeners, key=lambda l: random()):
+            for listener in shuffled(self.rng, self.notification_listeners):
+                listener(event, market_id=self.id, **kwargs)
+
+    def _notify_listeners_in_bulk(self, notifications):
+        """Deliver a list of (event, kwargs) notifications in one batch.
+
+        The listener order is shuffled once for the whole batch, and each event reaches all
+        listeners before the next one is delivered, in order to retain the causality of the
+        buffered events (e.g. OFFER_SPLIT before the TRADE of the accepted offer).
+        """
+        if not notifications:
+            return
+        if ConstSettings.GeneralSettings.EVENT_DISPATCHING_VIA_REDIS:
+            for event, kwargs in notifications:
+                self.redis_publisher.publish_event(event, **kwargs)
+            return
+        listeners = shuffled(self.rng, self.notification_listeners)
+        for event, kwargs in notifications:
+            for listener in listeners:
                 listener(event, market_id=self.id, **kwargs)
 
-    def _update_stats_after_trade(self, trade, offer_or_bid, already_tracked=False):
+    @contextmanager
+    def buffered_notifications(self):
+        """Buffer all market notifications of the wrapped block and dispatch them at its end.
+
+        Nested usage is supported; only the outermost block dispatches the notifications.
+        """
+        if self._pending_notifications is not None:
+            yield
+            return
+        self._pending_notifications = []
+        try:
+            yield
+        finally:
+            notifications, self._pending_notifications = self._pending_notifications, None
+            self._notify_listeners_in_bulk(notifications)
+
+    def _update_stats_after_trade(self, trade, offer_or_bid, already_tracked=False,
+                                  update_offer_prices=True):
         # FIXME: The following updates need to be done in response to the BC event
         # TODO: For now event driven blockchain updates have been disabled in favor of a
         #  sequential approach, but once event handling is enabled this needs to be handled
@@ -154,8 +204,9 @@ class Market:
         self.traded_energy = \
             subtract_or_create_key(self.traded_energy, trade.buyer, offer_or_bid.energy)
         self._update_min_max_avg_trade_prices(offer_or_bid.energy_rate)
-        # Recalculate offer min/max price since offer was removed
-        self._update_min_max_avg_offer_prices()
+        if update_offer_prices:
+            # Recalculate offer min/max price since offer was removed
+            self._update_min_max_avg_offer_prices()
 
     def _update_accumulated_trade_price_energy(self, trade):
         self.accumulated_trade_price += trade.offer.price
@@ -27,7 +27,7 @@ from d3a.models.market.market_structures import BalancingOffer, BalancingTrade
 from d3a.d3a_core.exceptions import InvalidOffer, MarketReadOnlyException, \
     OfferNotFoundException, InvalidBalancingTradeException, \
     DeviceNotInRegistryError
-from d3a.d3a_core.util import short_offer_bid_log_str
+from d3a.d3a_core.util import ShortLogStr
 from d3a.d3a_core.device_registry import DeviceRegistry
 from d3a.constants import FLOATING_POINT_TOLERANCE
 from d3a_interface.constants_limits import ConstSettings
@@ -79,7 +79,7 @@ class BalancingMarket(OneSidedMarket):
         self.offers[offer.id] = offer
 
         self.offer_history.append(offer)
-        log.debug(f"[BALANCING_OFFER][NEW][{self.time_slot_str}] {offer}")
+        log.debug("[BALANCING_OFFER][NEW][%s] %s", self.time_slot_str, offer)
         if dispatch_event is True:
             self._notify_listeners(MarketEvent.BALANCING_OFFER, offer=offer)
         return offer
@@ -114,10 +114,9 @@ class BalancingMarket(OneSidedMarket):
                                               adapt_price_with_fees=False,
                                               from_agent=True)
 
-        log.debug(f"[BALANCING_OFFER][SPLIT][{self.time_slot_str}, {self.name}] "
-                  f"({short_offer_bid_log_str(original_offer)} into "
-                  f"{short_offer_bid_log_str(accepted_offer)} and "
-                  f"{short_offer_bid_log_str(residual_offer)}")
+        log.debug("[BALANCING_OFFER][SPLIT][%s, %s] (%s into %s and %s",
+                  self.time_slot_str, self.name, ShortLogStr(original_offer),
+                  ShortLogStr(accepted_offer), ShortLogStr(residual_offer))
 
         self.bc_interface.change_offer(accepted_offer, original_offer, residual_offer)
 
@@ -213,7 +212,7 @@ class BalancingMarket(OneSidedMarket):
 
         if already_tracked is False:
             self._update_stats_after_trade(trade, offer)
-            log.info(f"[BALANCING_TRADE] [{self.time_slot_str}] {trade}")
+            log.info("[BALANCING_TRADE] [%s] %s", self.time_slot_str, trade)
 
         # TODO: Use non-blockchain non-event-driven version for now for both blockchain and
         # normal runs.
@@ -230,7 +229,7 @@ class BalancingMarket(OneSidedMarket):
         self._update_min_max_avg_offer_prices()
         if not offer:
             raise OfferNotFoundException()
-        log.debug(f"[BALANCING_OFFER][DEL][{self.time_slot_str}] {offer}")
+        log.debug("[BALANCING_OFFER][DEL][%s] %s", self.time_slot_str, offer)
         self._notify_listeners(MarketEvent.BALANCING_OFFER_DELETED, offer=offer)
 
     def _update_accumulated_trade_price_energy(self, trade):
@@ -0,0 +1,128 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from logging import getLogger
+from typing import Dict, List, Optional  # noqa
+
+from d3a_interface.constants_limits import ConstSettings
+
+from d3a import constants
+from d3a.constants import DEFAULT_PRECISION, FLOATING_POINT_TOLERANCE
+from d3a.events.event_structures import MarketEvent
+
+log = getLogger(__name__)
+
+
+def is_demand_queue_enabled():
+    """Return True if the one-sided markets match new offers with their demand queue."""
+    return (constants.DEMAND_QUEUE and
+            ConstSettings.IAASettings.MARKET_TYPE == 1 and
+            not ConstSettings.GeneralSettings.EVENT_DISPATCHING_VIA_REDIS)
+
+
+class DemandEntry:
+    __slots__ = ("buyer", "energy_rate", "energy_kWh", "tie_breaker")
+
+    def __init__(self, buyer, energy_rate, energy_kWh, tie_breaker):
+        self.buyer = buyer
+        self.energy_rate = energy_rate
+        self.energy_kWh = energy_kWh
+        # Drawn once per rate, so that buyers that pay the same rate are served in random order
+        self.tie_breaker = tie_breaker
+
+    def __repr__(self):
+        return (f"DemandEntry({self.buyer}, rate={self.energy_rate}, "
+                f"energy={self.energy_kWh} kWh)")
+
+
+class DemandQueue:
+    """
+    Demand of the buyers of a one-sided market, matched against each new offer of the market.
+
+    Buyers register the maximum rate that they are willing to pay and the energy that they
+    still need. The queue listens to the notifications of its market and offers each new
+    offer to the registered buyers in price-priority order (highest rate first, buyers with
+    the same rate in random order), until the offer is bought. Buyers only need to be woken
+    up if they can afford the offer, instead of all buyers reacting to every offer.
+
+    Buyers have to implement accept_queued_offer(market, offer), which buys the offer if it
+    still suits the buyer and updates the registration of the buyer.
+    """
+
+    def __init__(self, market):
+        self.market = market
+        self._entries = {}  # type: Dict[object, DemandEntry]
+        self._sorted_entries = None  # type: Optional[List[DemandEntry]]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, buyer):
+        return buyer in self._entries
+
+    def __repr__(self):
+        return f"<DemandQueue {self.market.time_slot_str} buyers: {len(self._entries)}>"
+
+    def register(self, buyer, energy_rate: float, energy_kWh: float):
+        """Register or update the demand of the buyer."""
+        if energy_kWh <= FLOATING_POINT_TOLERANCE:
+            self.unregister(buyer)
+            return
+        energy_rate = round(energy_rate, DEFAULT_PRECISION)
+        entry = self._entries.get(buyer)
+        if entry is None or entry.energy_rate != energy_rate:
+            self._entries[buyer] = DemandEntry(buyer, energy_rate, energy_kWh,
+                                               self.market.rng.random())
+            self._sorted_entries = None
+        else:
+            entry.energy_kWh = energy_kWh
+
+    def unregister(self, buyer):
+        """Remove the buyer from the queue, e.g. once its energy requirement is met."""
+        if self._entries.pop(buyer, None) is not None:
+            self._sorted_entries = None
+
+    def clear(self):
+        self._entries.clear()
+        self._sorted_entries = None
+
+    @property
+    def sorted_entries(self) -> List[DemandEntry]:
+        """Registered demand, in the order in which the buyers are served."""
+        if self._sorted_entries is None:
+            self._sorted_entries = sorted(
+                self._entries.values(), key=lambda e: (-e.energy_rate, e.tie_breaker))
+        return self._sorted_entries
+
+    def match_offer(self, offer):
+        """Offer the offer to the registered buyers that can afford it, until it is bought."""
+        offer_rate = round(offer.energy_rate, DEFAULT_PRECISION)
+        # Buyers update their registration while buying, so iterate over a snapshot
+        for entry in self.sorted_entries:
+            if offer.id not in self.market.offers:
+                return
+            if entry.energy_rate + FLOATING_POINT_TOLERANCE < offer_rate:
+                # All remaining buyers pay less than the offer rate
+                return
+            if self._entries.get(entry.buyer) is not entry:
+                continue
+            entry.buyer.accept_queued_offer(self.market, offer)
+
+    def __call__(self, event, *, market_id, **kwargs):
+        """Listen to the notifications of the market."""
+        if event is MarketEvent.OFFER and market_id == self.market.id:
+            self.match_offer(kwargs["offer"])
@@ -17,6 +17,10 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 from abc import ABC, abstractmethod
 
+import numpy as np
+
+from d3a.models.market.market_structures import TradeBidOfferInfo
+
 
 class BaseClassGridFees(ABC):
 
@@ -58,3 +62,22 @@ class BaseClassGridFees(ABC):
     @abstractmethod
     def calculate_trade_price_and_fees(self, trade_bid_info):
         pass
+
+    def calculate_trade_price_and_fees_bulk(
+            self, original_bid_rates, propagated_bid_rates,
+            original_offer_rates, propagated_offer_rates, trade_rates):
+        """
+        Vectorized counterpart of calculate_trade_price_and_fees, used when settling a whole
+        list of bid / offer matches at once. All arguments are array-likes of the same length,
+        holding the fields of the TradeBidOfferInfo of each match.
+        Fallback implementation, calculating the fees of each match separately.
+        :return: Tuple of numpy arrays (revenue, grid_fee_rate, trade_rate_incl_fees)
+        """
+        results = [
+            self.calculate_trade_price_and_fees(TradeBidOfferInfo(*rates))
+            for rates in zip(original_bid_rates, propagated_bid_rates,
+                             original_offer_rates, propagated_offer_rates, trade_rates)
+        ]
+        if not results:
+            return np.array([]), np.array([]), np.array([])
+        return tuple(np.array(values, dtype=float) for values in zip(*results))
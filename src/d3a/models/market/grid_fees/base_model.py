@@ -15,6 +15,8 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+import numpy as np
+
 from d3a.models.market.grid_fees import BaseClassGridFees
 from d3a.models.market.market_structures import TradeBidOfferInfo
 
@@ -129,3 +131,20 @@ class GridFees(BaseClassGridFees):
             trade_rate_source=trade_bid_info.trade_rate
         )
         return revenue, grid_fee_rate, trade_price
+
+    def calculate_trade_price_and_fees_bulk(
+            self, original_bid_rates, propagated_bid_rates,
+            original_offer_rates, propagated_offer_rates, trade_rates):
+        original_bid_rates = np.asarray(original_bid_rates, dtype=float)
+        original_offer_rates = np.asarray(original_offer_rates, dtype=float)
+        demand_side_tax = 1 - np.divide(
+            propagated_bid_rates, original_bid_rates,
+            out=np.ones_like(original_bid_rates), where=original_bid_rates != 0)
+        supply_side_tax = np.divide(
+            propagated_offer_rates, original_offer_rates,
+            out=np.ones_like(original_offer_rates), where=original_offer_rates != 0) - 1
+        total_grid_fee_rate = demand_side_tax + supply_side_tax
+        revenue = np.asarray(trade_rates, dtype=float) / (1 + total_grid_fee_rate)
+        grid_fee_rate = revenue * self.grid_fee_rate
+        trade_price = revenue + revenue * supply_side_tax
+        return revenue, grid_fee_rate, trade_price
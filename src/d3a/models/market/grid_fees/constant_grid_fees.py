@@ -15,6 +15,8 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+import numpy as np
+
 from d3a.models.market.grid_fees import BaseClassGridFees
 from d3a.models.market.market_structures import TradeBidOfferInfo
 
@@ -104,3 +106,10 @@ class ConstantGridFees(BaseClassGridFees):
     def calculate_trade_price_and_fees(self, trade_bid_info):
         bid_rate = trade_bid_info.propagated_bid_rate
         return bid_rate - self.grid_fee_rate, self.grid_fee_rate, bid_rate
+
+    def calculate_trade_price_and_fees_bulk(
+            self, original_bid_rates, propagated_bid_rates,
+            original_offer_rates, propagated_offer_rates, trade_rates):
+        bid_rates = np.asarray(propagated_bid_rates, dtype=float)
+        return bid_rates - self.grid_fee_rate, np.full_like(bid_rates, self.grid_fee_rate), \
+            bid_rates
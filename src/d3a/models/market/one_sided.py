@@ -23,9 +23,11 @@ from math import isclose
 from d3a.events.event_structures import MarketEvent
 from d3a.models.market.market_structures import Offer, Trade
 from d3a.models.market import Market, lock_market_action
+from d3a.models.market.demand_queue import DemandQueue, is_demand_queue_enabled
+from d3a.models.market.order_flow import order_flow_recorder
 from d3a.d3a_core.exceptions import InvalidOffer, MarketReadOnlyException, \
     OfferNotFoundException, InvalidTrade, MarketException
-from d3a.d3a_core.util import short_offer_bid_log_str
+from d3a.d3a_core.util import ShortLogStr
 from d3a_interface.constants_limits import ConstSettings
 
 log = getLogger(__name__)
@@ -41,6 +43,10 @@ class OneSidedMarket(Market):
 
         # If True, the current market slot is included in the expected duration of the simulation
         self.in_sim_duration = in_sim_duration
+        self.demand_queue = None
+        if is_demand_queue_enabled():
+            self.demand_queue = DemandQueue(self)
+            self.add_listener(self.demand_queue)
 
     def __repr__(self):  # pragma: no cover
         return "<OneSidedMarket{} offers: {} (E: {} kWh V: {}) trades: {} (E: {} kWh, V: {})>"\
@@ -98,11 +104,13 @@ class OneSidedMarket(Market):
                       seller_id=seller_id)
 
         self.offers[offer.id] = offer
+        if order_flow_recorder.is_recording:
+            order_flow_recorder.record_offer(self, offer)
         if add_to_history is True:
             self.offer_history.append(offer)
             self._update_min_max_avg_offer_prices()
 
-        log.debug(f"[OFFER][NEW][{self.name}][{self.time_slot_str}] {offer}")
+        log.debug("[OFFER][NEW][%s][%s] %s", self.name, self.time_slot_str, offer)
         if dispatch_event is True:
             self.dispatch_market_offer_event(offer)
         return offer
@@ -122,7 +130,9 @@ class OneSidedMarket(Market):
         self._update_min_max_avg_offer_prices()
         if not offer:
             raise OfferNotFoundException()
-        log.debug(f"[OFFER][DEL][{self.name}][{self.time_slot_str}] {offer}")
+        if order_flow_recorder.is_recording:
+            order_flow_recorder.record_offer_deleted(self, offer)
+        log.debug("[OFFER][DEL][%s][%s] %s", self.name, self.time_slot_str, offer)
         # TODO: Once we add event-driven blockchain, this should be asynchronous
         self._notify_listeners(MarketEvent.OFFER_DELETED, offer=offer)
 
@@ -174,12 +184,14 @@ class OneSidedMarket(Market):
                                     adapt_price_with_fees=False,
                                     add_to_history=True)
 
-        log.debug(f"[OFFER][SPLIT][{self.time_slot_str}, {self.name}] "
-                  f"({short_offer_bid_log_str(original_offer)} into "
-                  f"{short_offer_bid_log_str(accepted_offer)} and "
-                  f"{short_offer_bid_log_str(residual_offer)}")
+        log.debug("[OFFER][SPLIT][%s, %s] (%s into %s and %s", self.time_slot_str, self.name,
+                  ShortLogStr(original_offer), ShortLogStr(accepted_offer),
+                  ShortLogStr(residual_offer))
 
         self.bc_interface.change_offer(accepted_offer, original_offer, residual_offer)
+        if order_flow_recorder.is_recording:
+            order_flow_recorder.record_offer_split(
+                self, original_offer, accepted_offer, residual_offer)
 
         self._notify_listeners(
             MarketEvent.OFFER_SPLIT,
@@ -278,10 +290,15 @@ class OneSidedMarket(Market):
                       seller_id=offer.seller_id, buyer_id=buyer_id
                       )
         self.bc_interface.track_trade_event(self.time_slot, trade)
+        if order_flow_recorder.is_recording:
+            order_flow_recorder.record_trade(self, trade)
 
         if already_tracked is False:
             self._update_stats_after_trade(trade, offer)
-            log.info(f"[TRADE] [{self.name}] [{self.time_slot_str}] {trade}")
+            # Recorded trades are part of the binary order flow log, they are not formatted
+            # as text as well
+            if not order_flow_recorder.is_recording:
+                log.info("[TRADE] [%s] [%s] %s", self.name, self.time_slot_str, trade)
 
         # TODO: Use non-blockchain non-event-driven version for now for both blockchain and
         # normal runs.
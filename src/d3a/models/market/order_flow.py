@@ -0,0 +1,257 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import math
+import struct
+from collections import namedtuple
+from enum import IntEnum
+from logging import getLogger
+
+log = getLogger(__name__)
+
+ORDER_FLOW_MAGIC = b"D3AOF"
+ORDER_FLOW_VERSION = 1
+# Flush the in-memory buffer to the log file after this many bytes
+ORDER_FLOW_BUFFER_SIZE = 1 << 20
+
+
+class OrderFlowRecordType(IntEnum):
+    STRING = 1
+    MARKET = 2
+    OFFER = 3
+    BID = 4
+    OFFER_DELETED = 5
+    BID_DELETED = 6
+    OFFER_SPLIT = 7
+    BID_SPLIT = 8
+    TRADE = 9
+    BID_TRADE = 10
+    CLEARING = 11
+
+
+_HEADER = struct.Struct("<5sBI")
+_RECORD_TYPE = struct.Struct("<B")
+_STRING = struct.Struct("<IH")
+_MARKET = struct.Struct("<III")
+# market handle, tick in slot, order id handle, owner handle, energy, price, original price
+_ORDER = struct.Struct("<IIIIddd")
+# market handle, tick in slot, order id handle, energy, price
+_ORDER_UPDATE = struct.Struct("<IIIdd")
+# market handle, tick in slot, original id, accepted id, residual id handles
+_SPLIT = struct.Struct("<IIIII")
+# market handle, tick in slot
+_CLEARING = struct.Struct("<II")
+
+_PAYLOAD_STRUCTS = {
+    OrderFlowRecordType.OFFER: _ORDER,
+    OrderFlowRecordType.BID: _ORDER,
+    OrderFlowRecordType.OFFER_DELETED: _ORDER_UPDATE,
+    OrderFlowRecordType.BID_DELETED: _ORDER_UPDATE,
+    OrderFlowRecordType.TRADE: _ORDER_UPDATE,
+    OrderFlowRecordType.BID_TRADE: _ORDER_UPDATE,
+    OrderFlowRecordType.OFFER_SPLIT: _SPLIT,
+    OrderFlowRecordType.BID_SPLIT: _SPLIT,
+    OrderFlowRecordType.CLEARING: _CLEARING,
+}
+
+RecordedMarket = namedtuple("RecordedMarket", ("name", "time_slot"))
+OrderFlowRecord = namedtuple(
+    "OrderFlowRecord",
+    ("type", "market", "tick", "order_id", "owner", "energy", "price", "original_price",
+     "accepted_id", "residual_id"),
+    defaults=(None, None, None, None, None, None, None))
+
+
+class OrderFlowRecorder:
+    """
+    Record all order book mutations of the markets into a compact binary log.
+
+    The log starts with a header holding the tick length of the simulation, followed by
+    fixed size records. Order ids, area names and market time slots are interned in a string
+    table that is written to the log the first time a string is used, markets are defined
+    once with their name and time slot and referenced by an integer handle afterwards.
+    Offers and bids are recorded every time they are inserted in a market, therefore a split
+    produces the records of the accepted and the residual order, followed by the split record.
+    """
+
+    def __init__(self):
+        self._file = None
+        self._buffer = bytearray()
+        self._strings = {}
+        self._markets = {}
+
+    @property
+    def is_recording(self):
+        return self._file is not None
+
+    def start(self, path, tick_length_seconds):
+        if self.is_recording:
+            self.stop()
+        self._file = open(path, "wb")
+        self._buffer = bytearray(_HEADER.pack(ORDER_FLOW_MAGIC, ORDER_FLOW_VERSION,
+                                              int(tick_length_seconds)))
+        self._strings = {}
+        self._markets = {}
+        log.info(f"Recording order flow to {path}.")
+
+    def stop(self):
+        if not self.is_recording:
+            return
+        self._flush()
+        self._file.close()
+        self._file = None
+        self._strings = {}
+        self._markets = {}
+
+    def _flush(self):
+        self._file.write(self._buffer)
+        self._buffer = bytearray()
+
+    def _append(self, record_type, payload_struct, *values):
+        self._buffer += _RECORD_TYPE.pack(record_type)
+        self._buffer += payload_struct.pack(*values)
+        if len(self._buffer) >= ORDER_FLOW_BUFFER_SIZE:
+            self._flush()
+
+    def _string_handle(self, value):
+        value = "" if value is None else str(value)
+        handle = self._strings.get(value)
+        if handle is None:
+            handle = len(self._strings)
+            self._strings[value] = handle
+            encoded = value.encode("utf-8")
+            self._buffer += _RECORD_TYPE.pack(OrderFlowRecordType.STRING)
+            self._buffer += _STRING.pack(handle, len(encoded))
+            self._buffer += encoded
+        return handle
+
+    def _market_handle(self, market):
+        handle = self._markets.get(market.id)
+        if handle is None:
+            handle = len(self._markets)
+            self._markets[market.id] = handle
+            self._append(OrderFlowRecordType.MARKET, _MARKET, handle,
+                         self._string_handle(market.name),
+                         self._string_handle(market.time_slot_str))
+        return handle
+
+    def _record_order(self, record_type, market, order, owner, original_price):
+        self._append(record_type, _ORDER, self._market_handle(market),
+                     market.current_tick_in_slot, self._string_handle(order.id),
+                     self._string_handle(owner), order.energy, order.price,
+                     math.nan if original_price is None else original_price)
+
+    def _record_order_update(self, record_type, market, order, energy=0., price=0.):
+        self._append(record_type, _ORDER_UPDATE, self._market_handle(market),
+                     market.current_tick_in_slot, self._string_handle(order.id), energy, price)
+
+    def _record_split(self, record_type, market, original, accepted, residual):
+        self._append(record_type, _SPLIT, self._market_handle(market),
+                     market.current_tick_in_slot, self._string_handle(original.id),
+                     self._string_handle(accepted.id), self._string_handle(residual.id))
+
+    def record_offer(self, market, offer):
+        self._record_order(OrderFlowRecordType.OFFER, market, offer,
+                           offer.seller, offer.original_offer_price)
+
+    def record_bid(self, market, bid):
+        self._record_order(OrderFlowRecordType.BID, market, bid,
+                           bid.buyer, bid.original_bid_price)
+
+    def record_offer_deleted(self, market, offer):
+        self._record_order_update(OrderFlowRecordType.OFFER_DELETED, market, offer)
+
+    def record_bid_deleted(self, market, bid):
+        self._record_order_update(OrderFlowRecordType.BID_DELETED, market, bid)
+
+    def record_offer_split(self, market, original_offer, accepted_offer, residual_offer):
+        self._record_split(OrderFlowRecordType.OFFER_SPLIT, market,
+                           original_offer, accepted_offer, residual_offer)
+
+    def record_bid_split(self, market, original_bid, accepted_bid, residual_bid):
+        self._record_split(OrderFlowRecordType.BID_SPLIT, market,
+                           original_bid, accepted_bid, residual_bid)
+
+    def record_trade(self, market, trade):
+        self._record_order_update(OrderFlowRecordType.TRADE, market, trade.offer,
+                                  trade.offer.energy, trade.offer.price)
+
+    def record_bid_trade(self, market, bid_trade):
+        self._record_order_update(OrderFlowRecordType.BID_TRADE, market, bid_trade.offer,
+                                  bid_trade.offer.energy, bid_trade.offer.price)
+
+    def record_clearing(self, market):
+        self._append(OrderFlowRecordType.CLEARING, _CLEARING, self._market_handle(market),
+                     market.current_tick_in_slot)
+
+
+def read_order_flow(path):
+    """
+    Decode an order flow log written by the OrderFlowRecorder.
+
+    :param path: Path of the order flow log
+    :return: Tuple of the tick length in seconds and a generator of OrderFlowRecord objects.
+             String and market definitions are resolved and not yielded.
+    """
+    with open(path, "rb") as order_flow_file:
+        data = order_flow_file.read()
+    magic, version, tick_length_seconds = _HEADER.unpack_from(data, 0)
+    if magic != ORDER_FLOW_MAGIC or version != ORDER_FLOW_VERSION:
+        raise ValueError(f"{path} is not a valid order flow log (version {ORDER_FLOW_VERSION}).")
+    return tick_length_seconds, _decode_records(data, _HEADER.size)
+
+
+def _decode_records(data, offset):
+    strings = []
+    markets = []
+    data_length = len(data)
+    while offset < data_length:
+        record_type = OrderFlowRecordType(data[offset])
+        offset += _RECORD_TYPE.size
+        if record_type == OrderFlowRecordType.STRING:
+            _, length = _STRING.unpack_from(data, offset)
+            offset += _STRING.size
+            strings.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+            continue
+        if record_type == OrderFlowRecordType.MARKET:
+            _, name, time_slot = _MARKET.unpack_from(data, offset)
+            offset += _MARKET.size
+            markets.append(RecordedMarket(strings[name], strings[time_slot]))
+            continue
+
+        payload_struct = _PAYLOAD_STRUCTS[record_type]
+        values = payload_struct.unpack_from(data, offset)
+        offset += payload_struct.size
+        market, tick = markets[values[0]], values[1]
+        if payload_struct is _ORDER:
+            original_price = None if math.isnan(values[6]) else values[6]
+            yield OrderFlowRecord(record_type, market, tick, strings[values[2]],
+                                  owner=strings[values[3]], energy=values[4], price=values[5],
+                                  original_price=original_price)
+        elif payload_struct is _ORDER_UPDATE:
+            yield OrderFlowRecord(record_type, market, tick, strings[values[2]],
+                                  energy=values[3], price=values[4])
+        elif payload_struct is _SPLIT:
+            yield OrderFlowRecord(record_type, market, tick, strings[values[2]],
+                                  accepted_id=strings[values[3]],
+                                  residual_id=strings[values[4]])
+        else:
+            yield OrderFlowRecord(record_type, market, tick)
+
+
+order_flow_recorder = OrderFlowRecorder()
@@ -23,12 +23,16 @@ from typing import Union  # noqa
 
 from d3a_interface.constants_limits import ConstSettings
 
-from d3a.d3a_core.exceptions import BidNotFound, InvalidBid, InvalidTrade, MarketException
-from d3a.d3a_core.util import short_offer_bid_log_str
+from d3a.constants import FLOATING_POINT_TOLERANCE
+from d3a.d3a_core.exceptions import (
+    BidNotFound, InvalidBid, InvalidBidOfferPair, InvalidTrade, MarketException,
+    MarketReadOnlyException, OfferNotFoundException)
+from d3a.d3a_core.util import ShortLogStr
 from d3a.events.event_structures import MarketEvent
 from d3a.models.market import lock_market_action, validate_authentic_bid_offer_pair
 from d3a.models.market.market_structures import Bid, Trade, TradeBidOfferInfo
 from d3a.models.market.one_sided import OneSidedMarket
+from d3a.models.market.order_flow import order_flow_recorder
 
 log = getLogger(__name__)
 
@@ -66,7 +70,8 @@ class TwoSidedMarket(OneSidedMarket):
     @lock_market_action
     def bid(self, price: float, energy: float, buyer: str, buyer_origin,
             bid_id: str = None, original_bid_price=None, adapt_price_with_fees=True,
-            add_to_history=True, buyer_origin_id=None, buyer_id=None) -> Bid:
+            add_to_history=True, buyer_origin_id=None, buyer_id=None,
+            dispatch_event=True) -> Bid:
         if energy <= 0:
             raise InvalidBid()
 
@@ -84,9 +89,13 @@ class TwoSidedMarket(OneSidedMarket):
                   buyer_origin_id=buyer_origin_id, buyer_id=buyer_id)
 
         self.bids[bid.id] = bid
+        if order_flow_recorder.is_recording:
+            order_flow_recorder.record_bid(self, bid)
         if add_to_history is True:
             self.bid_history.append(bid)
-        log.debug(f"[BID][NEW][{self.time_slot_str}] {bid}")
+        log.debug("[BID][NEW][%s] %s", self.time_slot_str, bid)
+        if dispatch_event is True:
+            self._notify_listeners(MarketEvent.BID, bid=bid)
         return bid
 
     @lock_market_action
@@ -96,7 +105,9 @@ class TwoSidedMarket(OneSidedMarket):
         bid = self.bids.pop(bid_or_id, None)
         if not bid:
             raise BidNotFound(bid_or_id)
-        log.debug(f"[BID][DEL][{self.time_slot_str}] {bid}")
+        if order_flow_recorder.is_recording:
+            order_flow_recorder.record_bid_deleted(self, bid)
+        log.debug("[BID][DEL][%s] %s", self.time_slot_str, bid)
         self._notify_listeners(MarketEvent.BID_DELETED, bid=bid)
 
     def split_bid(self, original_bid, energy, orig_bid_price):
@@ -113,7 +124,8 @@ class TwoSidedMarket(OneSidedMarket):
                                 buyer_origin_id=original_bid.buyer_origin_id,
                                 buyer_id=original_bid.buyer_id,
                                 adapt_price_with_fees=False,
-                                add_to_history=False)
+                                add_to_history=False,
+                                dispatch_event=False)
 
         residual_price = (1 - energy / original_bid.energy) * original_bid.price
         residual_energy = original_bid.energy - energy
@@ -129,13 +141,15 @@ class TwoSidedMarket(OneSidedMarket):
                                 buyer_origin_id=original_bid.buyer_origin_id,
                                 buyer_id=original_bid.buyer_id,
                                 adapt_price_with_fees=False,
-                                add_to_history=True)
+                                add_to_history=True,
+                                dispatch_event=False)
 
-        log.debug(f"[BID][SPLIT][{self.time_slot_str}, {self.name}] "
-                  f"({short_offer_bid_log_str(original_bid)} into "
-                  f"{short_offer_bid_log_str(accepted_bid)} and "
-                  f"{short_offer_bid_log_str(residual_bid)}")
+        log.debug("[BID][SPLIT][%s, %s] (%s into %s and %s", self.time_slot_str, self.name,
+                  ShortLogStr(original_bid), ShortLogStr(accepted_bid),
+                  ShortLogStr(residual_bid))
 
+        if order_flow_recorder.is_recording:
+            order_flow_recorder.record_bid_split(self, original_bid, accepted_bid, residual_bid)
         self._notify_listeners(MarketEvent.BID_SPLIT,
                                original_bid=original_bid,
                                accepted_bid=accepted_bid,
@@ -201,10 +215,13 @@ class TwoSidedMarket(OneSidedMarket):
                       buyer_origin_id=bid.buyer_origin_id, seller_id=seller_id,
                       buyer_id=bid.buyer_id
                       )
+        if order_flow_recorder.is_recording:
+            order_flow_recorder.record_bid_trade(self, trade)
 
         if already_tracked is False:
             self._update_stats_after_trade(trade, bid, already_tracked)
-            log.info(f"[TRADE][BID] [{self.name}] [{self.time_slot_str}] {trade}")
+            if not order_flow_recorder.is_recording:
+                log.info("[TRADE][BID] [%s] [%s] %s", self.name, self.time_slot_str, trade)
 
         self._notify_listeners(MarketEvent.BID_TRADED, bid_trade=trade)
         return trade
@@ -237,46 +254,171 @@ class TwoSidedMarket(OneSidedMarket):
     def match_offers_bids(self):
         pass
 
+    @lock_market_action
     def match_recommendation(self, recommended_list):
-        if recommended_list is None:
-            return
-        for index, recommended_pair in enumerate(recommended_list):
+        """Settle a whole list of recommended bid / offer matches in one pass.
+
+        The whole list is validated before the first match is settled, so that an invalid
+        match leaves the market untouched. Partially traded bids and offers are tracked in an
+        id -> residual id mapping instead of rewriting the remainder of the recommendation
+        list, the trade prices and fees of all matches are calculated at once, and the market
+        notifications of the settlement are dispatched in one batch after all matches have
+        been applied.
+        :param recommended_list: List of BidOfferMatch objects
+        :return: List of (bid_trade, trade) tuples, one for each match
+        """
+        if self.readonly:
+            raise MarketReadOnlyException()
+        if not recommended_list:
+            return []
+        self._validate_recommendations(recommended_list)
+
+        trade_bid_infos = [self._trade_bid_info_from_match(recommended_pair)
+                           for recommended_pair in recommended_list]
+        _, grid_fee_rates, trade_rates = self.fee_class.calculate_trade_price_and_fees_bulk(
+            *zip(*((info.original_bid_rate, info.propagated_bid_rate,
+                    info.original_offer_rate, info.propagated_offer_rate, info.trade_rate)
+                   for info in trade_bid_infos)))
+
+        residual_ids = {}
+        trades = []
+        with self.buffered_notifications():
+            try:
+                for recommended_pair, trade_bid_info, grid_fee_rate, trade_rate in zip(
+                        recommended_list, trade_bid_infos,
+                        grid_fee_rates.tolist(), trade_rates.tolist()):
+                    trades.append(self._settle_match(
+                        recommended_pair, trade_bid_info, grid_fee_rate, trade_rate,
+                        residual_ids))
+            finally:
+                # Offer prices are recalculated once for the whole settlement
+                self._update_min_max_avg_offer_prices()
+        return trades
+
+    def _validate_recommendations(self, recommended_list):
+        """Check that all matches can be settled, following the energy that the earlier
+        matches of the list consume from the bids and offers."""
+        remaining_energy = {}
+        for recommended_pair in recommended_list:
+            offer_id = recommended_pair.offer.id
+            bid_id = recommended_pair.bid.id
+            offer = self.offers.get(offer_id)
+            if offer is None:
+                raise OfferNotFoundException(offer_id)
+            bid = self.bids.get(bid_id)
+            if bid is None:
+                raise BidNotFound(f"During bulk settlement: {bid_id}")
 
             selected_energy = recommended_pair.selected_energy
-            bid = recommended_pair.bid
-            offer = recommended_pair.offer
-            original_bid_rate = \
-                bid.original_bid_price / bid.energy
-
-            trade_bid_info = TradeBidOfferInfo(
-                original_bid_rate=original_bid_rate,
-                propagated_bid_rate=bid.price/bid.energy,
-                original_offer_rate=offer.original_offer_price/offer.energy,
-                propagated_offer_rate=offer.price/offer.energy,
-                trade_rate=original_bid_rate)
-
-            bid_trade, trade = self.accept_bid_offer_pair(
-                bid, offer, recommended_pair.trade_rate, trade_bid_info, selected_energy
-            )
-
-            if trade.residual is not None or bid_trade.residual is not None:
-                recommended_list = self._replace_offers_bids_with_residual_in_matching_list(
-                    recommended_list, index+1, trade, bid_trade
-                )
-
-    @classmethod
-    def _replace_offers_bids_with_residual_in_matching_list(
-            cls, matchings, start_index, offer_trade, bid_trade
-    ):
-        def _convert_match_to_residual(match):
-            if match.offer.id == offer_trade.offer.id:
-                assert offer_trade.residual is not None
-                match = replace(match, offer=offer_trade.residual)
-            if match.bid.id == bid_trade.offer.id:
-                assert bid_trade.residual is not None
-                match = replace(match, bid=bid_trade.residual)
-            return match
-
-        matchings[start_index:] = [_convert_match_to_residual(match)
-                                   for match in matchings[start_index:]]
-        return matchings
+            if selected_energy <= 0:
+                raise InvalidTrade("Energy cannot be negative or zero.")
+            validate_authentic_bid_offer_pair(
+                bid, offer, recommended_pair.trade_rate, selected_energy)
+            for order_id, order_energy in ((offer_id, offer.energy), (bid_id, bid.energy)):
+                energy = remaining_energy.get(order_id, order_energy) - selected_energy
+                if energy < -FLOATING_POINT_TOLERANCE:
+                    raise InvalidBidOfferPair(
+                        f"The matches of {order_id} exceed its energy of {order_energy}")
+                remaining_energy[order_id] = energy
+
+    @staticmethod
+    def _trade_bid_info_from_match(recommended_pair):
+        bid = recommended_pair.bid
+        offer = recommended_pair.offer
+        original_bid_rate = bid.original_bid_price / bid.energy
+        return TradeBidOfferInfo(
+            original_bid_rate=original_bid_rate,
+            propagated_bid_rate=bid.price/bid.energy,
+            original_offer_rate=offer.original_offer_price/offer.energy,
+            propagated_offer_rate=offer.price/offer.energy,
+            trade_rate=original_bid_rate)
+
+    @staticmethod
+    def _resolve_residual_id(order_id, residual_ids):
+        while order_id in residual_ids:
+            order_id = residual_ids[order_id]
+        return order_id
+
+    def _settle_match(self, recommended_pair, trade_bid_info, grid_fee_rate, trade_rate,
+                      residual_ids):
+        # The recommendations have been validated, the bids and offers are in the market
+        offer = self.offers[self._resolve_residual_id(recommended_pair.offer.id, residual_ids)]
+        bid = self.bids[self._resolve_residual_id(recommended_pair.bid.id, residual_ids)]
+        selected_energy = min(recommended_pair.selected_energy, offer.energy, bid.energy)
+
+        trade = self._settle_offer(offer, bid, selected_energy, grid_fee_rate, trade_rate,
+                                   trade_bid_info)
+        bid_trade = self._settle_bid(bid, offer, selected_energy, grid_fee_rate, trade_rate,
+                                     trade_bid_info)
+        if trade.residual is not None:
+            residual_ids[offer.id] = trade.residual.id
+        if bid_trade.residual is not None:
+            residual_ids[bid.id] = bid_trade.residual.id
+        return bid_trade, trade
+
+    def _settle_offer(self, offer, bid, energy, grid_fee_rate, trade_rate, trade_bid_info):
+        """Bulk settlement counterpart of accept_offer, using precalculated fees."""
+        if self.readonly:
+            raise MarketReadOnlyException()
+        self.offers.pop(offer.id)
+        if isclose(energy, offer.energy, abs_tol=1e-8):
+            energy = offer.energy
+
+        original_offer = offer
+        residual_offer = None
+        if energy < offer.energy:
+            offer, residual_offer = self.split_offer(
+                offer, energy, self._calculate_original_prices(offer))
+        offer.update_price(energy * trade_rate)
+
+        trade_id, residual_offer = self.bc_interface.handle_blockchain_trade_event(
+            offer, bid.buyer, original_offer, residual_offer)
+        self.offers.pop(offer.id, None)
+
+        trade = Trade(trade_id, self.now, offer, offer.seller, bid.buyer, residual_offer,
+                      offer_bid_trade_info=self.fee_class.
+                      propagate_original_bid_info_on_offer_trade(trade_bid_info),
+                      seller_origin=offer.seller_origin, buyer_origin=bid.buyer_origin,
+                      fee_price=grid_fee_rate * energy, buyer_origin_id=bid.buyer_origin_id,
+                      seller_origin_id=offer.seller_origin_id,
+                      seller_id=offer.seller_id, buyer_id=bid.buyer_id)
+        self.bc_interface.track_trade_event(self.time_slot, trade)
+        if order_flow_recorder.is_recording:
+            order_flow_recorder.record_trade(self, trade)
+
+        if bid.buyer != offer.seller:
+            self._update_stats_after_trade(trade, offer, update_offer_prices=False)
+            if not order_flow_recorder.is_recording:
+                log.info("[TRADE] [%s] [%s] %s", self.name, self.time_slot_str, trade)
+
+        self._notify_listeners(MarketEvent.TRADE, trade=trade)
+        return trade
+
+    def _settle_bid(self, bid, offer, energy, grid_fee_rate, trade_rate, trade_bid_info):
+        """Bulk settlement counterpart of accept_bid, using precalculated fees."""
+        self.bids.pop(bid.id)
+        if isclose(energy, bid.energy, abs_tol=1e-8):
+            energy = bid.energy
+
+        residual_bid = None
+        if energy < bid.energy:
+            orig_price = bid.original_bid_price \
+                if bid.original_bid_price is not None else bid.price
+            bid, residual_bid = self.split_bid(bid, energy, orig_price)
+            self.bids.pop(bid.id)
+        bid = replace(bid, price=energy * trade_rate)
+
+        trade = Trade(str(uuid.uuid4()), self.now, bid, offer.seller,
+                      bid.buyer, residual_bid, already_tracked=True,
+                      offer_bid_trade_info=self.fee_class.
+                      propagate_original_offer_info_on_bid_trade(
+                          trade_bid_info, ignore_fees=True),
+                      buyer_origin=bid.buyer_origin, seller_origin=offer.seller_origin,
+                      fee_price=grid_fee_rate * energy, seller_origin_id=offer.seller_origin_id,
+                      buyer_origin_id=bid.buyer_origin_id, seller_id=offer.seller_id,
+                      buyer_id=bid.buyer_id)
+        if order_flow_recorder.is_recording:
+            order_flow_recorder.record_bid_trade(self, trade)
+
+        self._notify_listeners(MarketEvent.BID_TRADED, bid_trade=trade)
+        return trade
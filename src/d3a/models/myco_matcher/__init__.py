@@ -1,16 +1,25 @@
+import d3a.constants
 from d3a.d3a_core.util import is_external_matching_enabled
 from d3a.models.myco_matcher.external_matcher import ExternalMatcher
 from d3a_interface.constants_limits import ConstSettings
 
 from d3a.models.myco_matcher.pay_as_bid import PayAsBidMatcher
 from d3a.models.myco_matcher.pay_as_clear import PayAsClearMatcher
+from d3a.models.myco_matcher.shared_memory_matcher import SharedMemoryMatcher
 from d3a.d3a_core.exceptions import WrongMarketTypeException
 from d3a_interface.enums import BidOfferMatchAlgoEnum
 
 
 class MycoMatcher:
     def init(self):
-        if ConstSettings.IAASettings.BID_OFFER_MATCH_TYPE == \
+        if d3a.constants.SHARED_MEMORY_MATCHING:
+            if ConstSettings.IAASettings.BID_OFFER_MATCH_TYPE != \
+                    BidOfferMatchAlgoEnum.PAY_AS_BID.value:
+                raise WrongMarketTypeException(
+                    "Shared memory matching only supports the pay as bid match type, not "
+                    f"{ConstSettings.IAASettings.BID_OFFER_MATCH_TYPE}")
+            self.match_algorithm = SharedMemoryMatcher()
+        elif ConstSettings.IAASettings.BID_OFFER_MATCH_TYPE == \
                 BidOfferMatchAlgoEnum.PAY_AS_BID.value:
             self.match_algorithm = PayAsBidMatcher()
         elif ConstSettings.IAASettings.BID_OFFER_MATCH_TYPE == \
@@ -1,14 +1,18 @@
 import json
 import logging
+from math import isfinite
+from numbers import Real
+from threading import Lock
 
 import d3a.constants
+from d3a.constants import FLOATING_POINT_TOLERANCE
 from d3a.d3a_core.exceptions import InvalidBidOfferPair
 from d3a.d3a_core.redis_connections.redis_area_market_communicator import ResettableCommunicator
 from d3a.models.market import validate_authentic_bid_offer_pair
-from d3a.models.market.market_structures import (
-    BidOfferMatch, offer_or_bid_from_json_string)
+from d3a.models.market.market_structures import BidOfferMatch
 
 from d3a.models.myco_matcher.base_matcher import BaseMatcher
+from d3a.models.myco_matcher.order_book_feed import OrderBookFeed
 
 
 class ExternalMatcher(BaseMatcher):
@@ -21,6 +25,9 @@ class ExternalMatcher(BaseMatcher):
         self.area_uuid_markets_mapping = {}
         self.markets_mapping = {}
         self.recommendations = []
+        self.order_book_feed = OrderBookFeed()
+        # The feed is updated and read by the simulation and by the redis callbacks
+        self._order_book_feed_lock = Lock()
 
     def _setup_redis_connection(self):
         self.myco_ext_conn = ResettableCommunicator()
@@ -29,78 +36,155 @@ class ExternalMatcher(BaseMatcher):
              f"{self.channel_prefix}offers-bids/": self.publish_offers_bids,
              f"{self.channel_prefix}post-recommendations/": self.match_recommendations})
 
+    def update_area_markets(self, area_uuid, markets):
+        """Register the current markets of an area, the feed picks them up on its next update."""
+        with self._order_book_feed_lock:
+            for market in self.area_uuid_markets_mapping.get(area_uuid, []):
+                self.markets_mapping.pop(market.id, None)
+            self.area_uuid_markets_mapping[area_uuid] = markets
+            self.markets_mapping.update((market.id, market) for market in markets)
+
+    def _update_order_book_feed(self):
+        """Serialize the changes of the order books since the last update of the feed.
+
+        Called once per tick event of the Myco client, the offers-bids requests are answered
+        with the state of the order books that belongs to the sequence number of the last tick
+        event. Only the changed orders are serialized again.
+        """
+        with self._order_book_feed_lock:
+            self.order_book_feed.update(self.area_uuid_markets_mapping)
+            return self.order_book_feed.sequence_number
+
+    @staticmethod
+    def _validate_offers_bids_request(request):
+        """Return the sequence number and the filters of the request, raise ValueError if
+        they have the wrong type."""
+        sequence_number = request.get("sequence_number")
+        if sequence_number is not None and (
+                isinstance(sequence_number, bool) or not isinstance(sequence_number, int)):
+            raise ValueError(f"Invalid sequence number {sequence_number!r}.")
+        filters = request.get("filters") or {}
+        if not isinstance(filters, dict):
+            raise ValueError(f"Invalid filters {filters!r}.")
+        area_uuids = filters.get("area_uuids")
+        market_ids = filters.get("market_ids")
+        for name, ids in (("area_uuids", area_uuids), ("market_ids", market_ids)):
+            if ids is not None and not isinstance(ids, list):
+                raise ValueError(f"Invalid {name} filter {ids!r}, a list is expected.")
+        return sequence_number, area_uuids, market_ids
+
     def publish_offers_bids(self, message):
         """Publish open offers and bids.
 
-        published data are of the following format
-        market_offers_bids_list_mapping = {"market_id" : {"bids": [], "offers": [] }, }
+        The request can contain the following optional parameters:
+        {"sequence_number": <last sequence number processed by the client>,
+         "filters": {"area_uuids": [], "market_ids": []}}
+        Without a sequence number, or if the requested deltas are not available anymore, a
+        snapshot is published in the following format:
+        {"type": "snapshot", "sequence_number": int,
+         "market_offers_bids_list_mapping": {"market_id" : {"bids": [], "offers": [] }, }}
+        otherwise only the changes that followed the sequence number are published:
+        {"type": "delta", "sequence_number": int, "deltas": [
+            {"sequence_number": int, "finished_markets": [],
+             "markets": {"market_id": {"bids": [], "offers": [], "deleted_bids": [],
+                                       "deleted_offers": []}, }}, ]}
+        Both describe the order books at the last tick event. Requests with parameters of the
+        wrong type are answered with {"status": "fail", "message": str}.
         """
-        # TODO: message can contain filters
-        data = {"event": "offers_bids_response"}
-        market_offers_bids_list_mapping = {}
-        for area_uuid, markets in self.area_uuid_markets_mapping.items():
-            for market in markets:
-                self.markets_mapping[market.id] = market
-                market_offers_bids_list_mapping[market.id] = {"bids": [], "offers": []}
-                bids, offers = market.open_bids_and_offers
-                market_offers_bids_list_mapping[market.id]["bids"].extend(
-                    list(bid.serializable_dict() for bid in bids.values()))
-                market_offers_bids_list_mapping[market.id]["offers"].extend(
-                    list(offer.serializable_dict() for offer in offers.values()))
-        data.update({
-            "market_offers_bids_list_mapping": market_offers_bids_list_mapping,
-        })
-
+        try:
+            request = json.loads(message.get("data")) if message.get("data") else {}
+        except (TypeError, ValueError):
+            request = {}
+        if not isinstance(request, dict):
+            request = {}
         channel = f"{self.channel_prefix}response/offers-bids/"
+        try:
+            sequence_number, area_uuids, market_ids = \
+                self._validate_offers_bids_request(request)
+        except ValueError as ex:
+            self.myco_ext_conn.publish_json(channel, {
+                "event": "offers_bids_response", "status": "fail", "message": str(ex)})
+            return
+
+        with self._order_book_feed_lock:
+            data = {"event": "offers_bids_response",
+                    "sequence_number": self.order_book_feed.sequence_number}
+            deltas = None
+            if sequence_number is not None:
+                deltas = self.order_book_feed.deltas_since(
+                    sequence_number, area_uuids, market_ids)
+            if deltas is None:
+                data.update({
+                    "type": "snapshot",
+                    "market_offers_bids_list_mapping": self.order_book_feed.snapshot(
+                        area_uuids, market_ids),
+                })
+            else:
+                data.update({"type": "delta", "deltas": deltas})
         self.myco_ext_conn.publish_json(channel, data)
 
-    def match_recommendations(self, message):
-        """Receive trade recommendations and match them in the relevant market.
+    def _validate_recommendations(self, recommendations):
+        """Validate a list of recommendations against the live order books in one pass.
 
-        Matching in bulk, any pair that fails validation will cancel the operation
+        The bids and offers are looked up in the markets by id, and the energy that all
+        recommendations of the list select from each bid / offer is accumulated, so that a
+        bid or offer that is overcommitted across records is detected before any trade.
+        Records of finished or unknown markets are skipped.
+        Returns the validated recommendations as {market_id: [BidOfferMatch, ]}.
         """
-        channel = f"{self.channel_prefix}response/matched-recommendations/"
-        response_dict = {"event": "match", "status": "success"}
-        data = json.loads(message.get("data"))
-        recommendations = data.get("recommended_matches", [])
         validated_records = {}
+        committed_energy = {}
         for record in recommendations:
-            market = self.markets_mapping.get(record.get("market_id"), None)
+            if not isinstance(record, dict):
+                raise InvalidBidOfferPair(f"Invalid recommendation {record!r}.")
+            market_id = record.get("market_id")
+            market = self.markets_mapping.get(market_id)
             if market is None or market.readonly:
                 # The market is already finished or doesn't exist
                 continue
+            try:
+                bid = market.bids[record["bid"]["id"]]
+                offer = market.offers[record["offer"]["id"]]
+                selected_energy = record["selected_energy"]
+                trade_rate = record["trade_rate"]
+            except (KeyError, TypeError):
+                # Offer or Bid either don't belong to market or were already matched
+                raise InvalidBidOfferPair(f"Bid or offer of {record} not found in market.")
+            for name, value in (("selected energy", selected_energy),
+                                ("trade rate", trade_rate)):
+                if isinstance(value, bool) or not isinstance(value, Real) or \
+                        not isfinite(value):
+                    raise InvalidBidOfferPair(f"Invalid {name} {value!r}.")
+            if selected_energy <= 0:
+                raise InvalidBidOfferPair(f"Invalid selected energy {selected_energy}.")
+            for order in (bid, offer):
+                energy = committed_energy.get(order.id, 0.) + selected_energy
+                if energy > order.energy + FLOATING_POINT_TOLERANCE:
+                    raise InvalidBidOfferPair(
+                        f"{order} is overcommitted by the recommendations ({energy} kWh).")
+                committed_energy[order.id] = energy
+            validate_authentic_bid_offer_pair(bid, offer, trade_rate, selected_energy)
+            validated_records.setdefault(market_id, []).append(
+                BidOfferMatch(bid, selected_energy, offer, trade_rate))
+        return validated_records
 
-            bid = offer_or_bid_from_json_string(json.dumps(record.get("bid")))
-            offer = offer_or_bid_from_json_string(json.dumps(record.get("offer")),
-                                                  record.get("bid").get("time"))
+    def match_recommendations(self, message):
+        """Receive trade recommendations and match them in the relevant market.
 
-            try:
-                validate_authentic_bid_offer_pair(
-                    bid,
-                    offer,
-                    record.get("trade_rate"),
-                    record.get("selected_energy")
-                    )
-
-                if not (offer.id in market.offers and bid.id in market.bids):
-                    # Offer or Bid either don't belong to market or were already matched
-                    raise InvalidBidOfferPair
-
-                if record.get("market_id") not in validated_records:
-                    validated_records[record.get("market_id")] = []
-
-                validated_records[record.get("market_id")].append(BidOfferMatch(
-                    bid,
-                    record.get("selected_energy"),
-                    offer,
-                    record.get("trade_rate")))
-            except InvalidBidOfferPair as ex:
-                # If validation fails or offer/bid were consumed
-                response_dict["status"] = "fail"
-                response_dict["message"] = "Validation Error"
-                logging.exception(f"Bid offer pair validation failed with error {ex}")
-                break
-        if response_dict["status"] == "success":
+        Matching in bulk, any pair that fails validation will cancel the operation
+        """
+        channel = f"{self.channel_prefix}response/matched-recommendations/"
+        response_dict = {"event": "match", "status": "success"}
+        data = json.loads(message.get("data"))
+        recommendations = data.get("recommended_matches", [])
+        try:
+            validated_records = self._validate_recommendations(recommendations)
+        except InvalidBidOfferPair as ex:
+            # If validation fails or offer/bid were consumed
+            response_dict["status"] = "fail"
+            response_dict["message"] = "Validation Error"
+            logging.exception(f"Bid offer pair validation failed with error {ex}")
+        else:
             for market_id, records in validated_records.items():
                 market = self.markets_mapping.get(market_id)
                 if market.readonly:
@@ -118,8 +202,9 @@ class ExternalMatcher(BaseMatcher):
     def publish_event_tick_myco(self):
         """Publish the tick event to the Myco client."""
 
+        sequence_number = self._update_order_book_feed()
         channel = f"external-myco/{d3a.constants.COLLABORATION_ID}/response/events/"
-        data = {"event": "tick"}
+        data = {"event": "tick", "sequence_number": sequence_number}
         self.myco_ext_conn.publish_json(channel, data)
 
     def publish_market_cycle_myco(self):
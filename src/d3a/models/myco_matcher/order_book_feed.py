@@ -0,0 +1,134 @@
+from collections import deque
+from typing import Dict, List, Optional  # noqa
+
+# Number of deltas that are kept for clients that are catching up on the order book feed
+ORDER_BOOK_FEED_HISTORY_LENGTH = 100
+
+
+class OrderBookFeed:
+    """
+    Sequence-numbered feed of the open offers and bids of the markets of all areas.
+
+    The feed keeps the serialized representation of every open order, and on every update
+    only serializes orders that are new or have changed since the previous update. The
+    changes of an update are stored as a delta that is tagged with a new sequence number, so
+    that a client can request a snapshot once and afterwards only the deltas that followed
+    the last sequence number it has processed.
+    """
+
+    def __init__(self, history_length=ORDER_BOOK_FEED_HISTORY_LENGTH):
+        self.sequence_number = 0
+        # market id -> {"bids": {bid_id: (bid, serialized_bid)}, "offers": {...}}
+        self._orders = {}  # type: Dict[str, Dict[str, Dict]]
+        self._market_areas = {}  # type: Dict[str, str]
+        # (sequence number, {market id: market delta}, {finished market id: area uuid})
+        self._deltas = deque(maxlen=history_length)
+
+    @staticmethod
+    def _order_has_changed(order, cached_order):
+        if cached_order is None:
+            return True
+        cached_object, serialized = cached_order
+        return (order is not cached_object or
+                order.energy != serialized["energy"] or
+                order.energy_rate != serialized["energy_rate"])
+
+    def _update_orders(self, cached_orders, open_orders):
+        updated = []
+        # The order books may be changed by the simulation while the feed is updated from
+        # another thread, iterate over a copy of them
+        open_orders = dict(open_orders)
+        for order_id, order in open_orders.items():
+            cached_order = cached_orders.get(order_id)
+            if self._order_has_changed(order, cached_order):
+                cached_order = (order, order.serializable_dict())
+                cached_orders[order_id] = cached_order
+                updated.append(cached_order[1])
+        deleted = [order_id for order_id in cached_orders if order_id not in open_orders]
+        for order_id in deleted:
+            cached_orders.pop(order_id)
+        return updated, deleted
+
+    def update(self, area_uuid_markets_mapping) -> Optional[Dict]:
+        """
+        Bring the feed up to date with the current order books of the markets.
+
+        :param area_uuid_markets_mapping: Dict of area uuid to list of markets of the area
+        :return: The delta that was added to the feed, None if nothing has changed
+        """
+        markets = {}
+        market_deltas = {}
+        for area_uuid, area_markets in area_uuid_markets_mapping.items():
+            for market in area_markets:
+                markets[market.id] = market
+                self._market_areas[market.id] = area_uuid
+                cached_orders = self._orders.setdefault(market.id, {"bids": {}, "offers": {}})
+                bids, offers = market.open_bids_and_offers
+                updated_bids, deleted_bids = self._update_orders(cached_orders["bids"], bids)
+                updated_offers, deleted_offers = self._update_orders(
+                    cached_orders["offers"], offers)
+                if updated_bids or deleted_bids or updated_offers or deleted_offers:
+                    market_deltas[market.id] = {
+                        "area_uuid": area_uuid,
+                        "bids": updated_bids, "offers": updated_offers,
+                        "deleted_bids": deleted_bids, "deleted_offers": deleted_offers}
+
+        # market id -> area uuid of the markets that have finished since the last update
+        finished_markets = {market_id: self._market_areas.pop(market_id, None)
+                            for market_id in list(self._orders) if market_id not in markets}
+        for market_id in finished_markets:
+            self._orders.pop(market_id)
+
+        if not market_deltas and not finished_markets:
+            return None
+        self.sequence_number += 1
+        self._deltas.append((self.sequence_number, market_deltas, finished_markets))
+        return self._filtered_delta(self._deltas[-1])
+
+    @staticmethod
+    def _is_selected(market_id, area_uuid, area_uuids, market_ids):
+        return ((not area_uuids or area_uuid in area_uuids) and
+                (not market_ids or market_id in market_ids))
+
+    def _filtered_delta(self, delta, area_uuids=None, market_ids=None):
+        sequence_number, market_deltas, finished_markets = delta
+        return {
+            "sequence_number": sequence_number,
+            "markets": {
+                market_id: market_delta
+                for market_id, market_delta in market_deltas.items()
+                if self._is_selected(market_id, market_delta["area_uuid"], area_uuids,
+                                     market_ids)},
+            "finished_markets": [
+                market_id for market_id, area_uuid in finished_markets.items()
+                if self._is_selected(market_id, area_uuid, area_uuids, market_ids)]}
+
+    def snapshot(self, area_uuids=None, market_ids=None) -> Dict:
+        """Return the open offers and bids of all markets that pass the area / market filters.
+
+        Format: {"market_id": {"area_uuid": "", "bids": [], "offers": []}, }
+        """
+        return {
+            market_id: {
+                "area_uuid": self._market_areas[market_id],
+                "bids": [serialized for _, serialized in orders["bids"].values()],
+                "offers": [serialized for _, serialized in orders["offers"].values()]}
+            for market_id, orders in self._orders.items()
+            if self._is_selected(market_id, self._market_areas[market_id], area_uuids,
+                                 market_ids)
+        }
+
+    def deltas_since(self, sequence_number, area_uuids=None, market_ids=None
+                     ) -> Optional[List[Dict]]:
+        """Return all deltas after sequence_number that pass the area / market filters.
+
+        Returns None if the feed does not hold all deltas after sequence_number anymore, in
+        which case the client has to start over from a snapshot.
+        """
+        if sequence_number > self.sequence_number:
+            return None
+        oldest_sequence_number = self.sequence_number - len(self._deltas)
+        if sequence_number < oldest_sequence_number:
+            return None
+        return [self._filtered_delta(delta, area_uuids, market_ids)
+                for delta in self._deltas if delta[0] > sequence_number]
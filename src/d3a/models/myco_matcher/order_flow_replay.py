@@ -0,0 +1,157 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from dataclasses import dataclass, field
+from importlib import import_module
+from logging import getLogger
+from time import perf_counter
+from typing import Dict  # noqa
+
+from pendulum import parse
+
+from d3a.models.market.market_structures import Offer, Bid
+from d3a.models.market.order_flow import OrderFlowRecordType, read_order_flow
+from d3a.models.myco_matcher.base_matcher import BaseMatcher
+from d3a.models.myco_matcher.pay_as_bid import PayAsBidMatcher
+from d3a.models.myco_matcher.pay_as_clear import PayAsClearMatcher
+
+log = getLogger(__name__)
+
+REPLAY_MATCHERS = {
+    "pay_as_bid": PayAsBidMatcher,
+    "pay_as_clear": PayAsClearMatcher,
+}
+
+
+def create_replay_matcher(matcher_name: str) -> BaseMatcher:
+    """Create a matcher from its short name or from the dotted path of a BaseMatcher subclass."""
+    if matcher_name in REPLAY_MATCHERS:
+        return REPLAY_MATCHERS[matcher_name]()
+    module_name, _, class_name = matcher_name.rpartition(".")
+    if not module_name:
+        raise ValueError(f"Unknown matcher {matcher_name}. Available matchers: "
+                         f"{', '.join(REPLAY_MATCHERS)} or the path of a BaseMatcher subclass.")
+    matcher_class = getattr(import_module(module_name), class_name)
+    if not isinstance(matcher_class, type) or not issubclass(matcher_class, BaseMatcher):
+        raise ValueError(f"{matcher_name} is not a BaseMatcher subclass.")
+    return matcher_class()
+
+
+@dataclass
+class ReplayResults:
+    records: int = 0
+    clearings: int = 0
+    recommendations: int = 0
+    recommended_energy_kWh: float = 0.
+    recorded_trades: int = 0
+    recorded_traded_energy_kWh: float = 0.
+    matcher_time_s: float = 0.
+    total_time_s: float = 0.
+    # market name -> time slot -> recommended energy of the replayed matcher
+    recommended_energy_per_market: Dict = field(default_factory=dict)
+
+    @property
+    def clearings_per_second(self):
+        return self.clearings / self.matcher_time_s if self.matcher_time_s else 0.
+
+    @property
+    def records_per_second(self):
+        return self.records / self.total_time_s if self.total_time_s else 0.
+
+    def summary(self):
+        return (f"Replayed {self.records} records ({self.records_per_second:.0f} records/s), "
+                f"{self.clearings} clearings in {self.matcher_time_s:.3f}s matcher time "
+                f"({self.clearings_per_second:.0f} clearings/s). "
+                f"Recommended {self.recommendations} matches "
+                f"({self.recommended_energy_kWh:.4f} kWh), recorded {self.recorded_trades} "
+                f"trades ({self.recorded_traded_energy_kWh:.4f} kWh).")
+
+
+class OrderFlowReplay:
+    """
+    Feed a recorded order flow into a matcher, without running areas or strategies.
+
+    The order books of all recorded markets are rebuilt from the order flow, and the matcher
+    is asked for recommendations at every recorded clearing, on the same books that the
+    recorded matcher has seen. The recommendations are only collected, the recorded trades
+    keep driving the order books, so that the results of different matchers can be compared
+    on identical input.
+    """
+
+    def __init__(self, matcher: BaseMatcher):
+        self.matcher = matcher
+        self._offers = {}  # type: Dict[tuple, Dict[str, Offer]]
+        self._bids = {}  # type: Dict[tuple, Dict[str, Bid]]
+        self._time_slots = {}
+
+    def _current_time(self, market, tick, tick_length_seconds):
+        time_slot = self._time_slots.get(market.time_slot)
+        if time_slot is None:
+            time_slot = parse(market.time_slot)
+            self._time_slots[market.time_slot] = time_slot
+        return time_slot.add(seconds=tick * tick_length_seconds)
+
+    def _clear(self, market, tick, tick_length_seconds, results):
+        bids = self._bids.get(market, {})
+        offers = self._offers.get(market, {})
+        if not bids or not offers:
+            return
+        current_time = self._current_time(market, tick, tick_length_seconds)
+        start_time = perf_counter()
+        recommendations = self.matcher.calculate_match_recommendation(
+            dict(bids), dict(offers), current_time)
+        results.matcher_time_s += perf_counter() - start_time
+        results.clearings += 1
+        if not recommendations:
+            return
+        energy = sum(recommendation.selected_energy for recommendation in recommendations)
+        results.recommendations += len(recommendations)
+        results.recommended_energy_kWh += energy
+        market_energy = results.recommended_energy_per_market.setdefault(market.name, {})
+        market_energy[market.time_slot] = market_energy.get(market.time_slot, 0.) + energy
+
+    def run(self, order_flow_path) -> ReplayResults:
+        results = ReplayResults()
+        self._offers = {}
+        self._bids = {}
+        start_time = perf_counter()
+        tick_length_seconds, records = read_order_flow(order_flow_path)
+        for record in records:
+            results.records += 1
+            record_type = record.type
+            if record_type == OrderFlowRecordType.OFFER:
+                self._offers.setdefault(record.market, {})[record.order_id] = Offer(
+                    record.order_id, None, record.price, record.energy, record.owner,
+                    record.original_price)
+            elif record_type == OrderFlowRecordType.BID:
+                self._bids.setdefault(record.market, {})[record.order_id] = Bid(
+                    record.order_id, None, record.price, record.energy, record.owner,
+                    record.original_price)
+            elif record_type in (OrderFlowRecordType.OFFER_DELETED, OrderFlowRecordType.TRADE):
+                self._offers.get(record.market, {}).pop(record.order_id, None)
+                if record_type == OrderFlowRecordType.TRADE:
+                    results.recorded_trades += 1
+                    results.recorded_traded_energy_kWh += record.energy
+            elif record_type in (OrderFlowRecordType.BID_DELETED,
+                                 OrderFlowRecordType.BID_TRADE):
+                self._bids.get(record.market, {}).pop(record.order_id, None)
+            elif record_type == OrderFlowRecordType.CLEARING:
+                self._clear(record.market, record.tick, tick_length_seconds, results)
+            # Split records need no handling, since the accepted and residual orders of a split
+            # are recorded as separate offers / bids
+        results.total_time_s = perf_counter() - start_time
+        return results
@@ -0,0 +1,287 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import multiprocessing
+from itertools import count
+from logging import getLogger
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+from typing import Dict, List  # noqa
+
+import numpy as np
+
+from d3a.constants import FLOATING_POINT_TOLERANCE
+from d3a.models.market.market_structures import BidOfferMatch
+from d3a.models.myco_matcher.base_matcher import BaseMatcher
+
+log = getLogger(__name__)
+
+# Initial number of orders that fit in the order book mirror of an area
+SHARED_ORDER_BOOK_CAPACITY = 1024
+# Seconds to wait for the matching process before the recommendations of a tick are dropped
+SHARED_MEMORY_MATCHING_TIMEOUT = 60
+
+ORDER_DTYPE = np.dtype([
+    ("market", np.int32),
+    ("is_offer", np.bool_),
+    ("owner", np.int64),
+    ("energy", np.float64),
+    ("energy_rate", np.float64),
+])
+
+
+def pay_as_bid_matches(orders):
+    """
+    Calculate pay as bid matches on an array of orders of ORDER_DTYPE.
+
+    Follows the PayAsBidMatcher: the offers of every market are visited in descending order
+    of their energy rate, and each offer is matched with the bid with the highest energy rate
+    that has not been selected yet, is not from the same owner and covers the offer rate.
+    :return: Array of (bid index, offer index, selected energy, trade rate) rows
+    """
+    matches = []
+    if len(orders) == 0:
+        return np.empty((0, 4))
+    # Sort by market and descending energy rate, lexsort uses the last key as primary key
+    sorted_indices = np.lexsort((-orders["energy_rate"], orders["market"]))
+    sorted_markets = orders["market"][sorted_indices]
+    boundaries = np.flatnonzero(np.diff(sorted_markets)) + 1
+    energy = orders["energy"].tolist()
+    energy_rate = orders["energy_rate"].tolist()
+    owner = orders["owner"].tolist()
+    for market_indices in np.split(sorted_indices, boundaries):
+        is_offer = orders["is_offer"][market_indices]
+        offer_indices = market_indices[is_offer].tolist()
+        bid_indices = market_indices[~is_offer].tolist()
+        if not offer_indices or not bid_indices:
+            continue
+        selected_bids = set()
+        for offer_index in offer_indices:
+            for bid_index in bid_indices:
+                if bid_index in selected_bids or owner[offer_index] == owner[bid_index]:
+                    continue
+                if energy_rate[offer_index] - energy_rate[bid_index] <= \
+                        FLOATING_POINT_TOLERANCE:
+                    selected_bids.add(bid_index)
+                    matches.append((bid_index, offer_index,
+                                    min(energy[bid_index], energy[offer_index]),
+                                    energy_rate[bid_index]))
+                    break
+    return np.array(matches, dtype=np.float64).reshape(-1, 4)
+
+
+def _matching_process(request_queue, result_queue):
+    """
+    Main loop of the matching process, matches the order book mirrors of the requests.
+
+    The shared memory block of a mirror is attached once and kept until a request names
+    another block for the mirror, which is the case after the mirror has grown.
+    """
+    shared_memories = {}  # type: Dict[str, SharedMemory]
+    while True:
+        request = request_queue.get()
+        if request is None:
+            break
+        request_id, mirror_id, shared_memory_name, order_count = request
+        shared_memory = shared_memories.get(mirror_id)
+        if shared_memory is not None and shared_memory.name != shared_memory_name:
+            shared_memory.close()
+            shared_memory = None
+        if shared_memory is None:
+            shared_memory = SharedMemory(name=shared_memory_name)
+            shared_memories[mirror_id] = shared_memory
+        orders = np.ndarray((order_count, ), dtype=ORDER_DTYPE, buffer=shared_memory.buf)
+        result_queue.put((request_id, pay_as_bid_matches(orders)))
+        del orders
+    for shared_memory in shared_memories.values():
+        shared_memory.close()
+
+
+class SharedOrderBookMirror:
+    """
+    Array-backed mirror of the open bids and offers of the markets of an area.
+
+    The orders are written to a shared memory block that the matching process reads without
+    copying, the order objects themselves stay in the simulation process and are referenced
+    by their index in the mirror. The block is replaced by a larger one if the orders do not
+    fit anymore.
+    """
+
+    def __init__(self, capacity=SHARED_ORDER_BOOK_CAPACITY):
+        self.capacity = 0
+        self.shared_memory = None
+        self.orders = None
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.close()
+        self.capacity = capacity
+        self.shared_memory = SharedMemory(create=True, size=capacity * ORDER_DTYPE.itemsize)
+        self.orders = np.ndarray((capacity, ), dtype=ORDER_DTYPE, buffer=self.shared_memory.buf)
+
+    @property
+    def name(self):
+        return self.shared_memory.name
+
+    def write(self, markets, owner_ids):
+        """
+        Write the open orders of the markets to the mirror.
+
+        :param markets: Markets whose order books are mirrored
+        :param owner_ids: Dict of order owner name to integer id, extended with new owners
+        :return: List of (market, order) of the mirrored orders, in the order of the mirror rows
+        """
+        order_objects = []
+        rows = []
+        for market_index, market in enumerate(markets):
+            bids, offers = market.open_bids_and_offers
+            if not bids or not offers:
+                continue
+            for bid in bids.values():
+                order_objects.append((market, bid))
+                rows.append((market_index, False, owner_ids.setdefault(bid.buyer, len(owner_ids)),
+                             bid.energy, bid.energy_rate))
+            for offer in offers.values():
+                order_objects.append((market, offer))
+                rows.append((market_index, True,
+                             owner_ids.setdefault(offer.seller, len(owner_ids)),
+                             offer.energy, offer.energy_rate))
+        if len(rows) > self.capacity:
+            self._allocate(max(len(rows), 2 * self.capacity))
+        if rows:
+            self.orders[:len(rows)] = np.array(rows, dtype=ORDER_DTYPE)
+        return order_objects
+
+    def close(self):
+        if self.shared_memory is None:
+            return
+        self.orders = None
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+        self.shared_memory = None
+
+
+class SharedMemoryMatcher(BaseMatcher):
+    """
+    Pay as bid matcher that runs in a separate process next to the simulation.
+
+    On every tick of an area, the recommendations that the matching process has calculated
+    for the previous tick of the area are settled, and the current order books of the area are
+    written to the shared memory mirror of the area and handed to the matching process. The
+    matching therefore overlaps with the ticks of the strategies, and the recommendations are
+    settled one tick later. Recommendations whose bid or offer has changed in the meantime are
+    dropped.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._mirrors = {}  # type: Dict[str, SharedOrderBookMirror]
+        self._pending_requests = {}  # type: Dict[str, tuple]
+        self._results = {}  # type: Dict[int, np.ndarray]
+        self._owner_ids = {}  # type: Dict[str, int]
+        self._request_ids = count()
+        self._process = None
+        self._request_queue = None
+        self._result_queue = None
+
+    def _start_process(self):
+        context = multiprocessing.get_context()
+        self._request_queue = context.Queue()
+        self._result_queue = context.Queue()
+        self._process = context.Process(target=_matching_process,
+                                        args=(self._request_queue, self._result_queue),
+                                        daemon=True)
+        self._process.start()
+
+    def _wait_for_result(self, request_id):
+        while request_id not in self._results:
+            try:
+                result_id, matches = self._result_queue.get(
+                    timeout=SHARED_MEMORY_MATCHING_TIMEOUT)
+            except Empty:
+                log.error(f"Matching process did not respond within "
+                          f"{SHARED_MEMORY_MATCHING_TIMEOUT} seconds.")
+                return None
+            self._results[result_id] = matches
+        return self._results.pop(request_id)
+
+    @staticmethod
+    def _recommendations_per_market(order_objects, matches):
+        recommendations = {}
+        for bid_index, offer_index, selected_energy, trade_rate in matches.tolist():
+            market, bid = order_objects[int(bid_index)]
+            _, offer = order_objects[int(offer_index)]
+            if market.bids.get(bid.id) is bid and market.offers.get(offer.id) is offer:
+                recommendations.setdefault(market, []).append(
+                    BidOfferMatch(bid, selected_energy, offer, trade_rate))
+        return recommendations
+
+    def _settle_pending_recommendations(self, area_uuid):
+        pending_request = self._pending_requests.pop(area_uuid, None)
+        if pending_request is None:
+            return
+        request_id, order_objects = pending_request
+        matches = self._wait_for_result(request_id)
+        if matches is None or len(matches) == 0:
+            return
+        for market, recommendations in self._recommendations_per_market(
+                order_objects, matches).items():
+            if market.readonly:
+                continue
+            market.match_recommendation(recommendations)
+
+    def match_markets(self, area_uuid, markets):
+        """Settle the recommendations of the previous tick and request the ones of this tick."""
+        self._settle_pending_recommendations(area_uuid)
+        mirror = self._mirrors.get(area_uuid)
+        if mirror is None:
+            mirror = SharedOrderBookMirror()
+            self._mirrors[area_uuid] = mirror
+        order_objects = mirror.write(markets, self._owner_ids)
+        if not order_objects:
+            return
+        if self._process is None:
+            self._start_process()
+        request_id = next(self._request_ids)
+        self._request_queue.put((request_id, area_uuid, mirror.name, len(order_objects)))
+        self._pending_requests[area_uuid] = (request_id, order_objects)
+
+    def calculate_match_recommendation(self, bids, offers, current_time=None):
+        owner_ids = {}
+        order_objects = list(bids.values()) + list(offers.values())
+        orders = np.array(
+            [(0, False, owner_ids.setdefault(bid.buyer, len(owner_ids)),
+              bid.energy, bid.energy_rate) for bid in bids.values()] +
+            [(0, True, owner_ids.setdefault(offer.seller, len(owner_ids)),
+              offer.energy, offer.energy_rate) for offer in offers.values()],
+            dtype=ORDER_DTYPE)
+        return [BidOfferMatch(order_objects[int(bid_index)], selected_energy,
+                              order_objects[int(offer_index)], trade_rate)
+                for bid_index, offer_index, selected_energy, trade_rate
+                in pay_as_bid_matches(orders).tolist()]
+
+    def shutdown(self):
+        """Stop the matching process and release the shared memory of all mirrors."""
+        if self._process is not None:
+            self._request_queue.put(None)
+            self._process.join(timeout=SHARED_MEMORY_MATCHING_TIMEOUT)
+            self._process = None
+        for mirror in self._mirrors.values():
+            mirror.close()
+        self._mirrors = {}
+        self._pending_requests = {}
+        self._results = {}
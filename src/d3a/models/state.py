@@ -17,11 +17,14 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 from abc import ABCMeta, abstractmethod
 from collections import namedtuple
+from collections.abc import MutableMapping
+from datetime import datetime
 from enum import Enum
-from math import isclose
-from typing import Dict
+from math import ceil, isclose
+from typing import Dict, List  # noqa
 
-from d3a_interface.constants_limits import ConstSettings
+import numpy as np
+from d3a_interface.constants_limits import ConstSettings, GlobalConfig
 from d3a_interface.utils import (
     convert_pendulum_to_str_in_dict, convert_str_to_pendulum_in_dict, convert_kW_to_kWh)
 from pendulum import DateTime
@@ -32,6 +35,9 @@ from d3a.d3a_core.util import write_default_to_dict
 
 StorageSettings = ConstSettings.StorageSettings
 
+# Integers up to this size are stored exactly in the float arrays of SlotSeries
+_MAX_EXACT_FLOAT_INT = 2 ** 53
+
 # Complex device models should be split in three classes each:
 #
 # - a strategy class responsible for buying/selling options
@@ -46,6 +52,217 @@ StorageSettings = ConstSettings.StorageSettings
 # - If a device has no state, maybe it doesn't need its own appliance class either
 
 
+class SlotSeries(MutableMapping):
+    """
+    Values per market slot, stored in an array that is indexed by the number of the slot.
+
+    Behaves like the {DateTime: value} dicts that the device states used before. The numeric
+    values of time slots on the slot grid (the grid starts at the first time slot that is
+    written) are kept in a NumPy array, all other values are kept in a dict. Slots without a
+    value hold 0 in the array. Integer values are flagged, so that they are returned as
+    integers. The total of the array is kept up to date on every change.
+    """
+    __slots__ = ("_origin_timestamp", "_slot_length_seconds", "_first_slot", "_values",
+                 "_is_int", "_time_slots", "_count", "_total", "_other")
+
+    def __init__(self, *args, **kwargs):
+        self._origin_timestamp = None
+        self._slot_length_seconds = None
+        # Number of the slot (counted from the origin) that is stored at index 0
+        self._first_slot = 0
+        self._values = np.zeros(0)
+        self._is_int = np.zeros(0, dtype=bool)
+        self._time_slots = []  # type: List[DateTime]
+        self._count = 0
+        # Sum of the values in the array
+        self._total = 0.
+        self._other = {}
+        self.update(*args, **kwargs)
+
+    def _slot_number(self, time_slot):
+        if self._origin_timestamp is None or not isinstance(time_slot, datetime):
+            return None
+        slot_number, remainder = divmod(time_slot.timestamp() - self._origin_timestamp,
+                                        self._slot_length_seconds)
+        return None if remainder else int(slot_number)
+
+    def _index(self, time_slot):
+        slot_number = self._slot_number(time_slot)
+        if slot_number is None:
+            return None
+        index = slot_number - self._first_slot
+        if 0 <= index < len(self._time_slots) and self._time_slots[index] is not None:
+            return index
+        return None
+
+    def _reserve_index(self, slot_number):
+        index = slot_number - self._first_slot
+        capacity = len(self._time_slots)
+        if 0 <= index < capacity:
+            return index
+        if capacity == 0:
+            self._first_slot = slot_number
+            self._values = np.zeros(1)
+            self._is_int = np.zeros(1, dtype=bool)
+            self._time_slots = [None]
+            return 0
+        if index < 0:
+            # Grow towards the past
+            extension = max(-index, capacity)
+            self._values = np.concatenate((np.zeros(extension), self._values))
+            self._is_int = np.concatenate((np.zeros(extension, dtype=bool), self._is_int))
+            self._time_slots = [None] * extension + self._time_slots
+            self._first_slot -= extension
+            return index + extension
+        extension = max(index + 1 - capacity, capacity)
+        self._values = np.concatenate((self._values, np.zeros(extension)))
+        self._is_int = np.concatenate((self._is_int, np.zeros(extension, dtype=bool)))
+        self._time_slots.extend([None] * extension)
+        return index
+
+    def _value(self, index):
+        value = self._values[index].item()
+        return int(value) if self._is_int[index] else value
+
+    def __getitem__(self, time_slot):
+        index = self._index(time_slot)
+        if index is None:
+            return self._other[time_slot]
+        return self._value(index)
+
+    def get(self, time_slot, default=None):
+        index = self._index(time_slot)
+        if index is None:
+            return self._other.get(time_slot, default)
+        return self._value(index)
+
+    def __contains__(self, time_slot):
+        return self._index(time_slot) is not None or time_slot in self._other
+
+    def __setitem__(self, time_slot, value):
+        if isinstance(value, float) or (
+                isinstance(value, int) and not isinstance(value, bool) and
+                abs(value) <= _MAX_EXACT_FLOAT_INT):
+            if self._origin_timestamp is None and isinstance(time_slot, datetime):
+                self._origin_timestamp = time_slot.timestamp()
+                self._slot_length_seconds = GlobalConfig.slot_length.total_seconds()
+            slot_number = self._slot_number(time_slot)
+            if slot_number is not None:
+                if self._other:
+                    self._other.pop(time_slot, None)
+                index = self._reserve_index(slot_number)
+                if self._time_slots[index] is None:
+                    self._time_slots[index] = time_slot
+                    self._count += 1
+                self._total += value - self._values[index].item()
+                self._values[index] = value
+                self._is_int[index] = isinstance(value, int)
+                return
+        index = self._index(time_slot)
+        if index is not None:
+            self._delete_index(index)
+        self._other[time_slot] = value
+
+    def _delete_index(self, index):
+        self._time_slots[index] = None
+        self._total -= self._values[index].item()
+        self._values[index] = 0.
+        self._is_int[index] = False
+        self._count -= 1
+
+    def __delitem__(self, time_slot):
+        index = self._index(time_slot)
+        if index is None:
+            del self._other[time_slot]
+        else:
+            self._delete_index(index)
+
+    def __iter__(self):
+        for time_slot in self._time_slots:
+            if time_slot is not None:
+                yield time_slot
+        yield from self._other
+
+    def __len__(self):
+        return self._count + len(self._other)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({dict(self.items())!r})"
+
+    def clear(self):
+        self._first_slot = 0
+        self._values = np.zeros(0)
+        self._is_int = np.zeros(0, dtype=bool)
+        self._time_slots = []
+        self._count = 0
+        self._total = 0.
+        self._other = {}
+
+    def copy(self):
+        series_copy = self.__class__()
+        series_copy._origin_timestamp = self._origin_timestamp
+        series_copy._slot_length_seconds = self._slot_length_seconds
+        series_copy._first_slot = self._first_slot
+        series_copy._values = self._values.copy()
+        series_copy._is_int = self._is_int.copy()
+        series_copy._time_slots = list(self._time_slots)
+        series_copy._count = self._count
+        series_copy._total = self._total
+        series_copy._other = dict(self._other)
+        return series_copy
+
+    @property
+    def total(self):
+        """Sum of all values."""
+        if self._other:
+            return self._total + sum(self._other.values())
+        return self._total
+
+    def count_and_total_from(self, time_slot):
+        """
+        Return the number of time slots from time_slot on and the sum of their values.
+
+        Returns None if the series holds values besides the slot grid or time_slot is not on
+        the slot grid, these have to be summed up by the caller.
+        """
+        slot_number = self._slot_number(time_slot)
+        if slot_number is None or self._other:
+            return None
+        index = min(max(slot_number - self._first_slot, 0), len(self._time_slots))
+        past_time_slots = self._time_slots[:index]
+        past_count = len(past_time_slots) - past_time_slots.count(None)
+        return self._count - past_count, self._total - self._values[:index].sum().item()
+
+    def delete_before(self, time_slot):
+        """Delete the values of all time slots before time_slot."""
+        if self._other:
+            for past_time_slot in [t for t in self._other if t < time_slot]:
+                del self._other[past_time_slot]
+        if not self._count:
+            self._total = 0.
+            return
+        first_kept_slot = ceil((time_slot.timestamp() - self._origin_timestamp) /
+                               self._slot_length_seconds)
+        deleted_slot_count = first_kept_slot - self._first_slot
+        if deleted_slot_count <= 0:
+            return
+        self._values = self._values[deleted_slot_count:].copy()
+        self._is_int = self._is_int[deleted_slot_count:].copy()
+        self._time_slots = self._time_slots[deleted_slot_count:]
+        self._first_slot = first_kept_slot
+        self._count = len(self._time_slots) - self._time_slots.count(None)
+        # Summed up again, so that rounding errors of the running total don't add up
+        self._total = self._values.sum().item()
+
+
+def _delete_past_slots(values_per_slot, current_time_slot):
+    if isinstance(values_per_slot, SlotSeries):
+        values_per_slot.delete_before(current_time_slot)
+        return
+    for time_slot in [t for t in values_per_slot if t < current_time_slot]:
+        values_per_slot.pop(time_slot, None)
+
+
 class StateInterface(metaclass=ABCMeta):
     """Interface containing methods that need to be defined by each State class."""
 
@@ -72,9 +289,9 @@ class ConsumptionState(StateInterface):
     def __init__(self):
         super().__init__()
         # Energy that the load wants to consume (given by the profile or live energy requirements)
-        self._desired_energy_Wh = {}
+        self._desired_energy_Wh = SlotSeries()
         # Energy that the load needs to consume. It's reduced when new energy is bought
-        self._energy_requirement_Wh = {}
+        self._energy_requirement_Wh = SlotSeries()
         self._total_energy_demanded_Wh = 0
 
     def get_state(self) -> Dict:
@@ -132,14 +349,8 @@ class ConsumptionState(StateInterface):
 
     def delete_past_state_values(self, current_time_slot):
         """Delete data regarding energy consumption for past market slots."""
-        to_delete = []
-        for market_slot in self._energy_requirement_Wh.keys():
-            if market_slot < current_time_slot:
-                to_delete.append(market_slot)
-
-        for market_slot in to_delete:
-            self._energy_requirement_Wh.pop(market_slot, None)
-            self._desired_energy_Wh.pop(market_slot, None)
+        _delete_past_slots(self._energy_requirement_Wh, current_time_slot)
+        _delete_past_slots(self._desired_energy_Wh, current_time_slot)
 
     def get_desired_energy_Wh(self, time_slot, default_value=0.0):
         """Return the expected consumed energy at a specific market slot."""
@@ -151,8 +362,8 @@ class ProductionState(StateInterface):
 
     def __init__(self):
         super().__init__()
-        self._available_energy_kWh = {}
-        self._energy_production_forecast_kWh = {}
+        self._available_energy_kWh = SlotSeries()
+        self._energy_production_forecast_kWh = SlotSeries()
 
     def get_state(self) -> Dict:
         """Return the current state of the device. Extends super implementation."""
@@ -176,6 +387,9 @@ class ProductionState(StateInterface):
         self._energy_production_forecast_kWh.update(
             convert_str_to_pendulum_in_dict(state_dict["energy_production_forecast_kWh"]))
 
+    def has_energy_forecast(self, time_slot):
+        return time_slot in self._energy_production_forecast_kWh
+
     def set_available_energy(self, energy_kWh, time_slot, overwrite=False):
         if overwrite is False and time_slot in self._energy_production_forecast_kWh:
             return
@@ -198,14 +412,8 @@ class ProductionState(StateInterface):
 
     def delete_past_state_values(self, current_market_time_slot):
         """Delete data regarding energy production for past market slots."""
-        to_delete = []
-        for market_slot in self._available_energy_kWh.keys():
-            if market_slot < current_market_time_slot:
-                to_delete.append(market_slot)
-
-        for market_slot in to_delete:
-            self._available_energy_kWh.pop(market_slot, None)
-            self._energy_production_forecast_kWh.pop(market_slot, None)
+        _delete_past_slots(self._available_energy_kWh, current_market_time_slot)
+        _delete_past_slots(self._energy_production_forecast_kWh, current_market_time_slot)
 
     def get_energy_production_forecast_kWh(self, time_slot, default_value=None):
         """Return the expected produced energy at a specific market slot."""
@@ -247,16 +455,9 @@ class HomeMeterState(ConsumptionState, ProductionState):
 
     def delete_past_state_values(self, current_market_time_slot: DateTime):
         """Delete data regarding energy requirements and availability for past market slots."""
-        to_delete = []
-        for market_slot in self.market_slots:
-            if market_slot < current_market_time_slot:
-                to_delete.append(market_slot)
-
-        for market_slot in to_delete:
-            self._available_energy_kWh.pop(market_slot, None)
-            self._energy_production_forecast_kWh.pop(market_slot, None)
-            self._energy_requirement_Wh.pop(market_slot, None)
-            self._desired_energy_Wh.pop(market_slot, None)
+        for values_per_slot in (self._available_energy_kWh, self._energy_production_forecast_kWh,
+                                self._energy_requirement_Wh, self._desired_energy_Wh):
+            _delete_past_slots(values_per_slot, current_market_time_slot)
 
     def get_energy_at_market_slot(self, time_slot: DateTime) -> float:
         """Return the energy produced/consumed by the device at a specific market slot (in kWh).
@@ -283,6 +484,20 @@ class ESSEnergyOrigin(Enum):
 EnergyOrigin = namedtuple('EnergyOrigin', ('origin', 'value'))
 
 
+def accumulated_energy(energy_per_slot, time_slots):
+    """Return the sum of the energy of the time slots.
+
+    Uses the total of a SlotSeries if it holds exactly the time slots from the first one on.
+    The states keep the slot of the current market besides the slots of the open markets, so
+    the slots before the first time slot are left out of the total.
+    """
+    if isinstance(energy_per_slot, SlotSeries) and time_slots:
+        count_and_total = energy_per_slot.count_and_total_from(min(time_slots))
+        if count_and_total is not None and count_and_total[0] == len(time_slots):
+            return count_and_total[1]
+    return sum(energy_per_slot[time_slot] for time_slot in time_slots)
+
+
 class StorageState(StateInterface):
     def __init__(self,
                  initial_soc=StorageSettings.MIN_ALLOWED_SOC,
@@ -304,21 +519,21 @@ class StorageState(StateInterface):
         self.max_abs_battery_power_kW = max_abs_battery_power_kW
 
         # storage capacity, that is already sold:
-        self.pledged_sell_kWh = {}
+        self.pledged_sell_kWh = SlotSeries()
         # storage capacity, that has been offered (but not traded yet):
-        self.offered_sell_kWh = {}
+        self.offered_sell_kWh = SlotSeries()
         # energy, that has been bought:
-        self.pledged_buy_kWh = {}
+        self.pledged_buy_kWh = SlotSeries()
         # energy, that the storage wants to buy (but not traded yet):
-        self.offered_buy_kWh = {}
+        self.offered_buy_kWh = SlotSeries()
         self.time_series_ess_share = {}
 
-        self.charge_history = {}
-        self.charge_history_kWh = {}
+        self.charge_history = SlotSeries()
+        self.charge_history_kWh = SlotSeries()
         self.offered_history = {}
         self.used_history = {}  # type: Dict[DateTime, float]
-        self.energy_to_buy_dict = {}
-        self.energy_to_sell_dict = {}
+        self.energy_to_buy_dict = SlotSeries()
+        self.energy_to_sell_dict = SlotSeries()
 
         self._used_storage = self.initial_capacity_kWh
         self._battery_energy_per_slot = 0.0
@@ -409,11 +624,8 @@ class StorageState(StateInterface):
         """
         Determines available energy to sell for each active market and returns a dict[TIME, FLOAT]
         """
-        accumulated_pledged = 0
-        accumulated_offered = 0
-        for time_slot in market_slot_time_list:
-            accumulated_pledged += self.pledged_sell_kWh[time_slot]
-            accumulated_offered += self.offered_sell_kWh[time_slot]
+        accumulated_pledged = accumulated_energy(self.pledged_sell_kWh, market_slot_time_list)
+        accumulated_offered = accumulated_energy(self.offered_sell_kWh, market_slot_time_list)
 
         energy = self.used_storage \
             - accumulated_pledged \
@@ -429,27 +641,35 @@ class StorageState(StateInterface):
 
         return storage_dict
 
+    def _energy_to_buy_per_slot_kWh(self, market_slot_time_list):
+        accumulated_bought = accumulated_energy(self.pledged_buy_kWh, market_slot_time_list)
+        accumulated_sought = accumulated_energy(self.offered_buy_kWh, market_slot_time_list)
+        return limit_float_precision((self.capacity
+                                      - self.used_storage
+                                      - accumulated_bought
+                                      - accumulated_sought) / len(market_slot_time_list))
+
+    def _clamp_energy_to_buy_kWh(self, time_slot, energy):
+        clamped_energy = limit_float_precision(
+            min(energy, self.max_buy_energy_kWh(time_slot), self._battery_energy_per_slot))
+        self.energy_to_buy_dict[time_slot] = max(clamped_energy, 0)
+        return self.energy_to_buy_dict[time_slot]
+
     def clamp_energy_to_buy_kWh(self, market_slot_time_list):
         """
         Determines amount of energy that can be bought for each active market and writes it to
         self.energy_to_buy_dict
         """
-
-        accumulated_bought = 0
-        accumulated_sought = 0
+        energy = self._energy_to_buy_per_slot_kWh(market_slot_time_list)
         for time_slot in market_slot_time_list:
-            accumulated_bought += self.pledged_buy_kWh[time_slot]
-            accumulated_sought += self.offered_buy_kWh[time_slot]
-        energy = limit_float_precision((self.capacity
-                                        - self.used_storage
-                                        - accumulated_bought
-                                        - accumulated_sought) / len(market_slot_time_list))
+            self._clamp_energy_to_buy_kWh(time_slot, energy)
 
-        for time_slot in market_slot_time_list:
-            clamped_energy = limit_float_precision(
-                min(energy, self.max_buy_energy_kWh(time_slot), self._battery_energy_per_slot))
-            clamped_energy = max(clamped_energy, 0)
-            self.energy_to_buy_dict[time_slot] = clamped_energy
+    def clamp_energy_to_buy_kWh_for_slot(self, time_slot, market_slot_time_list):
+        """
+        Same as clamp_energy_to_buy_kWh, but only updates and returns the energy of time_slot
+        """
+        return self._clamp_energy_to_buy_kWh(
+            time_slot, self._energy_to_buy_per_slot_kWh(market_slot_time_list))
 
     def check_state(self, time_slot):
         """
@@ -528,21 +748,12 @@ class StorageState(StateInterface):
                 self.time_series_ess_share[past_time_slot][energy_type.origin] += energy_type.value
 
     def delete_past_state_values(self, current_time_slot):
-        to_delete = []
-        for market_slot in self.pledged_sell_kWh.keys():
-            if market_slot < current_time_slot:
-                to_delete.append(market_slot)
-        for market_slot in to_delete:
-            self.pledged_sell_kWh.pop(market_slot, None)
-            self.offered_sell_kWh.pop(market_slot, None)
-            self.pledged_buy_kWh.pop(market_slot, None)
-            self.offered_buy_kWh.pop(market_slot, None)
-            self.charge_history.pop(market_slot, None)
-            self.charge_history_kWh.pop(market_slot, None)
-            self.offered_history.pop(market_slot, None)
-            self.used_history.pop(market_slot, None)
-            self.energy_to_buy_dict.pop(market_slot, None)
-            self.energy_to_sell_dict.pop(market_slot, None)
+        for values_per_slot in (self.pledged_sell_kWh, self.offered_sell_kWh,
+                                self.pledged_buy_kWh, self.offered_buy_kWh,
+                                self.charge_history, self.charge_history_kWh,
+                                self.offered_history, self.used_history,
+                                self.energy_to_buy_dict, self.energy_to_sell_dict):
+            _delete_past_slots(values_per_slot, current_time_slot)
 
 
 class UnexpectedStateException(Exception):
@@ -27,6 +27,7 @@ from d3a.constants import REDIS_PUBLISH_RESPONSE_TIMEOUT
 from d3a.d3a_core.device_registry import DeviceRegistry
 from d3a.d3a_core.exceptions import D3ARedisException
 from d3a.d3a_core.exceptions import SimulationException, D3AException, MarketException
+from d3a.d3a_core.random_streams import RandomStreamMixin
 from d3a.d3a_core.redis_connections.redis_area_market_communicator import BlockingCommunicator
 from d3a.d3a_core.util import append_or_create_key
 from d3a.events import EventMixin
@@ -55,6 +56,66 @@ class _TradeLookerUpper:
                 yield trade
 
 
+class _OrderListAggregates:
+    """
+    Ids and energy and price sums of the orders of one market, cached for an order list.
+
+    The per-market order lists of the strategies are only appended to or replaced by a new
+    list, so the aggregates are extended by the orders that were appended since the last
+    lookup and are rebuilt if the list was replaced.
+    """
+    __slots__ = ("orders", "_id_count", "_ids", "_sum_count", "_energy", "_price")
+
+    def __init__(self, orders):
+        self.orders = orders
+        self._id_count = 0
+        self._ids = set()
+        self._sum_count = 0
+        self._energy = 0
+        self._price = 0
+
+    def is_outdated(self, orders):
+        return (self.orders is not orders or
+                max(self._id_count, self._sum_count) > len(orders))
+
+    @property
+    def ids(self):
+        for order in self.orders[self._id_count:]:
+            self._ids.add(order.id)
+        self._id_count = len(self.orders)
+        return self._ids
+
+    def _extend_sums(self):
+        for order in self.orders[self._sum_count:]:
+            self._energy += order.energy
+            self._price += order.price
+        self._sum_count = len(self.orders)
+
+    @property
+    def energy(self):
+        self._extend_sums()
+        return self._energy
+
+    @property
+    def price(self):
+        self._extend_sums()
+        return self._price
+
+
+_EMPTY_ORDER_AGGREGATES = _OrderListAggregates(())
+
+
+def _order_list_aggregates(cache, orders_per_market, market_id):
+    """Return the aggregates of the order list of the market, cache holds them per market."""
+    orders = orders_per_market.get(market_id)
+    if not orders:
+        return _EMPTY_ORDER_AGGREGATES
+    aggregates = cache.get(market_id)
+    if aggregates is None or aggregates.is_outdated(orders):
+        aggregates = cache[market_id] = _OrderListAggregates(orders)
+    return aggregates
+
+
 class Offers:
     """
     Keep track of a strategy's accepted and own offers.
@@ -72,6 +133,58 @@ class Offers:
         self.posted = {}  # type: Dict[Offer, str]
         self.sold = {}  # type: Dict[str, List[Offer]]
         self.split = {}  # type: Dict[str, Offer]
+        self._sold_aggregates = {}  # type: Dict[str, _OrderListAggregates]
+
+    @property
+    def posted(self):
+        return self._posted
+
+    @posted.setter
+    def posted(self, posted):
+        self._posted = posted
+        # Index of the posted offers per market id and per offer id, built on first use
+        self._posted_in_market = None  # type: Dict[str, Dict[Offer, None]]
+        self._posted_by_id = None  # type: Dict[str, List[Offer]]
+        self._posted_energy = {}  # type: Dict[str, float]
+
+    def _build_posted_index(self):
+        if self._posted_in_market is not None:
+            return
+        self._posted_in_market = {}
+        self._posted_by_id = {}
+        for offer, market_id in self._posted.items():
+            self._index_posted_offer(offer, market_id)
+
+    def _index_posted_offer(self, offer, market_id):
+        self._posted_energy.pop(market_id, None)
+        if self._posted_in_market is None:
+            return
+        self._posted_in_market.setdefault(market_id, {})[offer] = None
+        self._posted_by_id.setdefault(offer.id, []).append(offer)
+
+    def _unindex_posted_offer(self, offer, market_id):
+        self._posted_energy.pop(market_id, None)
+        if self._posted_in_market is None:
+            return
+        self._posted_in_market[market_id].pop(offer)
+        same_id_offers = self._posted_by_id[offer.id]
+        same_id_offers.remove(offer)
+        if not same_id_offers:
+            del self._posted_by_id[offer.id]
+
+    def _add_posted(self, offer, market_id):
+        if offer in self._posted:
+            self._unindex_posted_offer(offer, self._posted[offer])
+        self._posted[offer] = market_id
+        self._index_posted_offer(offer, market_id)
+
+    def _remove_posted(self, offer):
+        market_id = self._posted.pop(offer)
+        self._unindex_posted_offer(offer, market_id)
+        return market_id
+
+    def _sold_in_market_aggregates(self, market_id):
+        return _order_list_aggregates(self._sold_aggregates, self.sold, market_id)
 
     @property
     def area(self):
@@ -90,6 +203,9 @@ class Offers:
         self.posted = self._delete_past_offers(self.posted)
         self.bought = self._delete_past_offers(self.bought)
         self.split = {}
+        self._sold_aggregates = {
+            market_id: aggregates for market_id, aggregates in self._sold_aggregates.items()
+            if self.sold.get(market_id) is aggregates.orders}
 
     @property
     def open(self):
@@ -97,7 +213,8 @@ class Offers:
         for offer, market_id in self.posted.items():
             if market_id not in self.sold:
                 self.sold[market_id] = []
-            if offer not in self.sold[market_id]:
+            if offer.id not in self._sold_in_market_aggregates(market_id).ids or \
+                    offer not in self.sold[market_id]:
                 open_offers[offer] = market_id
         return open_offers
 
@@ -108,37 +225,37 @@ class Offers:
         self.sold = append_or_create_key(self.sold, market_id, offer)
 
     def is_offer_posted(self, market_id, offer_id):
-        return offer_id in [offer.id for offer, _market in self.posted.items()
-                            if market_id == _market]
+        self._build_posted_index()
+        return any(self.posted[offer] == market_id
+                   for offer in self._posted_by_id.get(offer_id, ()))
 
     def get_sold_offer_ids_in_market(self, market_id):
-        sold_offer_ids = []
-        for sold_offer in self.sold.get(market_id, []):
-            sold_offer_ids.append(sold_offer.id)
-        return sold_offer_ids
+        return [sold_offer.id for sold_offer in self.sold.get(market_id, [])]
 
     def open_in_market(self, market_id):
-        open_offers = []
-        sold_offer_ids = self.get_sold_offer_ids_in_market(market_id)
-        for offer, _market in self.posted.items():
-            if offer.id not in sold_offer_ids and market_id == _market:
-                open_offers.append(offer)
-        return open_offers
+        sold_offer_ids = self._sold_in_market_aggregates(market_id).ids
+        return [offer for offer in self.posted_in_market(market_id)
+                if offer.id not in sold_offer_ids]
 
     def open_offer_energy(self, market_id):
         return sum(o.energy for o in self.open_in_market(market_id))
 
     def posted_in_market(self, market_id):
-        return [offer for offer, _market in self.posted.items() if market_id == _market]
+        self._build_posted_index()
+        return list(self._posted_in_market.get(market_id, ()))
 
     def posted_offer_energy(self, market_id):
-        return sum(o.energy for o in self.posted_in_market(market_id))
+        posted_energy = self._posted_energy.get(market_id)
+        if posted_energy is None:
+            posted_energy = self._posted_energy[market_id] = \
+                sum(o.energy for o in self.posted_in_market(market_id))
+        return posted_energy
 
     def sold_offer_energy(self, market_id):
-        return sum(o.energy for o in self.sold_in_market(market_id))
+        return self._sold_in_market_aggregates(market_id).energy
 
     def sold_offer_price(self, market_id):
-        return sum(o.price for o in self.sold_in_market(market_id))
+        return self._sold_in_market_aggregates(market_id).price
 
     def can_offer_be_posted(
             self, offer_energy, offer_price, available_energy, market, replace_existing=False):
@@ -164,13 +281,14 @@ class Offers:
     def post(self, offer, market_id):
         # If offer was split already, don't post one with the same uuid again
         if offer.id not in self.split:
-            self.posted[offer] = market_id
+            self._add_posted(offer, market_id)
 
     def remove_offer_from_cache_and_market(self, market, offer_id=None):
         if offer_id is None:
             to_delete_offers = self.open_in_market(market.id)
         else:
-            to_delete_offers = [o for o, m in self.posted.items() if o.id == offer_id]
+            self._build_posted_index()
+            to_delete_offers = list(self._posted_by_id.get(offer_id, ()))
         deleted_offer_ids = []
         for offer in to_delete_offers:
             market.delete_offer(offer.id)
@@ -180,11 +298,11 @@ class Offers:
 
     def remove(self, offer):
         try:
-            market_id = self.posted.pop(offer)
+            market_id = self._remove_posted(offer)
             assert type(market_id) == str
             if market_id in self.sold and offer in self.sold[market_id]:
                 self.strategy.log.warning("Offer already sold, cannot remove it.")
-                self.posted[offer] = market_id
+                self._add_posted(offer, market_id)
             else:
                 return True
         except KeyError:
@@ -212,7 +330,7 @@ class Offers:
                 self.replace(original_offer, accepted_offer, market_id)
 
 
-class BaseStrategy(TriggerMixin, EventMixin, AreaBehaviorBase):
+class BaseStrategy(TriggerMixin, EventMixin, AreaBehaviorBase, RandomStreamMixin):
     available_triggers = [
         Trigger('enable', state_getter=lambda s: s.enabled, help="Enable trading"),
         Trigger('disable', state_getter=lambda s: not s.enabled, help="Disable trading")
@@ -230,6 +348,14 @@ class BaseStrategy(TriggerMixin, EventMixin, AreaBehaviorBase):
             self.event_response_uuids = []
 
     parameters = None
+    # Names of the price updater attributes that members of a StrategyFleet share
+    fleet_price_updaters = ()
+    fleet = None
+
+    @property
+    def random_stream_key(self):
+        owner_key = self.owner.random_stream_key if self.owner is not None else None
+        return f"strategy:{owner_key}:{self.__class__.__name__}"
 
     def energy_traded(self, market_id):
         return self.offers.sold_offer_energy(market_id)
@@ -445,6 +571,13 @@ class BaseStrategy(TriggerMixin, EventMixin, AreaBehaviorBase):
         if self.enabled or event_type in self._allowed_disable_events:
             super().event_listener(event_type, **kwargs)
 
+    @property
+    def is_trading_enabled(self) -> bool:
+        """Return whether the strategy receives the market events of its area: the strategy
+        and the area of the market are enabled, and the device is enabled and connected."""
+        return (self.enabled and self.area.events.is_enabled and
+                self.owner.events.is_enabled and self.owner.events.is_connected)
+
     def event_trade(self, *, market_id, trade):
         """React to offer trades. This method is triggered by the MarketEvent.TRADE event."""
         self.offers.on_trade(market_id, trade)
@@ -528,6 +661,8 @@ class BidEnabledStrategy(BaseStrategy):
         super().__init__()
         self._bids = {}
         self._traded_bids = {}
+        self._bid_aggregates = {}  # type: Dict[str, _OrderListAggregates]
+        self._traded_bid_aggregates = {}  # type: Dict[str, _OrderListAggregates]
 
     def energy_traded(self, market_id):
         offer_energy = super().energy_traded(market_id)
@@ -585,22 +720,18 @@ class BidEnabledStrategy(BaseStrategy):
         return total_posted_energy <= required_energy_kWh and bid_price >= 0.0
 
     def is_bid_posted(self, market, bid_id):
-        return bid_id in [bid.id for bid in self.get_posted_bids(market)]
+        return bid_id in _order_list_aggregates(self._bid_aggregates, self._bids, market.id).ids
 
     def posted_bid_energy(self, market_id):
-        if market_id not in self._bids:
-            return 0.0
-        return sum(b.energy for b in self._bids[market_id])
+        return _order_list_aggregates(self._bid_aggregates, self._bids, market_id).energy
 
     def _traded_bid_energy(self, market_id):
-        if market_id not in self._traded_bids:
-            return 0.0
-        return sum(b.energy for b in self._traded_bids[market_id])
+        return _order_list_aggregates(
+            self._traded_bid_aggregates, self._traded_bids, market_id).energy
 
     def _traded_bid_costs(self, market_id):
-        if market_id not in self._traded_bids:
-            return 0.0
-        return sum(b.price for b in self._traded_bids[market_id])
+        return _order_list_aggregates(
+            self._traded_bid_aggregates, self._traded_bids, market_id).price
 
     def remove_bid_from_pending(self, market_id, bid_id=None):
         market = self.area.get_future_market_from_id(market_id)
@@ -613,8 +744,9 @@ class BidEnabledStrategy(BaseStrategy):
         for b_id in deleted_bid_ids:
             if b_id in market.bids.keys():
                 market.delete_bid(b_id)
+        deleted_bid_ids_set = set(deleted_bid_ids)
         self._bids[market.id] = [bid for bid in self.get_posted_bids(market)
-                                 if bid.id not in deleted_bid_ids]
+                                 if bid.id not in deleted_bid_ids_set]
         return deleted_bid_ids
 
     def add_bid_to_posted(self, market_id, bid):
@@ -693,6 +825,8 @@ class BidEnabledStrategy(BaseStrategy):
         if not constants.D3A_TEST_RUN:
             self._bids = {}
             self._traded_bids = {}
+            self._bid_aggregates = {}
+            self._traded_bid_aggregates = {}
             super().event_market_cycle()
 
     def assert_if_trade_bid_price_is_too_high(self, market, trade):
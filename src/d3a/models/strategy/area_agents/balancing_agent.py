@@ -15,27 +15,32 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from numpy.random import random
 from d3a.constants import FLOATING_POINT_TOLERANCE
+from d3a.d3a_core.random_streams import shuffled
 from d3a.d3a_core.util import make_ba_name, make_iaa_name
 from d3a.models.strategy.area_agents.one_sided_agent import OneSidedAgent
-from d3a.models.strategy.area_agents.one_sided_engine import BalancingEngine
+from d3a.models.strategy.area_agents.one_sided_engine import BalancingEngine, IAAEnginePool
 from d3a_interface.constants_limits import ConstSettings
 
 
 class BalancingAgent(OneSidedAgent):
     def __init__(self, owner, higher_market, lower_market,
-                 min_offer_age=ConstSettings.IAASettings.MIN_OFFER_AGE):
+                 min_offer_age=ConstSettings.IAASettings.MIN_OFFER_AGE,
+                 engine_pool: IAAEnginePool = None):
         self.balancing_spot_trade_ratio = owner.balancing_spot_trade_ratio
-        self.engines = [
-            BalancingEngine('High -> Low', higher_market, lower_market, min_offer_age, self),
-            BalancingEngine('Low -> High', lower_market, higher_market, min_offer_age, self),
-        ]
         super().__init__(owner=owner, higher_market=higher_market,
                          lower_market=lower_market,
-                         min_offer_age=min_offer_age, do_create_engine=False)
+                         min_offer_age=min_offer_age, engine_pool=engine_pool)
         self.name = make_ba_name(self.owner)
 
+    def _create_engines(self):
+        return [
+            self._acquire_engine(BalancingEngine, 'High -> Low', self.higher_market,
+                                 self.lower_market, self.min_offer_age, self),
+            self._acquire_engine(BalancingEngine, 'Low -> High', self.lower_market,
+                                 self.higher_market, self.min_offer_age, self),
+        ]
+
     def event_tick(self):
         super().event_tick()
         if self.lower_market.unmatched_energy_downward > 0.0 or \
@@ -108,13 +113,19 @@ class BalancingAgent(OneSidedAgent):
                                                    energy=target_energy)
         return trade
 
+    def event_balancing_offer(self, *, market_id, offer):
+        if self._engines is None and not self._is_agent_market(market_id):
+            return
+        for engine in self.engines:
+            engine.event_offer(market_id=market_id, offer=offer)
+
     def event_balancing_trade(self, *, market_id, trade, offer=None):
-        for engine in sorted(self.engines, key=lambda _: random()):
+        for engine in shuffled(self.rng, self._created_engines):
             engine.event_trade(trade=trade)
 
     def event_balancing_offer_split(self, *, market_id, original_offer, accepted_offer,
                                     residual_offer):
-        for engine in sorted(self.engines, key=lambda _: random()):
+        for engine in shuffled(self.rng, self._created_engines):
             engine.event_offer_split(market_id=market_id,
                                      original_offer=original_offer,
                                      accepted_offer=accepted_offer,
@@ -15,7 +15,8 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from numpy.random import random
+import d3a.constants
+from d3a.d3a_core.random_streams import shuffled
 from d3a.models.strategy import BaseStrategy, _TradeLookerUpper
 from d3a.constants import TIME_FORMAT
 from d3a_interface.constants_limits import ConstSettings
@@ -48,9 +49,17 @@ class InterAreaAgent(BaseStrategy):
         """Reconfigure the minimum offer age at runtime with the given value."""
         self._validate_constructor_arguments(min_offer_age)
         self.min_offer_age = min_offer_age
-        for engine in sorted(self.engines, key=lambda _: random()):
+        if d3a.constants.SINGLE_TICK_PROPAGATION:
+            return
+        # Engines that are created later on pick up the new min_offer_age
+        for engine in shuffled(self.rng, self._created_engines):
             engine.min_offer_age = min_offer_age
 
+    @property
+    def random_stream_key(self):
+        return (f"agent:{self.owner.random_stream_key}:{self.higher_market.time_slot}:"
+                f"{self.__class__.__name__}")
+
     @property
     def trades(self):
         return _TradeLookerUpper(self.name)
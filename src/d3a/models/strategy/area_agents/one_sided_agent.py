@@ -16,28 +16,64 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 from d3a.models.strategy.area_agents.inter_area_agent import InterAreaAgent
-from d3a.models.strategy.area_agents.one_sided_engine import IAAEngine
+from d3a.models.strategy.area_agents.one_sided_engine import IAAEngine, IAAEnginePool
+from d3a.d3a_core.random_streams import shuffled
 from d3a.d3a_core.util import make_iaa_name
 from d3a_interface.constants_limits import ConstSettings
-from numpy.random import random
 
 
 class OneSidedAgent(InterAreaAgent):
     def __init__(self, *, owner, higher_market, lower_market,
                  min_offer_age=ConstSettings.IAASettings.MIN_OFFER_AGE,
-                 do_create_engine=True):
+                 engine_pool: IAAEnginePool = None):
         super().__init__(owner=owner,
                          higher_market=higher_market,
                          lower_market=lower_market,
                          min_offer_age=min_offer_age)
-        if do_create_engine:
-            self.engines = [
-                IAAEngine('High -> Low', higher_market, lower_market, min_offer_age, self),
-                IAAEngine('Low -> High', lower_market, higher_market, min_offer_age, self),
-            ]
+        # Engines are only created once either market has an order, most agents never
+        # forward anything in their market slot
+        self._engines = None
+        self._engine_pool = engine_pool
         self.name = make_iaa_name(owner)
         self.uuid = owner.uuid
 
+    def _acquire_engine(self, engine_class, *args):
+        if self._engine_pool is None:
+            return engine_class(*args)
+        return self._engine_pool.acquire(engine_class, *args)
+
+    def _create_engines(self):
+        return [
+            self._acquire_engine(IAAEngine, 'High -> Low', self.higher_market,
+                                 self.lower_market, self.min_offer_age, self),
+            self._acquire_engine(IAAEngine, 'Low -> High', self.lower_market,
+                                 self.higher_market, self.min_offer_age, self),
+        ]
+
+    @property
+    def engines(self):
+        if self._engines is None:
+            self._engines = self._create_engines()
+        return self._engines
+
+    @property
+    def _created_engines(self):
+        """Engines that have been created so far, without creating them."""
+        return self._engines or []
+
+    def _has_orders(self):
+        return bool(self.lower_market.offers or self.higher_market.offers)
+
+    def _is_agent_market(self, market_id):
+        return market_id in (self.lower_market.id, self.higher_market.id)
+
+    def release_engines(self):
+        """Hand the engines back to the engine pool once the market slot has passed."""
+        if self._engine_pool is not None:
+            for engine in self._created_engines:
+                self._engine_pool.release(engine)
+        self._engines = None
+
     def usable_offer(self, offer):
         """Prevent IAAEngines from trading their counterpart's offers"""
         return all(offer.id not in engine.forwarded_offers.keys() for engine in self.engines)
@@ -55,20 +91,28 @@ class OneSidedAgent(InterAreaAgent):
             return None
 
     def event_tick(self):
+        if self._engines is None and not self._has_orders():
+            return
         area = self.owner
-        for engine in sorted(self.engines, key=lambda _: random()):
+        for engine in shuffled(self.rng, self.engines):
             engine.tick(area=area)
 
+    def event_offer(self, *, market_id, offer):
+        if self._engines is None and not self._is_agent_market(market_id):
+            return
+        for engine in self.engines:
+            engine.event_offer(market_id=market_id, offer=offer)
+
     def event_trade(self, *, market_id, trade):
-        for engine in sorted(self.engines, key=lambda _: random()):
+        for engine in shuffled(self.rng, self._created_engines):
             engine.event_trade(trade=trade)
 
     def event_offer_deleted(self, *, market_id, offer):
-        for engine in sorted(self.engines, key=lambda _: random()):
+        for engine in shuffled(self.rng, self._created_engines):
             engine.event_offer_deleted(offer=offer)
 
     def event_offer_split(self, *, market_id,  original_offer, accepted_offer, residual_offer):
-        for engine in sorted(self.engines, key=lambda _: random()):
+        for engine in shuffled(self.rng, self._created_engines):
             engine.event_offer_split(market_id=market_id,
                                      original_offer=original_offer,
                                      accepted_offer=accepted_offer,
@@ -15,33 +15,165 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+import heapq
 from collections import namedtuple
-from typing import Dict, Set  # noqa
+from contextlib import ExitStack
+from itertools import count
+from typing import Dict, List, Optional, Set  # noqa
+from weakref import WeakValueDictionary
+import d3a.constants
 from d3a.constants import FLOATING_POINT_TOLERANCE
 from d3a_interface.constants_limits import ConstSettings
-from d3a.d3a_core.util import short_offer_bid_log_str
+from d3a.d3a_core.util import ShortLogStr
 from d3a.d3a_core.exceptions import MarketException, OfferNotFoundException
-from d3a.models.market.market_structures import copy_offer
 
 
-OfferInfo = namedtuple('OfferInfo', ('source_offer', 'target_offer'))
+# The orders are the live orders of the markets, the rates are snapshots taken on forwarding,
+# since the markets update the price of an order when it is traded
+OfferInfo = namedtuple('OfferInfo', ('source_offer', 'target_offer', 'source_rate', 'target_rate'))
 Markets = namedtuple('Markets', ('source', 'target'))
 ResidualInfo = namedtuple('ResidualInfo', ('forwarded', 'age'))
 
+# Forwarded offer id -> engine that forwarded the offer, used to walk down the chain of forwarded
+# copies of a traded offer. Entries vanish together with the engines of past markets.
+_offer_forwarding_engines = WeakValueDictionary()  # type: WeakValueDictionary
+
+
+class ForwardingTable:
+    """
+    Forwarding bookkeeping of an engine, maps the ids of the source and the target order of a
+    forwarding to its OfferInfo / BidInfo.
+
+    Every forwarding is stored once in a list of entries and both order ids map to the integer
+    handle of the entry. Handles of removed forwardings are reused, and re-adding the orders of
+    an existing forwarding (as done for the accepted orders of a split, which keep the ids of the
+    original orders) replaces its entry in place. Supports the dict operations that the engines
+    used on the plain dict of order id to info.
+    """
+
+    __slots__ = ("_handles", "_entries", "_free_handles")
+
+    def __init__(self):
+        self._handles = {}  # type: Dict[str, int]
+        self._entries = []  # type: List[Optional[tuple]]
+        self._free_handles = []  # type: List[int]
+
+    def _new_handle(self, info):
+        if self._free_handles:
+            handle = self._free_handles.pop()
+            self._entries[handle] = info
+        else:
+            handle = len(self._entries)
+            self._entries.append(info)
+        return handle
+
+    def add(self, info):
+        """Store a forwarding under the ids of its source and target order."""
+        source_id, target_id = info[0].id, info[1].id
+        handle = self._handles.get(source_id)
+        if handle is not None and self._handles.get(target_id) == handle:
+            self._entries[handle] = info
+            return
+        self.discard(source_id)
+        self.discard(target_id)
+        handle = self._new_handle(info)
+        self._handles[source_id] = handle
+        self._handles[target_id] = handle
+
+    def discard(self, order_id):
+        """Remove the forwarding of an order, under both of its ids, and return its info."""
+        handle = self._handles.pop(order_id, None)
+        if handle is None:
+            return None
+        info = self._entries[handle]
+        self._handles.pop(info[0].id, None)
+        self._handles.pop(info[1].id, None)
+        self._entries[handle] = None
+        self._free_handles.append(handle)
+        return info
+
+    def infos(self):
+        """Return the info of every forwarding once."""
+        return [info for info in self._entries if info is not None]
+
+    def clear(self):
+        self._handles.clear()
+        self._entries.clear()
+        self._free_handles.clear()
+
+    def get(self, order_id, default=None):
+        handle = self._handles.get(order_id)
+        return default if handle is None else self._entries[handle]
+
+    def __getitem__(self, order_id):
+        return self._entries[self._handles[order_id]]
+
+    def __setitem__(self, order_id, info):
+        # The order id has to be the id of the source or the target order of the info
+        self.add(info)
+
+    def __contains__(self, order_id):
+        return order_id in self._handles
+
+    def __iter__(self):
+        return iter(self._handles)
+
+    def __len__(self):
+        return len(self._handles)
+
+    def keys(self):
+        return self._handles.keys()
+
+    def items(self):
+        return [(order_id, self._entries[handle]) for order_id, handle in self._handles.items()]
+
+    def __eq__(self, other):
+        if isinstance(other, ForwardingTable):
+            other = dict(other.items())
+        return dict(self.items()) == other
+
+    def __repr__(self):
+        return f"ForwardingTable({dict(self.items())})"
+
 
 class IAAEngine:
     def __init__(self, name: str, market_1, market_2, min_offer_age: int,
                  owner):
-        self.name = name
-        self.markets = Markets(market_1, market_2)
-        self.min_offer_age = min_offer_age
-        self.owner = owner
-
         self.offer_age = {}  # type: Dict[str, int]
         # Offer.id -> OfferInfo
-        self.forwarded_offers = {}  # type: Dict[str, OfferInfo]
+        self.forwarded_offers = ForwardingTable()  # type: ForwardingTable
         self.trade_residual = {}  # type Dict[str, Offer]
         self.ignored_offers = set()  # type: Set[str]
+        # Offers of the source market that appeared since the last tick, learnt from the
+        # market events. The source market is scanned once, on the first tick of the engine.
+        self._new_offers = []  # type: List[Offer]
+        # Min-heap of (tick the offer becomes eligible for forwarding, sequence, offer id)
+        self._offer_queue = []  # type: List[tuple]
+        self._queue_sequence = count()
+        IAAEngine.attach(self, name, market_1, market_2, min_offer_age, owner)
+
+    def attach(self, name: str, market_1, market_2, min_offer_age: int, owner):
+        """Bind the engine to a pair of markets, when created or recycled by IAAEnginePool."""
+        self.name = name
+        self.markets = Markets(market_1, market_2)
+        # Orders are not held back at any level when propagating in a single tick
+        self.min_offer_age = 0 if d3a.constants.SINGLE_TICK_PROPAGATION else min_offer_age
+        self.owner = owner
+        self._is_source_market_scanned = False
+
+    def detach(self):
+        """Release the markets of a past market slot and empty the bookkeeping for reuse."""
+        for offer_info in self.forwarded_offers.infos():
+            if _offer_forwarding_engines.get(offer_info.target_offer.id) is self:
+                del _offer_forwarding_engines[offer_info.target_offer.id]
+        self.offer_age.clear()
+        self.forwarded_offers.clear()
+        self.trade_residual.clear()
+        self.ignored_offers.clear()
+        self._new_offers.clear()
+        self._offer_queue.clear()
+        self.markets = None
+        self.owner = None
 
     def __repr__(self):
         return "<IAAEngine [{s.owner.name}] {s.name} {s.markets.source.time_slot:%H:%M}>".format(
@@ -52,21 +184,24 @@ class IAAEngine:
         updated_price = self.markets.target.fee_class.update_forwarded_offer_with_fee(
             offer.energy_rate, offer.original_offer_price / offer.energy) * offer.energy
 
-        kwargs = {
-            "price": updated_price,
-            "energy": offer.energy,
-            "seller": self.owner.name,
-            "original_offer_price": offer.original_offer_price,
-            "dispatch_event": False,
-            "seller_origin": offer.seller_origin,
-            "seller_origin_id": offer.seller_origin_id,
-            "seller_id": self.owner.uuid
-        }
-
         if ConstSettings.GeneralSettings.EVENT_DISPATCHING_VIA_REDIS:
+            kwargs = {
+                "price": updated_price,
+                "energy": offer.energy,
+                "seller": self.owner.name,
+                "original_offer_price": offer.original_offer_price,
+                "dispatch_event": False,
+                "seller_origin": offer.seller_origin,
+                "seller_origin_id": offer.seller_origin_id,
+                "seller_id": self.owner.uuid
+            }
             return self.owner.offer(market_id=self.markets.target, offer_args=kwargs)
         else:
-            return self.markets.target.offer(**kwargs)
+            return self.markets.target.offer(
+                price=updated_price, energy=offer.energy, seller=self.owner.name,
+                original_offer_price=offer.original_offer_price, dispatch_event=False,
+                seller_origin=offer.seller_origin, seller_origin_id=offer.seller_origin_id,
+                seller_id=self.owner.uuid)
 
     def _forward_offer(self, offer):
         # TODO: This is an ugly solution. After the december release this check needs to
@@ -82,59 +217,105 @@ class IAAEngine:
             return
 
         self._add_to_forward_offers(offer, forwarded_offer)
-        self.owner.log.trace(f"Forwarding offer {offer} to {forwarded_offer}")
+        self.owner.log.trace("Forwarding offer %s to %s", offer, forwarded_offer)
         # TODO: Ugly solution, required in order to decouple offer placement from
         # new offer event triggering
         self.markets.target.dispatch_market_offer_event(forwarded_offer)
         return forwarded_offer
 
     def _delete_forwarded_offer_entries(self, offer):
-        offer_info = self.forwarded_offers.pop(offer.id, None)
+        offer_info = self.forwarded_offers.discard(offer.id)
         if not offer_info:
             return
-        self.forwarded_offers.pop(offer_info.target_offer.id, None)
-        self.forwarded_offers.pop(offer_info.source_offer.id, None)
+        if _offer_forwarding_engines.get(offer_info.target_offer.id) is self:
+            del _offer_forwarding_engines[offer_info.target_offer.id]
 
     def tick(self, *, area):
         self.propagate_offer(area.current_tick)
 
-    def propagate_offer(self, current_tick):
-        # Store age of offer
-        for offer in self.markets.source.offers.values():
+    def event_offer(self, *, market_id, offer):
+        if market_id == self.markets.source.id:
+            self._add_new_offer(offer)
+
+    def _add_new_offer(self, offer):
+        if d3a.constants.SINGLE_TICK_PROPAGATION:
+            # Forward right away, so that the forwarded offer triggers the next hop in turn
+            current_tick = self.owner.owner.current_tick
             if offer.id not in self.offer_age:
                 self.offer_age[offer.id] = current_tick
+            if offer.id not in self.forwarded_offers:
+                self._propagate_offer_with_id(offer.id, current_tick)
+        else:
+            self._new_offers.append(offer)
+
+    def _enqueue(self, queue, order_id, eligible_tick):
+        heapq.heappush(queue, (eligible_tick, next(self._queue_sequence), order_id))
+
+    @staticmethod
+    def _dequeue_eligible(queue, current_tick):
+        while queue and queue[0][0] <= current_tick:
+            yield heapq.heappop(queue)[2]
+
+    def _store_new_order_ages(self, new_orders, source_orders, order_age, min_age, queue,
+                              current_tick):
+        """Store the age of the orders that appeared in the source market since the last tick
+        and enqueue them for the tick that they reach the min age."""
+        for order in new_orders:
+            if order.id in order_age or order.id not in source_orders:
+                continue
+            order_age[order.id] = current_tick
+            self._enqueue(queue, order.id, current_tick + min_age)
 
-        # Use `list()` to avoid in place modification errors
-        for offer_id, age in list(self.offer_age.items()):
-            if offer_id in self.forwarded_offers:
+    def propagate_offer(self, current_tick):
+        if not self._is_source_market_scanned:
+            self._new_offers.extend(self.markets.source.offers.values())
+            self._is_source_market_scanned = True
+        new_offers, self._new_offers = self._new_offers, []
+        # Store age of offer
+        self._store_new_order_ages(new_offers, self.markets.source.offers, self.offer_age,
+                                   self.min_offer_age, self._offer_queue, current_tick)
+
+        # Only visit the offers that reached the min offer age, the ones that have been
+        # forwarded, traded or deleted in the meantime are skipped.
+        for offer_id in self._dequeue_eligible(self._offer_queue, current_tick):
+            age = self.offer_age.get(offer_id)
+            if age is None or offer_id in self.forwarded_offers:
                 continue
             if current_tick - age < self.min_offer_age:
+                # The age has been inherited by a split offer in the meantime
+                self._enqueue(self._offer_queue, offer_id, age + self.min_offer_age)
                 continue
-            offer = self.markets.source.offers.get(offer_id)
-            if not offer:
-                # Offer has gone - remove from age dict
-                # Because an offer forwarding might trigger a trade event, the offer_age dict might
-                # be modified, thus causing a removal from the offer_age dict. In such a case, even
-                # if the offer is no longer in the offer_age dict, the execution should continue
-                # normally.
-                self.offer_age.pop(offer_id, None)
-                continue
-            if not self.owner.usable_offer(offer):
-                # Forbidden offer (i.e. our counterpart's)
-                self.offer_age.pop(offer_id, None)
-                continue
+            self._propagate_offer_with_id(offer_id, current_tick)
+
+    def _propagate_offer_with_id(self, offer_id, current_tick):
+        offer = self.markets.source.offers.get(offer_id)
+        if not offer:
+            # Offer has gone - remove from age dict
+            # Because an offer forwarding might trigger a trade event, the offer_age dict might
+            # be modified, thus causing a removal from the offer_age dict. In such a case, even
+            # if the offer is no longer in the offer_age dict, the execution should continue
+            # normally.
+            self.offer_age.pop(offer_id, None)
+            return
+        if not self.owner.usable_offer(offer):
+            # Forbidden offer (i.e. our counterpart's)
+            self.offer_age.pop(offer_id, None)
+            return
 
-            # Should never reach this point.
-            # This means that the IAA is forwarding offers with the same seller and buyer name.
-            # If we ever again reach a situation like this, we should never forward the offer.
-            if self.owner.name == offer.seller:
-                self.offer_age.pop(offer_id, None)
-                continue
+        # Should never reach this point.
+        # This means that the IAA is forwarding offers with the same seller and buyer name.
+        # If we ever again reach a situation like this, we should never forward the offer.
+        if self.owner.name == offer.seller:
+            self.offer_age.pop(offer_id, None)
+            return
 
-            forwarded_offer = self._forward_offer(offer)
-            if forwarded_offer:
-                self.owner.log.debug(f"Forwarded offer to {self.markets.source.name} "
-                                     f"{self.owner.name}, {self.name} {forwarded_offer}")
+        forwarded_offer = self._forward_offer(offer)
+        if forwarded_offer:
+            self.owner.log.debug("Forwarded offer to %s %s, %s %s", self.markets.source.name,
+                                 self.owner.name, self.name, forwarded_offer)
+        else:
+            # Retry forwarding on the next tick
+            self._enqueue(self._offer_queue, offer_id, current_tick + 1)
 
     def event_trade(self, *, trade):
         offer_info = self.forwarded_offers.get(trade.offer.id)
@@ -143,43 +324,9 @@ class IAAEngine:
             return
 
         if trade.offer.id == offer_info.target_offer.id:
-            # Offer was accepted in target market - buy in source
-            source_rate = offer_info.source_offer.energy_rate
-            target_rate = offer_info.target_offer.energy_rate
-            assert abs(source_rate) <= abs(target_rate) + FLOATING_POINT_TOLERANCE, \
-                f"offer: source_rate ({source_rate}) is not lower than target_rate ({target_rate})"
-
-            try:
-                if ConstSettings.IAASettings.MARKET_TYPE == 1:
-                    # One sided market should subtract the fees
-                    trade_offer_rate = trade.offer.energy_rate - \
-                                       trade.fee_price / trade.offer.energy
-                else:
-                    # trade_offer_rate not used in two sided markets, trade_bid_info used instead
-                    trade_offer_rate = None
-                updated_trade_bid_info = \
-                    self.markets.source.fee_class.update_forwarded_offer_trade_original_info(
-                        trade.offer_bid_trade_info, offer_info.source_offer)
-
-                trade_source = self.owner.accept_offer(
-                    market_or_id=self.markets.source,
-                    offer=offer_info.source_offer,
-                    energy=trade.offer.energy,
-                    buyer=self.owner.name,
-                    trade_rate=trade_offer_rate,
-                    trade_bid_info=updated_trade_bid_info,
-                    buyer_origin=trade.buyer_origin,
-                    buyer_origin_id=trade.buyer_origin_id,
-                    buyer_id=self.owner.uuid
-                )
-
-            except OfferNotFoundException:
-                raise OfferNotFoundException()
-            self.owner.log.debug(
-                f"[{self.markets.source.time_slot_str}] Offer accepted {trade_source}")
-
-            self._delete_forwarded_offer_entries(offer_info.source_offer)
-            self.offer_age.pop(offer_info.source_offer.id, None)
+            # Offer was accepted in target market - buy in source, and in the source markets
+            # of all levels that the offer has been forwarded through
+            self._settle_forwarded_offer_chain(trade, offer_info)
 
         elif trade.offer.id == offer_info.source_offer.id:
             # Offer was bought in source market by another party
@@ -198,6 +345,83 @@ class IAAEngine:
         assert offer_info.source_offer.id not in self.forwarded_offers
         assert offer_info.target_offer.id not in self.forwarded_offers
 
+    def _forwarded_offer_chain(self, offer_info):
+        """
+        Return the (engine, offer info) pairs of the levels that a forwarded offer has passed,
+        starting with this engine and ending with the engine that forwarded the original offer.
+        """
+        chain = [(self, offer_info)]
+        if ConstSettings.GeneralSettings.EVENT_DISPATCHING_VIA_REDIS:
+            # Offers are accepted asynchronously, every level settles on its own trade event
+            return chain
+        engine, source_offer_id = self, offer_info.source_offer.id
+        while True:
+            next_engine = _offer_forwarding_engines.get(source_offer_id)
+            if next_engine is None or next_engine.markets.target is not engine.markets.source:
+                return chain
+            next_offer_info = next_engine.forwarded_offers.get(source_offer_id)
+            if next_offer_info is None or next_offer_info.target_offer.id != source_offer_id:
+                return chain
+            chain.append((next_engine, next_offer_info))
+            engine, source_offer_id = next_engine, next_offer_info.source_offer.id
+
+    def _settle_forwarded_offer_chain(self, trade, offer_info):
+        """
+        Buy the source offers of all levels of a forwarded offer that was accepted in the
+        target market, in one pass from the top to the original offer.
+
+        The notifications of the source markets are held back until the whole chain is settled.
+        The engines have removed the settled offers from their bookkeeping by then, therefore
+        the trade events of the lower levels do not trigger the settlement a second time.
+        """
+        chain = self._forwarded_offer_chain(offer_info)
+        with ExitStack() as buffered_markets:
+            if len(chain) > 1:
+                # Entered bottom up, so that the notifications are published top down
+                for engine, _ in reversed(chain):
+                    buffered_markets.enter_context(engine.markets.source.buffered_notifications())
+            for engine, engine_offer_info in chain:
+                trade = engine._accept_source_offer(trade, engine_offer_info)
+
+    def _accept_source_offer(self, trade, offer_info):
+        source_rate = offer_info.source_rate
+        target_rate = offer_info.target_rate
+        assert abs(source_rate) <= abs(target_rate) + FLOATING_POINT_TOLERANCE, \
+            f"offer: source_rate ({source_rate}) is not lower than target_rate ({target_rate})"
+
+        try:
+            if ConstSettings.IAASettings.MARKET_TYPE == 1:
+                # One sided market should subtract the fees
+                trade_offer_rate = trade.offer.energy_rate - \
+                                   trade.fee_price / trade.offer.energy
+            else:
+                # trade_offer_rate not used in two sided markets, trade_bid_info used instead
+                trade_offer_rate = None
+            updated_trade_bid_info = \
+                self.markets.source.fee_class.update_forwarded_offer_trade_original_info(
+                    trade.offer_bid_trade_info, offer_info.source_offer)
+
+            trade_source = self.owner.accept_offer(
+                market_or_id=self.markets.source,
+                offer=offer_info.source_offer,
+                energy=trade.offer.energy,
+                buyer=self.owner.name,
+                trade_rate=trade_offer_rate,
+                trade_bid_info=updated_trade_bid_info,
+                buyer_origin=trade.buyer_origin,
+                buyer_origin_id=trade.buyer_origin_id,
+                buyer_id=self.owner.uuid
+            )
+
+        except OfferNotFoundException:
+            raise OfferNotFoundException()
+        self.owner.log.debug(
+            "[%s] Offer accepted %s", self.markets.source.time_slot_str, trade_source)
+
+        self._delete_forwarded_offer_entries(offer_info.source_offer)
+        self.offer_age.pop(offer_info.source_offer.id, None)
+        return trade_source
+
     def event_offer_deleted(self, *, offer):
         if offer.id in self.offer_age:
             # Offer we're watching in source market was deleted - remove
@@ -224,6 +448,11 @@ class IAAEngine:
         if market is None:
             return
 
+        if market == self.markets.source and accepted_offer.id not in self.forwarded_offers:
+            # The residual of an offer that has not been forwarded yet is a new offer, the
+            # residuals of forwarded offers are handled below
+            self._add_new_offer(residual_offer)
+
         if market == self.markets.target and accepted_offer.id in self.forwarded_offers:
             # offer was split in target market, also split in source market
 
@@ -264,14 +493,41 @@ class IAAEngine:
         if original_offer.id in self.offer_age:
             self.offer_age[residual_offer.id] = self.offer_age.pop(original_offer.id)
 
-        self.owner.log.debug(f"Offer {short_offer_bid_log_str(local_offer)} was split into "
-                             f"{short_offer_bid_log_str(local_split_offer)} and "
-                             f"{short_offer_bid_log_str(local_residual_offer)}")
+        self.owner.log.debug("Offer %s was split into %s and %s", ShortLogStr(local_offer),
+                             ShortLogStr(local_split_offer), ShortLogStr(local_residual_offer))
 
     def _add_to_forward_offers(self, source_offer, target_offer):
-        offer_info = OfferInfo(copy_offer(source_offer), copy_offer(target_offer))
-        self.forwarded_offers[source_offer.id] = offer_info
-        self.forwarded_offers[target_offer.id] = offer_info
+        self.forwarded_offers.add(OfferInfo(source_offer, target_offer,
+                                            source_offer.energy_rate, target_offer.energy_rate))
+        _offer_forwarding_engines[target_offer.id] = self
+
+
+class IAAEnginePool:
+    """
+    Engines of the IAAs of past market slots, recycled for the IAAs of new market slots.
+
+    Detached engines keep their (empty) bookkeeping containers, so that acquiring an engine from
+    the pool only binds it to the new markets.
+    """
+
+    def __init__(self):
+        self._engines = {}  # type: Dict[type, List[IAAEngine]]
+
+    def acquire(self, engine_class, *args):
+        """Return an engine of engine_class bound with args, recycled if one is available."""
+        engines = self._engines.get(engine_class)
+        if not engines:
+            return engine_class(*args)
+        engine = engines.pop()
+        engine.attach(*args)
+        return engine
+
+    def release(self, engine):
+        engine.detach()
+        self._engines.setdefault(type(engine), []).append(engine)
+
+    def __len__(self):
+        return sum(len(engines) for engines in self._engines.values())
 
 
 class BalancingEngine(IAAEngine):
@@ -284,5 +540,6 @@ class BalancingEngine(IAAEngine):
             from_agent=True
         )
         self._add_to_forward_offers(offer, forwarded_balancing_offer)
-        self.owner.log.trace(f"Forwarding balancing offer {offer} to {forwarded_balancing_offer}")
+        self.owner.log.trace("Forwarding balancing offer %s to %s",
+                             offer, forwarded_balancing_offer)
         return forwarded_balancing_offer
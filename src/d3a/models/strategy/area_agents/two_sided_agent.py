@@ -15,8 +15,9 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from numpy.random import random
+from d3a.d3a_core.random_streams import shuffled
 from d3a.models.strategy.area_agents.one_sided_agent import OneSidedAgent
+from d3a.models.strategy.area_agents.one_sided_engine import IAAEnginePool
 from d3a.models.strategy.area_agents.two_sided_engine import TwoSidedEngine
 from d3a_interface.constants_limits import ConstSettings
 
@@ -25,31 +26,44 @@ class TwoSidedAgent(OneSidedAgent):
 
     def __init__(self, *, owner, higher_market, lower_market,
                  min_offer_age=ConstSettings.IAASettings.MIN_OFFER_AGE,
-                 min_bid_age=ConstSettings.IAASettings.MIN_BID_AGE):
-        self.engines = [
-            TwoSidedEngine('High -> Low', higher_market, lower_market, min_offer_age,
-                           min_bid_age, self),
-            TwoSidedEngine('Low -> High', lower_market, higher_market, min_offer_age,
-                           min_bid_age, self),
-        ]
+                 min_bid_age=ConstSettings.IAASettings.MIN_BID_AGE,
+                 engine_pool: IAAEnginePool = None):
         super().__init__(owner=owner,
                          higher_market=higher_market, lower_market=lower_market,
-                         min_offer_age=min_offer_age, do_create_engine=False)
+                         min_offer_age=min_offer_age, engine_pool=engine_pool)
+        self.min_bid_age = min_bid_age
+
+    def _create_engines(self):
+        return [
+            self._acquire_engine(TwoSidedEngine, 'High -> Low', self.higher_market,
+                                 self.lower_market, self.min_offer_age, self.min_bid_age, self),
+            self._acquire_engine(TwoSidedEngine, 'Low -> High', self.lower_market,
+                                 self.higher_market, self.min_offer_age, self.min_bid_age, self),
+        ]
+
+    def _has_orders(self):
+        return super()._has_orders() or bool(self.lower_market.bids or self.higher_market.bids)
 
     def usable_bid(self, bid):
         """Prevent IAAEngines from trading their counterpart's bids"""
         return all(bid.id not in engine.forwarded_bids.keys() for engine in self.engines)
 
+    def event_bid(self, *, market_id, bid):
+        if self._engines is None and not self._is_agent_market(market_id):
+            return
+        for engine in self.engines:
+            engine.event_bid(market_id=market_id, bid=bid)
+
     def event_bid_traded(self, *, market_id, bid_trade):
-        for engine in sorted(self.engines, key=lambda _: random()):
+        for engine in shuffled(self.rng, self._created_engines):
             engine.event_bid_traded(bid_trade=bid_trade)
 
     def event_bid_deleted(self, *, market_id, bid):
-        for engine in sorted(self.engines, key=lambda _: random()):
+        for engine in shuffled(self.rng, self._created_engines):
             engine.event_bid_deleted(bid=bid)
 
     def event_bid_split(self, *, market_id, original_bid, accepted_bid, residual_bid):
-        for engine in sorted(self.engines, key=lambda _: random()):
+        for engine in shuffled(self.rng, self._created_engines):
             engine.event_bid_split(market_id=market_id,
                                    original_bid=original_bid,
                                    accepted_bid=accepted_bid,
@@ -16,26 +16,54 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 from collections import namedtuple
-from typing import Dict  # NOQA
+from contextlib import ExitStack
+from typing import Dict, List  # NOQA
+from weakref import WeakValueDictionary
 from d3a.models.strategy.area_agents.inter_area_agent import InterAreaAgent  # NOQA
-from d3a.models.strategy.area_agents.one_sided_engine import IAAEngine
+from d3a.models.strategy.area_agents.one_sided_engine import IAAEngine, ForwardingTable
 from d3a.d3a_core.exceptions import BidNotFound, MarketException
 from d3a.models.market.market_structures import Bid
-from d3a.d3a_core.util import short_offer_bid_log_str
+from d3a.d3a_core.util import ShortLogStr
+import d3a.constants
 from d3a.constants import FLOATING_POINT_TOLERANCE
 
 
-BidInfo = namedtuple('BidInfo', ('source_bid', 'target_bid'))
+# Live bids and rate snapshots, see OfferInfo
+BidInfo = namedtuple('BidInfo', ('source_bid', 'target_bid', 'source_rate', 'target_rate'))
+
+# Forwarded bid id -> engine that forwarded the bid, see _offer_forwarding_engines
+_bid_forwarding_engines = WeakValueDictionary()  # type: WeakValueDictionary
 
 
 class TwoSidedEngine(IAAEngine):
     def __init__(self, name: str, market_1, market_2, min_offer_age: int, min_bid_age: int,
                  owner: "InterAreaAgent"):
         super().__init__(name, market_1, market_2, min_offer_age, owner)
-        self.forwarded_bids = {}  # type: Dict[str, BidInfo]
+        self.forwarded_bids = ForwardingTable()  # type: ForwardingTable
         self.bid_trade_residual = {}  # type: Dict[str, Bid]
-        self.min_bid_age = min_bid_age
+        self.min_bid_age = 0 if d3a.constants.SINGLE_TICK_PROPAGATION else min_bid_age
         self.bid_age = {}
+        # Bids of the source market that appeared since the last tick, see IAAEngine
+        self._new_bids = []  # type: List[Bid]
+        self._is_source_market_bids_scanned = False
+        self._bid_queue = []  # type: List[tuple]
+
+    def attach(self, name: str, market_1, market_2, min_offer_age: int, min_bid_age: int,
+               owner: "InterAreaAgent"):
+        super().attach(name, market_1, market_2, min_offer_age, owner)
+        self.min_bid_age = 0 if d3a.constants.SINGLE_TICK_PROPAGATION else min_bid_age
+        self._is_source_market_bids_scanned = False
+
+    def detach(self):
+        for bid_info in self.forwarded_bids.infos():
+            if _bid_forwarding_engines.get(bid_info.target_bid.id) is self:
+                del _bid_forwarding_engines[bid_info.target_bid.id]
+        super().detach()
+        self.forwarded_bids.clear()
+        self.bid_trade_residual.clear()
+        self.bid_age.clear()
+        self._new_bids.clear()
+        self._bid_queue.clear()
 
     def __repr__(self):
         return "<TwoSidedPayAsBidEngine [{s.owner.name}] {s.name} " \
@@ -67,15 +95,15 @@ class TwoSidedEngine(IAAEngine):
             return
 
         self._add_to_forward_bids(bid, forwarded_bid)
-        self.owner.log.trace(f"Forwarding bid {bid} to {forwarded_bid}")
+        self.owner.log.trace("Forwarding bid %s to %s", bid, forwarded_bid)
         return forwarded_bid
 
     def _delete_forwarded_bid_entries(self, bid):
-        bid_info = self.forwarded_bids.pop(bid.id, None)
+        bid_info = self.forwarded_bids.discard(bid.id)
         if not bid_info:
             return
-        self.forwarded_bids.pop(bid_info.target_bid.id, None)
-        self.forwarded_bids.pop(bid_info.source_bid.id, None)
+        if _bid_forwarding_engines.get(bid_info.target_bid.id) is self:
+            del _bid_forwarding_engines[bid_info.target_bid.id]
 
     def should_forward_bid(self, bid, current_tick):
 
@@ -93,22 +121,58 @@ class TwoSidedEngine(IAAEngine):
 
         return True
 
-    def tick(self, *, area):
-        super().tick(area=area)
+    def event_bid(self, *, market_id, bid):
+        if market_id == self.markets.source.id:
+            self._add_new_bid(bid)
 
-        for bid_id, bid in self.markets.source.get_bids().items():
+    def _add_new_bid(self, bid):
+        if d3a.constants.SINGLE_TICK_PROPAGATION:
+            # Forward right away, so that the forwarded bid triggers the next hop in turn
+            current_tick = self.owner.owner.current_tick
             if bid.id not in self.bid_age:
-                self.bid_age[bid.id] = area.current_tick
+                self.bid_age[bid.id] = current_tick
+            if bid.id not in self.forwarded_bids:
+                self._propagate_bid(self.markets.source.get_bids().get(bid.id), current_tick)
+        else:
+            self._new_bids.append(bid)
+
+    def tick(self, *, area):
+        super().tick(area=area)
 
-            if self.should_forward_bid(bid, area.current_tick):
-                self._forward_bid(bid)
+        current_tick = area.current_tick
+        source_bids = self.markets.source.get_bids()
+        if not self._is_source_market_bids_scanned:
+            self._new_bids.extend(source_bids.values())
+            self._is_source_market_bids_scanned = True
+        new_bids, self._new_bids = self._new_bids, []
+        self._store_new_order_ages(new_bids, source_bids, self.bid_age, self.min_bid_age,
+                                   self._bid_queue, current_tick)
+
+        # Only visit the bids that reached the min bid age
+        for bid_id in self._dequeue_eligible(self._bid_queue, current_tick):
+            bid = source_bids.get(bid_id)
+            age = self.bid_age.get(bid_id)
+            if bid is None or age is None or bid_id in self.forwarded_bids:
+                # Bid was traded, deleted or already forwarded in the meantime
+                continue
+            if current_tick - age < self.min_bid_age:
+                self._enqueue(self._bid_queue, bid_id, age + self.min_bid_age)
+                continue
+            self._propagate_bid(bid, current_tick)
+
+    def _propagate_bid(self, bid, current_tick):
+        if bid is None or not self.should_forward_bid(bid, current_tick):
+            return
+        if not self._forward_bid(bid):
+            # Retry forwarding on the next tick
+            self._enqueue(self._bid_queue, bid.id, current_tick + 1)
 
     def delete_forwarded_bids(self, bid_info):
         try:
             self.markets.target.delete_bid(bid_info.target_bid)
         except BidNotFound:
-            self.owner.log.trace(f"Bid {bid_info.target_bid.id} not "
-                                 f"found in the target market.")
+            self.owner.log.trace("Bid %s not found in the target market.",
+                                 bid_info.target_bid.id)
         self._delete_forwarded_bid_entries(bid_info.source_bid)
 
     def event_bid_traded(self, *, bid_trade):
@@ -117,45 +181,9 @@ class TwoSidedEngine(IAAEngine):
             return
 
         if bid_trade.offer.id == bid_info.target_bid.id:
-            # Bid was traded in target market, buy in source
-            market_bid = self.markets.source.bids[bid_info.source_bid.id]
-            assert bid_trade.offer.energy <= market_bid.energy, \
-                "Traded bid on target market has more energy than the market bid."
-
-            source_rate = bid_info.source_bid.energy_rate
-            target_rate = bid_info.target_bid.energy_rate
-            assert abs(source_rate) + FLOATING_POINT_TOLERANCE >= abs(target_rate), \
-                f"bid: source_rate ({source_rate}) is not lower than target_rate ({target_rate})"
-
-            trade_rate = (bid_trade.offer.price/bid_trade.offer.energy)
-
-            if bid_trade.offer_bid_trade_info is not None:
-                # Adapt trade_offer_info received by the trade to include source market grid fees,
-                # which was skipped when accepting the bid during the trade operation.
-                updated_trade_offer_info = \
-                    self.markets.source.fee_class.propagate_original_offer_info_on_bid_trade(
-                        bid_trade.offer_bid_trade_info
-                    )
-            else:
-                updated_trade_offer_info = bid_trade.offer_bid_trade_info
-
-            trade_offer_info = \
-                self.markets.source.fee_class.update_forwarded_bid_trade_original_info(
-                    updated_trade_offer_info, market_bid
-                )
-            self.markets.source.accept_bid(
-                bid=market_bid,
-                energy=bid_trade.offer.energy,
-                seller=self.owner.name,
-                already_tracked=False,
-                trade_rate=trade_rate,
-                trade_offer_info=trade_offer_info,
-                seller_origin=bid_trade.seller_origin,
-                seller_origin_id=bid_trade.seller_origin_id,
-                seller_id=self.owner.uuid
-            )
-            self.delete_forwarded_bids(bid_info)
-            self.bid_age.pop(bid_info.source_bid.id, None)
+            # Bid was traded in target market, buy in source, and in the source markets of all
+            # levels that the bid has been forwarded through
+            self._settle_forwarded_bid_chain(bid_trade, bid_info)
 
         elif bid_trade.offer.id == bid_info.source_bid.id:
             # Bid was traded in the source market by someone else
@@ -165,6 +193,77 @@ class TwoSidedEngine(IAAEngine):
             raise Exception(f"Invalid bid state for IAA {self.owner.name}: "
                             f"traded bid {bid_trade} was not in offered bids tuple {bid_info}")
 
+    def _forwarded_bid_chain(self, bid_info):
+        """
+        Return the (engine, bid info) pairs of the levels that a forwarded bid has passed,
+        starting with this engine and ending with the engine that forwarded the original bid.
+        """
+        chain = [(self, bid_info)]
+        engine, source_bid_id = self, bid_info.source_bid.id
+        while True:
+            next_engine = _bid_forwarding_engines.get(source_bid_id)
+            if next_engine is None or next_engine.markets.target is not engine.markets.source:
+                return chain
+            next_bid_info = next_engine.forwarded_bids.get(source_bid_id)
+            if next_bid_info is None or next_bid_info.target_bid.id != source_bid_id:
+                return chain
+            chain.append((next_engine, next_bid_info))
+            engine, source_bid_id = next_engine, next_bid_info.source_bid.id
+
+    def _settle_forwarded_bid_chain(self, bid_trade, bid_info):
+        """
+        Sell to the source bids of all levels of a forwarded bid that was traded in the target
+        market, in one pass, see IAAEngine._settle_forwarded_offer_chain.
+        """
+        chain = self._forwarded_bid_chain(bid_info)
+        with ExitStack() as buffered_markets:
+            if len(chain) > 1:
+                for engine, _ in reversed(chain):
+                    buffered_markets.enter_context(engine.markets.source.buffered_notifications())
+            for engine, engine_bid_info in chain:
+                bid_trade = engine._accept_source_bid(bid_trade, engine_bid_info)
+
+    def _accept_source_bid(self, bid_trade, bid_info):
+        market_bid = self.markets.source.bids[bid_info.source_bid.id]
+        assert bid_trade.offer.energy <= market_bid.energy, \
+            "Traded bid on target market has more energy than the market bid."
+
+        source_rate = bid_info.source_rate
+        target_rate = bid_info.target_rate
+        assert abs(source_rate) + FLOATING_POINT_TOLERANCE >= abs(target_rate), \
+            f"bid: source_rate ({source_rate}) is not lower than target_rate ({target_rate})"
+
+        trade_rate = (bid_trade.offer.price/bid_trade.offer.energy)
+
+        if bid_trade.offer_bid_trade_info is not None:
+            # Adapt trade_offer_info received by the trade to include source market grid fees,
+            # which was skipped when accepting the bid during the trade operation.
+            updated_trade_offer_info = \
+                self.markets.source.fee_class.propagate_original_offer_info_on_bid_trade(
+                    bid_trade.offer_bid_trade_info
+                )
+        else:
+            updated_trade_offer_info = bid_trade.offer_bid_trade_info
+
+        trade_offer_info = \
+            self.markets.source.fee_class.update_forwarded_bid_trade_original_info(
+                updated_trade_offer_info, market_bid
+            )
+        source_bid_trade = self.markets.source.accept_bid(
+            bid=market_bid,
+            energy=bid_trade.offer.energy,
+            seller=self.owner.name,
+            already_tracked=False,
+            trade_rate=trade_rate,
+            trade_offer_info=trade_offer_info,
+            seller_origin=bid_trade.seller_origin,
+            seller_origin_id=bid_trade.seller_origin_id,
+            seller_id=self.owner.uuid
+        )
+        self.delete_forwarded_bids(bid_info)
+        self.bid_age.pop(bid_info.source_bid.id, None)
+        return source_bid_trade
+
     def event_bid_deleted(self, *, bid):
         bid_id = bid.id if isinstance(bid, Bid) else bid
         bid_info = self.forwarded_bids.get(bid_id)
@@ -182,12 +281,20 @@ class TwoSidedEngine(IAAEngine):
                 self.owner.log.exception("Error deleting InterAreaAgent bid")
         self._delete_forwarded_bid_entries(bid_info.source_bid)
         self.bid_age.pop(bid_info.source_bid.id, None)
+        if bid_info.source_bid.id != bid_id:
+            # The forwarded bid was deleted, the source bid can be forwarded again
+            self._add_new_bid(bid_info.source_bid)
 
     def event_bid_split(self, *, market_id, original_bid, accepted_bid, residual_bid):
         market = self.owner._get_market_from_market_id(market_id)
         if market is None:
             return
 
+        if market == self.markets.source and accepted_bid.id not in self.forwarded_bids:
+            # The residual of a bid that has not been forwarded yet is a new bid, the
+            # residuals of forwarded bids are handled below
+            self._add_new_bid(residual_bid)
+
         if market == self.markets.target and accepted_bid.id in self.forwarded_bids:
             # bid was split in target market, also split the corresponding forwarded bid
             # in the source market
@@ -228,11 +335,10 @@ class TwoSidedEngine(IAAEngine):
         else:
             return
 
-        self.owner.log.debug(f"Bid {short_offer_bid_log_str(local_bid)} was split into "
-                             f"{short_offer_bid_log_str(local_split_bid)} and "
-                             f"{short_offer_bid_log_str(local_residual_bid)}")
+        self.owner.log.debug("Bid %s was split into %s and %s", ShortLogStr(local_bid),
+                             ShortLogStr(local_split_bid), ShortLogStr(local_residual_bid))
 
     def _add_to_forward_bids(self, source_bid, target_bid):
-        bid_info = BidInfo(source_bid, target_bid)
-        self.forwarded_bids[source_bid.id] = bid_info
-        self.forwarded_bids[target_bid.id] = bid_info
+        self.forwarded_bids.add(BidInfo(source_bid, target_bid,
+                                        source_bid.energy_rate, target_bid.energy_rate))
+        _bid_forwarding_engines[target_bid.id] = self
@@ -90,6 +90,7 @@ def unregister_area(redis, channel_prefix, is_connected, transaction_id):
 
 
 class ExternalMixin:
+    fleet_price_updaters = ()
 
     def __init__(self, *args, **kwargs):
         self._connected = False
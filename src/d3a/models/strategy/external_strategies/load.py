@@ -221,9 +221,14 @@ class LoadExternalMixin(ExternalMixin):
                 self.redis.publish_json(market_event_channel, market_info)
 
             self._delete_past_state()
+            # The device may have just connected, its demand must not be bought automatically
+            self._update_demand_registrations()
         else:
             super().event_market_cycle()
 
+    def _uses_demand_queue(self):
+        return self.should_use_default_strategy and super()._uses_demand_queue()
+
     def _area_reconfigure_prices(self, **kwargs):
         if self.should_use_default_strategy:
             super()._area_reconfigure_prices(**kwargs)
@@ -0,0 +1,141 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from copy import deepcopy
+from logging import getLogger
+from typing import Dict, List  # noqa
+
+from d3a.d3a_core.profile_store import SlotProfile
+from d3a.d3a_core.random_streams import RandomStreamMixin, shuffled
+from d3a.events.event_structures import AreaEvent
+
+log = getLogger(__name__)
+
+# Minimum number of homogeneous devices under an area that are grouped to a fleet
+MIN_FLEET_SIZE = 2
+
+
+class StrategyFleet(RandomStreamMixin):
+    """
+    Group of template strategies of the same class and price settings under one area.
+
+    The members of a fleet share their price updaters (the strategy attributes that are listed
+    in fleet_price_updaters), so the update schedule of the fleet is only kept and advanced
+    once instead of once per device. The fleet dispatches the tick event to its members, and
+    calculates the data that all members need on a tick (which price updaters are due) only
+    once per tick. The energy state and the orders stay in the members.
+    """
+
+    def __init__(self, members):
+        self.members = list(members)  # type: List
+        leader = self.members[0]
+        self.area = leader.area
+        self.price_updaters = leader.fleet_price_updaters
+        for member in self.members[1:]:
+            for updater_name in self.price_updaters:
+                setattr(member, updater_name, getattr(leader, updater_name))
+        for member in self.members:
+            member.fleet = self
+        self._due_price_updaters = set()
+
+    def __len__(self):
+        return len(self.members)
+
+    @property
+    def random_stream_key(self):
+        return f"fleet:{self.members[0].owner.random_stream_key}"
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}({type(self.members[0]).__name__}, "
+                f"{len(self.members)} members)")
+
+    def remove(self, member):
+        """Take a member out of the fleet, it continues with a copy of the price updaters."""
+        self.members.remove(member)
+        for updater_name in self.price_updaters:
+            setattr(member, updater_name, deepcopy(getattr(member, updater_name)))
+        member.fleet = None
+
+    def dissolve(self):
+        """Take all members out of the fleet."""
+        for member in list(self.members):
+            self.remove(member)
+
+    def is_price_update_due(self, updater_name):
+        """Return whether the price updater is due for any market on the current tick."""
+        return updater_name in self._due_price_updaters
+
+    def _start_tick(self):
+        leader = self.members[0]
+        self._due_price_updaters = {
+            updater_name for updater_name in self.price_updaters
+            if any(getattr(leader, updater_name).time_for_price_update(leader, market.time_slot)
+                   for market in self.area.all_markets)}
+
+    def _finish_tick(self):
+        leader = self.members[0]
+        for updater_name in self._due_price_updaters:
+            getattr(leader, updater_name).increment_update_counter_all_markets(leader)
+
+    def dispatch_tick(self):
+        """Dispatch the tick event to all members in random order."""
+        if not self.members:
+            return
+        self._start_tick()
+        for member in shuffled(self.rng, self.members):
+            member.owner.dispatcher.event_listener(AreaEvent.TICK)
+        self._finish_tick()
+
+
+def _profile_key(profile):
+    # Equal profiles of the profile store are shared instances and are compared by identity,
+    # profiles that were changed at runtime are plain dicts and are compared by value
+    if isinstance(profile, SlotProfile):
+        return id(profile)
+    if isinstance(profile, dict):
+        return tuple(sorted(profile.items()))
+    return profile
+
+
+def _price_updater_key(updater):
+    # The energy rate change profile is only used without fit_to_limit
+    energy_rate_change_profile = None if updater.fit_to_limit else \
+        _profile_key(updater.energy_rate_change_per_update_profile_buffer)
+    return (_profile_key(updater.initial_rate_profile_buffer),
+            _profile_key(updater.final_rate_profile_buffer),
+            energy_rate_change_profile, updater.update_interval, updater.fit_to_limit,
+            updater.rate_limit_object, tuple(sorted(updater.update_counter.items())))
+
+
+def _fleet_key(strategy):
+    return (type(strategy),
+            tuple(_price_updater_key(getattr(strategy, updater_name))
+                  for updater_name in strategy.fleet_price_updaters))
+
+
+def create_strategy_fleets(children, min_fleet_size=MIN_FLEET_SIZE):
+    """Group the strategies of the children of an area to fleets of homogeneous devices."""
+    groups = {}  # type: Dict[tuple, List]
+    for child in children:
+        strategy = child.strategy
+        if strategy is None or not strategy.fleet_price_updaters or strategy.fleet is not None:
+            continue
+        groups.setdefault(_fleet_key(strategy), []).append(strategy)
+    fleets = [StrategyFleet(group) for group in groups.values() if len(group) >= min_fleet_size]
+    for fleet in fleets:
+        log.debug(f"Created {fleet} under area {fleet.area.name}.")
+    return fleets
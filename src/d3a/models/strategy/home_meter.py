@@ -20,15 +20,19 @@ from d3a_interface.constants_limits import ConstSettings
 from d3a_interface.validators.home_meter_validator import HomeMeterValidator
 from d3a_interface.read_user_profile import read_arbitrary_profile, InputProfileTypes
 from d3a_interface.utils import find_object_of_same_weekday_and_time
-from numpy import random
 from pendulum import duration
 
 from d3a import constants
 from d3a.constants import FLOATING_POINT_TOLERANCE, DEFAULT_PRECISION
 from d3a.d3a_core.exceptions import D3AException
 from d3a.d3a_core.exceptions import MarketException
+from d3a.d3a_core.random_streams import random_choice
+from d3a.d3a_core.profile_store import find_profile_value
+from d3a.d3a_core.singletons import profile_store
 from d3a.d3a_core.util import get_market_maker_rate_from_config
+from d3a.events.event_structures import MarketEvent
 from d3a.models.market import Market
+from d3a.models.market.demand_queue import is_demand_queue_enabled
 from d3a.models.market.market_structures import Offer
 from d3a.models.state import HomeMeterState
 from d3a.models.strategy import BidEnabledStrategy
@@ -188,6 +192,14 @@ class HomeMeterStrategy(BidEnabledStrategy):
                 self._post_first_bid(market)
 
         self._delete_past_state()
+        self._update_demand_registrations()
+
+    def subscribed_event_types(self):
+        # Offers are only accepted directly in one-sided markets, unless their demand queue
+        # matches the offers with the device
+        if ConstSettings.IAASettings.MARKET_TYPE != 1 or is_demand_queue_enabled():
+            return self.handled_event_types_without(MarketEvent.OFFER)
+        return super().subscribed_event_types()
 
     def event_offer(self, *, market_id, offer):
         """Automatically react to offers (trying to buy energy) in one-sided markets.
@@ -425,7 +437,7 @@ class HomeMeterStrategy(BidEnabledStrategy):
 
         for market in self.area.all_markets:
             slot_time = market.time_slot
-            energy_kWh = find_object_of_same_weekday_and_time(self.profile, slot_time)
+            energy_kWh = find_profile_value(self.profile, slot_time)
             # For the Home Meter, the energy amount can be either positive (consumption) or
             # negative (production).
             consumed_energy = energy_kWh if energy_kWh > 0 else 0.0
@@ -444,7 +456,7 @@ class HomeMeterStrategy(BidEnabledStrategy):
     @staticmethod
     def _read_raw_profile_data(profile):
         """Return the preprocessed the raw profile data."""
-        return read_arbitrary_profile(InputProfileTypes.POWER, profile)
+        return profile_store.intern(read_arbitrary_profile(InputProfileTypes.POWER, profile))
 
     @staticmethod
     def _convert_update_interval_to_duration(update_interval):
@@ -521,6 +533,7 @@ class HomeMeterStrategy(BidEnabledStrategy):
 
         # Bid prices have been updated, so we increase the counter of the bid updates
         self.bid_update.increment_update_counter_all_markets(self)
+        self._update_demand_registrations()
 
     def _event_tick_production(self):
         self.offer_update.update(self)
@@ -553,10 +566,47 @@ class HomeMeterStrategy(BidEnabledStrategy):
         except MarketException:
             self.log.exception("An Error occurred while buying an offer.")
 
-    @staticmethod
-    def _find_acceptable_offer(market):
+    def accept_queued_offer(self, market, offer):
+        """Buy an offer that the demand queue of the market matched with the registered demand."""
+        # The queue doesn't go through the event dispatching, so the checks of the event
+        # delivery are repeated here
+        if self._uses_demand_queue() and self._offer_comes_from_different_seller(offer):
+            self._one_sided_market_event_tick(market, offer)
+        self._update_demand_registration(market)
+
+    def _uses_demand_queue(self):
+        """Return whether the device buys the offers that the demand queues hand over."""
+        return self.is_trading_enabled
+
+    def trigger_enable(self, **kw):
+        super().trigger_enable(**kw)
+        self._update_demand_registrations()
+
+    def trigger_disable(self):
+        super().trigger_disable()
+        self._update_demand_registrations()
+
+    def _update_demand_registrations(self):
+        if not is_demand_queue_enabled():
+            return
+        for market in self.area.all_markets:
+            self._update_demand_registration(market)
+
+    def _update_demand_registration(self, market):
+        """Register the energy that the device still needs to consume and the rate it pays."""
+        if market.demand_queue is None:
+            return
+        time_slot = market.time_slot
+        if self._uses_demand_queue() and self.state.can_buy_more_energy(time_slot):
+            market.demand_queue.register(
+                self, self.bid_update.get_updated_rate(time_slot),
+                self.state.get_energy_requirement_Wh(time_slot) / 1000.0)
+        else:
+            market.demand_queue.unregister(self)
+
+    def _find_acceptable_offer(self, market):
         offers = market.most_affordable_offers
-        return random.choice(offers)
+        return random_choice(self.rng, offers)
 
     def event_balancing_market_cycle(self):
         # TODO: implement
@@ -23,7 +23,7 @@ from d3a_interface.read_user_profile import read_arbitrary_profile, InputProfile
 from d3a.models.strategy.commercial_producer import CommercialStrategy
 from d3a.models.strategy import BidEnabledStrategy, INF_ENERGY
 from d3a.d3a_core.exceptions import MarketException
-from d3a_interface.utils import find_object_of_same_weekday_and_time
+from d3a.d3a_core.profile_store import find_profile_value
 
 
 class InfiniteBusStrategy(CommercialStrategy, BidEnabledStrategy):
@@ -74,12 +74,12 @@ class InfiniteBusStrategy(CommercialStrategy, BidEnabledStrategy):
                 else read_arbitrary_profile(InputProfileTypes.IDENTITY, self.energy_buy_rate)
 
     def buy_energy(self, market):
+        energy_buy_rate = find_profile_value(self.energy_buy_rate, market.time_slot)
         for offer in market.sorted_offers:
             if offer.seller == self.owner.name:
                 # Don't buy our own offer
                 continue
-            if offer.energy_rate <= find_object_of_same_weekday_and_time(self.energy_buy_rate,
-                                                                         market.time_slot):
+            if offer.energy_rate <= energy_buy_rate:
                 try:
                     self.accept_offer(market, offer, buyer_origin=self.owner.name,
                                       buyer_origin_id=self.owner.uuid,
@@ -100,8 +100,7 @@ class InfiniteBusStrategy(CommercialStrategy, BidEnabledStrategy):
            ConstSettings.IAASettings.MARKET_TYPE == 3:
             for market in self.area.all_markets:
                 try:
-                    buy_rate = find_object_of_same_weekday_and_time(self.energy_buy_rate,
-                                                                    market.time_slot)
+                    buy_rate = find_profile_value(self.energy_buy_rate, market.time_slot)
                     self.post_bid(market,
                                   buy_rate * INF_ENERGY,
                                   INF_ENERGY)
@@ -25,7 +25,6 @@ from d3a_interface.read_user_profile import read_arbitrary_profile, InputProfile
 from d3a_interface.utils import (
     convert_W_to_Wh, find_object_of_same_weekday_and_time, key_in_dict_and_not_none)
 from d3a_interface.validators.load_validator import LoadValidator
-from numpy import random
 from pendulum import duration
 from pendulum.datetime import DateTime
 
@@ -33,8 +32,11 @@ from d3a import constants
 from d3a.constants import FLOATING_POINT_TOLERANCE, DEFAULT_PRECISION
 from d3a.d3a_core.device_registry import DeviceRegistry
 from d3a.d3a_core.exceptions import MarketException
+from d3a.d3a_core.random_streams import random_choice
 from d3a.d3a_core.util import get_market_maker_rate_from_config
+from d3a.events.event_structures import MarketEvent
 from d3a.models.market import Market
+from d3a.models.market.demand_queue import is_demand_queue_enabled
 from d3a.models.market.market_structures import Offer
 from d3a.models.state import LoadState
 from d3a.models.strategy import BidEnabledStrategy
@@ -46,6 +48,7 @@ BalancingRatio = namedtuple('BalancingRatio', ('demand', 'supply'))
 
 
 class LoadHoursStrategy(BidEnabledStrategy):
+    fleet_price_updaters = ("bid_update", )
     parameters = ('avg_power_W', 'hrs_per_day', 'hrs_of_day', 'fit_to_limit',
                   'energy_rate_increase_per_update', 'update_interval', 'initial_buying_rate',
                   'final_buying_rate', 'balancing_energy_ratio', 'use_market_maker_rate')
@@ -153,6 +156,7 @@ class LoadHoursStrategy(BidEnabledStrategy):
         self._update_energy_requirement_future_markets()
         self._set_alternative_pricing_scheme()
         self.update_state()
+        self._update_demand_registrations()
 
     def add_entry_in_hrs_per_day(self, overwrite=False):
         for market in self.area.all_markets:
@@ -225,6 +229,8 @@ class LoadHoursStrategy(BidEnabledStrategy):
 
     def area_reconfigure_event(self, **kwargs):
         """Reconfigure the device properties at runtime using the provided arguments."""
+        if self.fleet is not None:
+            self.fleet.remove(self)
         if key_in_dict_and_not_none(kwargs, 'hrs_per_day') or \
                 key_in_dict_and_not_none(kwargs, 'hrs_of_day'):
             self.assign_hours_of_per_day(kwargs['hrs_of_day'], kwargs['hrs_per_day'])
@@ -247,10 +253,9 @@ class LoadHoursStrategy(BidEnabledStrategy):
                              self.bid_update.energy_rate_change_per_update_profile_buffer,
                              self.bid_update.fit_to_limit)
 
-    @staticmethod
-    def _find_acceptable_offer(market):
+    def _find_acceptable_offer(self, market):
         offers = market.most_affordable_offers
-        return random.choice(offers)
+        return random_choice(self.rng, offers)
 
     def _offer_rate_can_be_accepted(self, offer: Offer, market_slot: Market):
         """Check if the offer rate is less than what the device wants to pay."""
@@ -301,7 +306,16 @@ class LoadHoursStrategy(BidEnabledStrategy):
                     ConstSettings.IAASettings.MARKET_TYPE == 3:
                 self._double_sided_market_event_tick(market)
 
-        self.bid_update.increment_update_counter_all_markets(self)
+        if self.fleet is None:
+            self.bid_update.increment_update_counter_all_markets(self)
+        self._update_demand_registrations()
+
+    def subscribed_event_types(self):
+        # In two-sided markets the strategy doesn't react to offers, and with the demand queue
+        # the market only hands over the offers that the load can afford
+        if ConstSettings.IAASettings.MARKET_TYPE != 1 or is_demand_queue_enabled():
+            return self.handled_event_types_without(MarketEvent.OFFER)
+        return super().subscribed_event_types()
 
     def event_offer(self, *, market_id, offer):
         """Automatically react to offers in single-sided markets.
@@ -321,6 +335,49 @@ class LoadHoursStrategy(BidEnabledStrategy):
         if self._can_buy_in_market(market) and self._offer_comes_from_different_seller(offer):
             self._one_sided_market_event_tick(market, offer)
 
+    def accept_queued_offer(self, market, offer):
+        """Buy an offer that the demand queue of the market matched with the registered demand."""
+        # The queue doesn't go through the event dispatching, so the checks of the event
+        # delivery are repeated here
+        if self._uses_demand_queue() and market.time_slot in self._cycled_market and \
+                self._can_buy_in_market(market) and \
+                self._offer_comes_from_different_seller(offer):
+            self._one_sided_market_event_tick(market, offer)
+        self._update_demand_registration(market)
+
+    def _uses_demand_queue(self):
+        """Return whether the load buys the offers that the demand queues hand over."""
+        return self.is_trading_enabled
+
+    def trigger_enable(self, **kw):
+        super().trigger_enable(**kw)
+        self._update_demand_registrations()
+
+    def trigger_disable(self):
+        super().trigger_disable()
+        self._update_demand_registrations()
+
+    def _update_demand_registrations(self):
+        if not is_demand_queue_enabled():
+            return
+        for market in self.area.all_markets:
+            self._update_demand_registration(market)
+
+    def _update_demand_registration(self, market):
+        """Register the energy that the load still needs and the rate that it pays."""
+        if market.demand_queue is None:
+            return
+        time_slot = market.time_slot
+        if self._uses_demand_queue() and time_slot in self._cycled_market and \
+                self._can_buy_in_market(market) and \
+                self.hrs_per_day[self._get_day_of_timestamp(time_slot)] > \
+                FLOATING_POINT_TOLERANCE:
+            market.demand_queue.register(
+                self, self.bid_update.get_updated_rate(time_slot),
+                self.state.get_energy_requirement_Wh(time_slot) / 1000.0)
+        else:
+            market.demand_queue.unregister(self)
+
     def _can_buy_in_market(self, market):
         return self._is_market_active(market) and self.state.can_buy_more_energy(market.time_slot)
 
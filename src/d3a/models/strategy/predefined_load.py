@@ -18,9 +18,11 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from typing import Union
 from pendulum import duration
 
-from d3a_interface.read_user_profile import read_arbitrary_profile, InputProfileTypes
-from d3a_interface.utils import key_in_dict_and_not_none, find_object_of_same_weekday_and_time
+from d3a_interface.read_user_profile import InputProfileTypes
+from d3a_interface.utils import key_in_dict_and_not_none
 from d3a_interface.constants_limits import ConstSettings
+from d3a.d3a_core.profile_store import find_profile_value
+from d3a.d3a_core.singletons import profile_store
 from d3a.models.strategy.load_hours import LoadHoursStrategy
 from d3a.d3a_core.exceptions import D3AException
 """
@@ -92,9 +94,7 @@ class DefinedLoadStrategy(LoadHoursStrategy):
         Reads the power profile data and calculates the required energy
         for each slot.
         """
-        self.load_profile = read_arbitrary_profile(
-            InputProfileTypes.POWER,
-            daily_load_profile)
+        self.load_profile = profile_store.read(InputProfileTypes.POWER, daily_load_profile)
 
     def _update_energy_requirement_future_markets(self):
         """
@@ -107,8 +107,7 @@ class DefinedLoadStrategy(LoadHoursStrategy):
                 raise D3AException(
                     f"Load {self.owner.name} tries to set its energy forecasted requirement "
                     f"without a profile.")
-            load_energy_kWh = \
-                find_object_of_same_weekday_and_time(self.load_profile, slot_time)
+            load_energy_kWh = find_profile_value(self.load_profile, slot_time)
             self.state.set_desired_energy(load_energy_kWh * 1000, slot_time, overwrite=False)
             self.state.update_total_demanded_energy(slot_time)
 
@@ -126,6 +125,8 @@ class DefinedLoadStrategy(LoadHoursStrategy):
 
     def area_reconfigure_event(self, **kwargs):
         """Reconfigure the device properties at runtime using the provided arguments."""
+        if self.fleet is not None:
+            self.fleet.remove(self)
         self._area_reconfigure_prices(**kwargs)
         if key_in_dict_and_not_none(kwargs, 'daily_load_profile'):
             self._event_activate_energy(kwargs['daily_load_profile'])
@@ -19,8 +19,10 @@ import pathlib
 from pendulum import duration
 
 from d3a_interface.constants_limits import ConstSettings
-from d3a_interface.read_user_profile import read_arbitrary_profile, InputProfileTypes
-from d3a_interface.utils import key_in_dict_and_not_none, find_object_of_same_weekday_and_time
+from d3a_interface.read_user_profile import InputProfileTypes
+from d3a_interface.utils import key_in_dict_and_not_none
+from d3a.d3a_core.profile_store import find_profile_value
+from d3a.d3a_core.singletons import profile_store
 from d3a.d3a_core.util import d3a_path
 from d3a.models.strategy.pv import PVStrategy
 from d3a.d3a_core.exceptions import D3AException
@@ -98,7 +100,10 @@ class PVPredefinedStrategy(PVStrategy):
                 raise D3AException(
                     f"PV {self.owner.name} tries to set its available energy forecast without a "
                     f"power profile.")
-            available_energy_kWh = find_object_of_same_weekday_and_time(
+            # The forecast of a slot is only set once, unless the device is reconfigured
+            if not reconfigure and self.state.has_energy_forecast(slot_time):
+                continue
+            available_energy_kWh = find_profile_value(
                 self.power_profile, slot_time) * self.panel_count
             self.state.set_available_energy(available_energy_kWh, slot_time, reconfigure)
 
@@ -121,9 +126,8 @@ class PVPredefinedStrategy(PVStrategy):
         else:
             raise ValueError("Energy_profile has to be in [0,1,2,4]")
 
-        # Populate energy production forecast data
-        self.power_profile = read_arbitrary_profile(
-            InputProfileTypes.POWER, str(profile_path))
+        # Populate energy production forecast data, shared by all PVs with the same profile
+        self.power_profile = profile_store.read(InputProfileTypes.POWER, str(profile_path))
 
     def area_reconfigure_event(self, **kwargs):
         """Reconfigure the device properties at runtime using the provided arguments."""
@@ -171,9 +175,7 @@ class PVUserProfileStrategy(PVPredefinedStrategy):
         Reads profile data from the power profile. Handles csv files and dicts.
         :return: key value pairs of time to energy in kWh
         """
-        self.power_profile = read_arbitrary_profile(
-            InputProfileTypes.POWER,
-            self._power_profile_W)
+        self.power_profile = profile_store.read(InputProfileTypes.POWER, self._power_profile_W)
 
     def area_reconfigure_event(self, **kwargs):
         """Reconfigure the device properties at runtime using the provided arguments."""
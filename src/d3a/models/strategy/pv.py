@@ -36,7 +36,13 @@ from d3a.models.strategy.update_frequency import TemplateStrategyOfferUpdater
 log = getLogger(__name__)
 
 
+# Gaussian energy forecast per minute of the day, shared by all PVs with the same maximum
+# panel power and slot length: {(max_panel_power_W, slot_length): {minute: energy_kWh}}
+_gaussian_energy_forecast_tables = {}
+
+
 class PVStrategy(BaseStrategy):
+    fleet_price_updaters = ("offer_update", )
 
     parameters = ('panel_count', 'initial_selling_rate', 'final_selling_rate',
                   'fit_to_limit', 'update_interval', 'energy_rate_decrease_per_update',
@@ -97,6 +103,8 @@ class PVStrategy(BaseStrategy):
 
     def area_reconfigure_event(self, **kwargs):
         """Reconfigure the device properties at runtime using the provided arguments."""
+        if self.fleet is not None:
+            self.fleet.remove(self)
         self._area_reconfigure_prices(**kwargs)
         self.offer_update.update_and_populate_price_settings(self.area)
 
@@ -195,19 +203,32 @@ class PVStrategy(BaseStrategy):
 
         This method is triggered by the TICK event.
         """
-        self.offer_update.update(self)
-        self.offer_update.increment_update_counter_all_markets(self)
+        if self.fleet is None:
+            self.offer_update.update(self)
+            self.offer_update.increment_update_counter_all_markets(self)
+        elif self.fleet.is_price_update_due("offer_update"):
+            self.offer_update.update(self)
 
     def set_produced_energy_forecast_kWh_future_markets(self, reconfigure=True):
         # This forecast ist based on the real PV system data provided by enphase
         # They can be found in the tools folder
         # A fit of a gaussian function to those data results in a formula Energy(time)
+        start_of_day_timestamp = self.area.now.start_of("day").timestamp()
+        forecast_table = _gaussian_energy_forecast_tables.setdefault(
+            (self.max_panel_power_W, self.area.config.slot_length), {})
         for market in self.area.all_markets:
             slot_time = market.time_slot
+            # The forecast of a slot is only set once, unless the device is reconfigured
+            if not reconfigure and self.state.has_energy_forecast(slot_time):
+                continue
             difference_to_midnight_in_minutes = \
-                slot_time.diff(self.area.now.start_of("day")).in_minutes() % (60 * 24)
-            available_energy_kWh = self.gaussian_energy_forecast_kWh(
-                difference_to_midnight_in_minutes) * self.panel_count
+                int(abs(slot_time.timestamp() - start_of_day_timestamp) / 60) % (60 * 24)
+            forecast_kWh = forecast_table.get(difference_to_midnight_in_minutes)
+            if forecast_kWh is None:
+                forecast_kWh = self.gaussian_energy_forecast_kWh(
+                    difference_to_midnight_in_minutes)
+                forecast_table[difference_to_midnight_in_minutes] = forecast_kWh
+            available_energy_kWh = forecast_kWh * self.panel_count
             self.state.set_available_energy(available_energy_kWh, slot_time, reconfigure)
 
     def gaussian_energy_forecast_kWh(self, time_in_minutes=0):
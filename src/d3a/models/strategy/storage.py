@@ -33,6 +33,7 @@ from d3a.constants import FLOATING_POINT_TOLERANCE
 from d3a.d3a_core.device_registry import DeviceRegistry
 from d3a.d3a_core.exceptions import MarketException
 from d3a.d3a_core.util import area_name_from_area_or_iaa_name
+from d3a.events.event_structures import MarketEvent
 from d3a.models.state import StorageState, ESSEnergyOrigin, EnergyOrigin
 from d3a.models.strategy import BidEnabledStrategy
 from d3a.models.strategy.update_frequency import (
@@ -49,6 +50,7 @@ BalancingSettings = ConstSettings.BalancingSettings
 
 
 class StorageStrategy(BidEnabledStrategy):
+    fleet_price_updaters = ("bid_update", "offer_update")
     parameters = ('initial_soc', 'min_allowed_soc', 'battery_capacity_kWh',
                   'max_abs_battery_power_kW', 'cap_price_strategy', 'initial_selling_rate',
                   'final_selling_rate', 'initial_buying_rate', 'final_buying_rate', 'fit_to_limit',
@@ -213,6 +215,8 @@ class StorageStrategy(BidEnabledStrategy):
 
     def area_reconfigure_event(self, **kwargs):
         """Reconfigure the device properties at runtime using the provided arguments."""
+        if self.fleet is not None:
+            self.fleet.remove(self)
         self._area_reconfigure_prices(**kwargs)
         self._update_profiles_with_default_values()
 
@@ -351,16 +355,17 @@ class StorageStrategy(BidEnabledStrategy):
 
         This method is triggered by the TICK event.
         """
-        self.state.clamp_energy_to_buy_kWh(self.future_markets_time_slots)
+        future_markets_time_slots = self.future_markets_time_slots
+        self.state.clamp_energy_to_buy_kWh(future_markets_time_slots)
 
         for market in self.area.all_markets:
             if ConstSettings.IAASettings.MARKET_TYPE == 2 or \
                     ConstSettings.IAASettings.MARKET_TYPE == 3:
-                self.state.clamp_energy_to_buy_kWh(self.future_markets_time_slots)
                 if self.are_bids_posted(market.id):
                     self.bid_update.update(market, self)
                 else:
-                    energy_kWh = self.state.energy_to_buy_dict[market.time_slot]
+                    energy_kWh = self.state.clamp_energy_to_buy_kWh_for_slot(
+                        market.time_slot, future_markets_time_slots)
                     if energy_kWh > 0:
                         try:
                             first_bid = self.post_first_bid(market, energy_kWh * 1000.0)
@@ -370,11 +375,16 @@ class StorageStrategy(BidEnabledStrategy):
                             pass
 
             self.state.tick(self.area, market.time_slot)
-        if self.cap_price_strategy is False:
+        if self.cap_price_strategy is False and \
+                (self.fleet is None or self.fleet.is_price_update_due("offer_update")):
             self.offer_update.update(self)
 
-        self.bid_update.increment_update_counter_all_markets(self)
-        if self.offer_update.increment_update_counter_all_markets(self):
+        if self.fleet is None:
+            self.bid_update.increment_update_counter_all_markets(self)
+            offer_update_due = self.offer_update.increment_update_counter_all_markets(self)
+        else:
+            offer_update_due = self.fleet.is_price_update_due("offer_update")
+        if offer_update_due:
             for market in self.area.all_markets:
                 self.buy_energy(market)
 
@@ -503,8 +513,8 @@ class StorageStrategy(BidEnabledStrategy):
             return
 
         try:
-            self.state.clamp_energy_to_buy_kWh([ma.time_slot for ma in self.area.all_markets])
-            max_energy = min(offer.energy, self.state.energy_to_buy_dict[market.time_slot])
+            max_energy = min(offer.energy, self.state.clamp_energy_to_buy_kWh_for_slot(
+                market.time_slot, [ma.time_slot for ma in self.area.all_markets]))
             if not self.state.has_battery_reached_max_power(-max_energy, market.time_slot):
                 self.state.pledged_buy_kWh[market.time_slot] += max_energy
                 self.accept_offer(market, offer, energy=max_energy,
@@ -600,6 +610,12 @@ class StorageStrategy(BidEnabledStrategy):
         self.bid_update.update_and_populate_price_settings(self.area)
         self.state.add_default_values_to_state_profiles(self.future_markets_time_slots)
 
+    def subscribed_event_types(self):
+        # The storage only buys offers directly in one-sided markets
+        if ConstSettings.IAASettings.MARKET_TYPE != 1:
+            return self.handled_event_types_without(MarketEvent.OFFER)
+        return super().subscribed_event_types()
+
     def event_offer(self, *, market_id, offer):
         super().event_offer(market_id=market_id, offer=offer)
         if ConstSettings.IAASettings.MARKET_TYPE == 1:
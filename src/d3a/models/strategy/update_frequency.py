@@ -20,7 +20,8 @@ from pendulum import duration
 
 from d3a_interface.constants_limits import ConstSettings, GlobalConfig
 from d3a_interface.read_user_profile import read_arbitrary_profile, InputProfileTypes
-from d3a_interface.utils import find_object_of_same_weekday_and_time
+from d3a.d3a_core.profile_store import find_profile_value, writable_profile
+from d3a.d3a_core.singletons import profile_store
 from d3a.d3a_core.util import write_default_to_dict
 
 
@@ -30,15 +31,15 @@ class UpdateFrequencyMixin:
                     minutes=ConstSettings.GeneralSettings.DEFAULT_UPDATE_INTERVAL),
                  rate_limit_object=max):
         self.fit_to_limit = fit_to_limit
-        self.initial_rate_profile_buffer = read_arbitrary_profile(InputProfileTypes.IDENTITY,
-                                                                  initial_rate)
+        self.initial_rate_profile_buffer = profile_store.intern(
+            read_arbitrary_profile(InputProfileTypes.IDENTITY, initial_rate))
         self.initial_rate = {}
-        self.final_rate_profile_buffer = read_arbitrary_profile(InputProfileTypes.IDENTITY,
-                                                                final_rate)
+        self.final_rate_profile_buffer = profile_store.intern(
+            read_arbitrary_profile(InputProfileTypes.IDENTITY, final_rate))
         self.final_rate = {}
         if fit_to_limit is False:
-            self.energy_rate_change_per_update_profile_buffer = \
-                read_arbitrary_profile(InputProfileTypes.IDENTITY, energy_rate_change_per_update)
+            self.energy_rate_change_per_update_profile_buffer = profile_store.intern(
+                read_arbitrary_profile(InputProfileTypes.IDENTITY, energy_rate_change_per_update))
         else:
             self.energy_rate_change_per_update_profile_buffer = {}
 
@@ -47,6 +48,8 @@ class UpdateFrequencyMixin:
         self.update_counter = {}
         self.number_of_available_updates = 0
         self.rate_limit_object = rate_limit_object
+        # Rates of a market slot for every value of its update counter
+        self._rate_schedules = {}
 
     def delete_past_state_values(self, current_market_time_slot):
         to_delete = []
@@ -58,33 +61,37 @@ class UpdateFrequencyMixin:
             self.final_rate.pop(market_slot, None)
             self.energy_rate_change_per_update.pop(market_slot, None)
             self.update_counter.pop(market_slot, None)
+            self._rate_schedules.pop(market_slot, None)
 
     def _populate_profiles(self, area):
         for market in area.all_markets:
             time_slot = market.time_slot
             if self.fit_to_limit is False:
                 self.energy_rate_change_per_update[time_slot] = \
-                    find_object_of_same_weekday_and_time(
+                    find_profile_value(
                         self.energy_rate_change_per_update_profile_buffer, time_slot)
             self.initial_rate[time_slot] = \
-                find_object_of_same_weekday_and_time(self.initial_rate_profile_buffer,
-                                                     time_slot)
+                find_profile_value(self.initial_rate_profile_buffer, time_slot)
             self.final_rate[time_slot] = \
-                find_object_of_same_weekday_and_time(self.final_rate_profile_buffer,
-                                                     time_slot)
+                find_profile_value(self.final_rate_profile_buffer, time_slot)
             self._set_or_update_energy_rate_change_per_update(market.time_slot)
             write_default_to_dict(self.update_counter, market.time_slot, 0)
 
     def reassign_mixin_arguments(self, time_slot, initial_rate=None, final_rate=None,
                                  fit_to_limit=None, energy_rate_change_per_update=None,
                                  update_interval=None):
+        # The profiles are shared with other devices, they are copied before they are changed
         if initial_rate is not None:
+            self.initial_rate_profile_buffer = writable_profile(self.initial_rate_profile_buffer)
             self.initial_rate_profile_buffer[time_slot] = initial_rate
         if final_rate is not None:
+            self.final_rate_profile_buffer = writable_profile(self.final_rate_profile_buffer)
             self.final_rate_profile_buffer[time_slot] = final_rate
         if fit_to_limit is not None:
             self.fit_to_limit = fit_to_limit
         if energy_rate_change_per_update is not None:
+            self.energy_rate_change_per_update_profile_buffer = writable_profile(
+                self.energy_rate_change_per_update_profile_buffer)
             self.energy_rate_change_per_update_profile_buffer[time_slot] = \
                 energy_rate_change_per_update
         if update_interval is not None:
@@ -98,21 +105,22 @@ class UpdateFrequencyMixin:
         energy_rate_change_per_update = {}
         if self.fit_to_limit:
             energy_rate_change_per_update[time_slot] = \
-                (find_object_of_same_weekday_and_time(
+                (find_profile_value(
                     self.initial_rate_profile_buffer, time_slot) -
-                 find_object_of_same_weekday_and_time(
+                 find_profile_value(
                      self.final_rate_profile_buffer, time_slot)) / \
                 self.number_of_available_updates
         else:
             if self.rate_limit_object is min:
                 energy_rate_change_per_update[time_slot] = \
-                    -1 * find_object_of_same_weekday_and_time(
+                    -1 * find_profile_value(
                         self.energy_rate_change_per_update_profile_buffer, time_slot)
             elif self.rate_limit_object is max:
                 energy_rate_change_per_update[time_slot] = \
-                    find_object_of_same_weekday_and_time(
+                    find_profile_value(
                         self.energy_rate_change_per_update_profile_buffer, time_slot)
         self.energy_rate_change_per_update.update(energy_rate_change_per_update)
+        self._rate_schedules.pop(time_slot, None)
 
     @property
     def _calculate_number_of_available_updates_per_slot(self):
@@ -128,13 +136,34 @@ class UpdateFrequencyMixin:
             self._calculate_number_of_available_updates_per_slot
         self._populate_profiles(area)
 
-    def get_updated_rate(self, time_slot):
-        """Compute the rate for offers/bids at a specific time slot."""
+    def _calculate_rate(self, time_slot, update_counter):
         calculated_rate = \
             self.initial_rate[time_slot] - \
-            self.energy_rate_change_per_update[time_slot] * self.update_counter[time_slot]
-        updated_rate = self.rate_limit_object(calculated_rate, self.final_rate[time_slot])
-        return updated_rate
+            self.energy_rate_change_per_update[time_slot] * update_counter
+        return self.rate_limit_object(calculated_rate, self.final_rate[time_slot])
+
+    def _rate_schedule(self, time_slot):
+        """Return the rates of the time slot for every update that can happen in a slot.
+
+        The schedule is calculated once per time slot, and again after the rate settings of
+        the time slot have changed.
+        """
+        rate_schedule = self._rate_schedules.get(time_slot)
+        if rate_schedule is None:
+            # One update per interval, plus the update at the start of the slot
+            update_count = GlobalConfig.slot_length.seconds // self.update_interval.seconds + 2
+            rate_schedule = [self._calculate_rate(time_slot, update_counter)
+                             for update_counter in range(update_count)]
+            self._rate_schedules[time_slot] = rate_schedule
+        return rate_schedule
+
+    def get_updated_rate(self, time_slot):
+        """Compute the rate for offers/bids at a specific time slot."""
+        update_counter = self.update_counter[time_slot]
+        rate_schedule = self._rate_schedule(time_slot)
+        if update_counter < len(rate_schedule):
+            return rate_schedule[update_counter]
+        return self._calculate_rate(time_slot, update_counter)
 
     @staticmethod
     def elapsed_seconds(strategy):
@@ -142,10 +171,15 @@ class UpdateFrequencyMixin:
         return current_tick_number * strategy.area.config.tick_length.seconds
 
     def increment_update_counter_all_markets(self, strategy):
-        should_update = [
-            self.increment_update_counter(strategy, market.time_slot)
-            for market in strategy.area.all_markets]
-        return any(should_update)
+        elapsed_seconds = self.elapsed_seconds(strategy)
+        update_interval_seconds = self.update_interval.seconds
+        should_update = False
+        for market in strategy.area.all_markets:
+            time_slot = market.time_slot
+            if elapsed_seconds >= update_interval_seconds * self.update_counter[time_slot]:
+                self.update_counter[time_slot] += 1
+                should_update = True
+        return should_update
 
     def increment_update_counter(self, strategy, time_slot):
         """Increment the counter of the number of times in which prices have been updated."""
@@ -163,16 +197,17 @@ class UpdateFrequencyMixin:
                        energy_rate_change_per_update_profile_buffer=None, fit_to_limit=None,
                        update_interval=None, ):
         if initial_rate_profile_buffer is not None:
-            self.initial_rate_profile_buffer = initial_rate_profile_buffer
+            self.initial_rate_profile_buffer = profile_store.intern(initial_rate_profile_buffer)
         if final_rate_profile_buffer is not None:
-            self.final_rate_profile_buffer = final_rate_profile_buffer
+            self.final_rate_profile_buffer = profile_store.intern(final_rate_profile_buffer)
         if energy_rate_change_per_update_profile_buffer is not None:
             self.energy_rate_change_per_update_profile_buffer = \
-                energy_rate_change_per_update_profile_buffer
+                profile_store.intern(energy_rate_change_per_update_profile_buffer)
         if fit_to_limit is not None:
             self.fit_to_limit = fit_to_limit
         if update_interval is not None:
             self.update_interval = update_interval
+        self._rate_schedules.clear()
 
 
 class TemplateStrategyBidUpdater(UpdateFrequencyMixin):
@@ -0,0 +1,29 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from d3a_interface.constants_limits import ConstSettings
+
+from d3a.d3a_core.synthetic_grid import SyntheticGridOptions, create_synthetic_grid
+
+
+def get_setup(config):
+    """Synthetic grid for scale testing, configured with D3A_SYNTHETIC_GRID_<OPTION>
+    environment variables, e.g. D3A_SYNTHETIC_GRID_COMMUNITIES=100 or
+    D3A_SYNTHETIC_GRID_DEVICE_MIX=load=1,pv=0.5 (see SyntheticGridOptions)."""
+    options = SyntheticGridOptions.from_environment()
+    ConstSettings.IAASettings.MARKET_TYPE = options.market_type
+    return create_synthetic_grid(options, config)
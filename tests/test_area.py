@@ -17,14 +17,16 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 from pendulum import duration, today
 from collections import OrderedDict
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 import unittest
 from parameterized import parameterized
+from d3a.events import is_subscribed
 from d3a.events.event_structures import AreaEvent, MarketEvent
 from d3a.models.area import Area, check_area_name_exists_in_parent_area
 from d3a.models.area.events import Events
 from d3a.models.area.markets import AreaMarkets
 
+from d3a.models.strategy.pv import PVStrategy
 from d3a.models.strategy.storage import StorageStrategy
 from d3a.models.config import SimulationConfig
 from d3a.models.market import Market
@@ -83,6 +85,21 @@ class TestAreaClass(unittest.TestCase):
         self.area.next_market.offer(1, 1, "test", "test")
         assert list(self.area.next_market.offers.values())[0].price == 1.05
 
+    def test_path_to_root_fees_are_updated_after_grid_fee_changes(self):
+        self.config.grid_fee_type = 1
+        house = Area(name="House", grid_fee_constant=1, config=self.config)
+        street = Area(name="Street", children=[house], grid_fee_constant=2, config=self.config)
+        grid = Area(name="Grid", children=[street], grid_fee_constant=3, config=self.config)
+        assert house.get_path_to_root_fees() == 6
+        assert house.grid_fees.grid_fee_const == 1
+
+        street.area_reconfigure_event(grid_fee_constant=4)
+        assert house.get_path_to_root_fees() == 8
+        grid.grid_fee_constant = 0
+        assert house.get_path_to_root_fees() == 5
+        house.parent = None
+        assert house.get_path_to_root_fees() == 1
+
     def test_markets_are_cycled_according_to_market_count(self):
         self.area._bc = None
         for i in range(2, 97):
@@ -320,6 +337,35 @@ class TestEventDispatcher(unittest.TestCase):
         area.dispatcher.event_listener(event_type)
         assert area.strategy.event_listener.call_count == 0
 
+    def test_event_listener_dispatches_only_subscribed_events_to_strategy(self):
+        area = Area(name="test_area")
+        area.strategy = PVStrategy()
+        area.events = MagicMock(spec=Events)
+        area.events.is_enabled = True
+        area.events.is_connected = True
+        assert not is_subscribed(area.strategy, MarketEvent.BID_DELETED)
+        with patch.object(PVStrategy, "event_listener") as event_listener_mock:
+            area.dispatcher.event_listener(MarketEvent.BID_DELETED, market_id="", bid=None)
+            event_listener_mock.assert_not_called()
+            area.dispatcher.event_listener(MarketEvent.TRADE, market_id="", trade=None)
+            event_listener_mock.assert_called_once()
+        area.strategy.event_bid_deleted = MagicMock()
+        assert is_subscribed(area.strategy, MarketEvent.BID_DELETED)
+
+    def test_market_events_are_routed_to_subscribed_children_until_invalidated(self):
+        pv = Area(name="PV", strategy=PVStrategy())
+        area = Area(name="Street", children=[pv, Area(name="House")])
+        assert area.dispatcher._event_listening_children(MarketEvent.TRADE) == [pv]
+        assert area.dispatcher._event_listening_children(MarketEvent.BID_DELETED) == []
+        second_pv = Area(name="PV 2", strategy=PVStrategy())
+        second_pv.parent = area
+        area.children.append(second_pv)
+        assert area.dispatcher._event_listening_children(MarketEvent.TRADE) == [pv]
+        area.dispatcher.invalidate_event_routing()
+        assert sorted(child.name for child in
+                      area.dispatcher._event_listening_children(MarketEvent.TRADE)) == \
+            ["PV", "PV 2"]
+
     def test_event_on_disabled_area_triggered_for_market_cycle_on_disabled_area(self):
         area = self.strategy_mock()
         area.strategy.event_on_disabled_area = MagicMock()
@@ -348,3 +394,14 @@ class TestFunctions(unittest.TestCase):
         area = Area(name="Street", children=[Area(name="House")], )
         self.assertTrue(check_area_name_exists_in_parent_area(area, "House"))
         self.assertFalse(check_area_name_exists_in_parent_area(area, "House 2"))
+
+    def test_check_area_name_exists_follows_renamed_and_removed_children(self):
+        house = Area(name="House")
+        area = Area(name="Street", children=[house, Area(name="House 2")])
+        house.name = "House 3"
+        self.assertTrue(check_area_name_exists_in_parent_area(area, "House 3"))
+        self.assertFalse(check_area_name_exists_in_parent_area(area, "House"))
+        area.children.remove(house)
+        self.assertFalse(check_area_name_exists_in_parent_area(area, "House 3"))
+        area.children.append(Area(name="House 3"))
+        self.assertTrue(check_area_name_exists_in_parent_area(area, "House 3"))
@@ -0,0 +1,133 @@
+import json
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+
+import pendulum
+import pytest
+
+from d3a.d3a_core.exceptions import InvalidBidOfferPair
+from d3a.models.market.blockchain_interface import NonBlockchainInterface
+from d3a.models.market.two_sided import TwoSidedMarket
+from d3a.models.myco_matcher.external_matcher import ExternalMatcher
+
+
+@pytest.fixture
+def matcher_and_market():
+    with patch.object(ExternalMatcher, "_setup_redis_connection"):
+        matcher = ExternalMatcher()
+    matcher.myco_ext_conn = MagicMock()
+    market = TwoSidedMarket(bc=NonBlockchainInterface(str(uuid4())), time_slot=pendulum.now())
+    matcher.markets_mapping = {market.id: market}
+    return matcher, market
+
+
+def _record(market, bid, offer, selected_energy, trade_rate=2):
+    return {"market_id": market.id, "bid": bid.serializable_dict(),
+            "offer": offer.serializable_dict(), "selected_energy": selected_energy,
+            "trade_rate": trade_rate}
+
+
+def test_validate_recommendations_uses_live_orders(matcher_and_market):
+    matcher, market = matcher_and_market
+    offer = market.offer(5, 5, "S", "S")
+    bid1 = market.bid(4, 2, "B1", "B1")
+    bid2 = market.bid(6, 3, "B2", "B2")
+    records = matcher._validate_recommendations([
+        _record(market, bid1, offer, 2), _record(market, bid2, offer, 3),
+        {"market_id": "finished_market"}])
+    assert list(records) == [market.id]
+    assert [r.bid for r in records[market.id]] == [bid1, bid2]
+    assert all(r.offer is market.offers[offer.id] for r in records[market.id])
+
+
+@pytest.mark.parametrize("selected_energy_1, selected_energy_2", [(2, 4), (0, 1)])
+def test_validate_recommendations_detects_overcommitted_orders(
+        matcher_and_market, selected_energy_1, selected_energy_2):
+    matcher, market = matcher_and_market
+    offer = market.offer(5, 5, "S", "S")
+    bid1 = market.bid(4, 2, "B1", "B1")
+    bid2 = market.bid(12, 6, "B2", "B2")
+    with pytest.raises(InvalidBidOfferPair):
+        matcher._validate_recommendations([
+            _record(market, bid1, offer, selected_energy_1),
+            _record(market, bid2, offer, selected_energy_2)])
+
+
+@pytest.mark.parametrize("selected_energy, trade_rate", [
+    ("2", 2), (None, 2), (2, "x"), (2, None), (True, 2), (float("nan"), 2)])
+def test_validate_recommendations_rejects_non_numeric_values(
+        matcher_and_market, selected_energy, trade_rate):
+    matcher, market = matcher_and_market
+    offer = market.offer(5, 5, "S", "S")
+    bid = market.bid(4, 2, "B", "B")
+    with pytest.raises(InvalidBidOfferPair):
+        matcher._validate_recommendations(
+            [_record(market, bid, offer, selected_energy, trade_rate)])
+
+
+def test_match_recommendations_settles_valid_recommendations_in_bulk(matcher_and_market):
+    matcher, market = matcher_and_market
+    offer = market.offer(5, 5, "S", "S")
+    bid1 = market.bid(4, 2, "B1", "B1")
+    bid2 = market.bid(6, 3, "B2", "B2")
+    recommendations = [_record(market, bid1, offer, 2), _record(market, bid2, offer, 3)]
+    matcher.match_recommendations(
+        {"data": json.dumps({"recommended_matches": recommendations})})
+    assert len(market.trades) == 2
+    assert market.offers == {}
+    assert market.bids == {}
+    _, response = matcher.myco_ext_conn.publish_json.call_args[0]
+    assert response["status"] == "success"
+
+
+def test_match_recommendations_rejects_whole_batch_on_conflict(matcher_and_market):
+    matcher, market = matcher_and_market
+    offer = market.offer(5, 5, "S", "S")
+    bid1 = market.bid(4, 2, "B1", "B1")
+    bid2 = market.bid(12, 6, "B2", "B2")
+    recommendations = [_record(market, bid1, offer, 2), _record(market, bid2, offer, 6)]
+    matcher.match_recommendations(
+        {"data": json.dumps({"recommended_matches": recommendations})})
+    assert market.trades == []
+    _, response = matcher.myco_ext_conn.publish_json.call_args[0]
+    assert response["status"] == "fail"
+
+
+def test_offers_bids_response_contains_orders_of_the_last_tick(matcher_and_market):
+    matcher, market = matcher_and_market
+    matcher.update_area_markets("area1", [market])
+    market.offer(5, 5, "S", "S")
+    matcher.publish_event_tick_myco()
+    matcher.publish_offers_bids({"data": json.dumps({})})
+    _, response = matcher.myco_ext_conn.publish_json.call_args[0]
+    assert response["type"] == "snapshot"
+    sequence_number = response["sequence_number"]
+
+    # Posted without a new registration of the markets
+    bid = market.bid(4, 2, "B1", "B1")
+    matcher.publish_event_tick_myco()
+    matcher.publish_offers_bids({"data": json.dumps({"sequence_number": sequence_number})})
+    _, response = matcher.myco_ext_conn.publish_json.call_args[0]
+    assert response["type"] == "delta"
+    assert [b["id"] for b in response["deltas"][0]["markets"][market.id]["bids"]] == [bid.id]
+
+
+@pytest.mark.parametrize("request_data", [
+    {"sequence_number": "1"}, {"filters": ["area1"]}, {"filters": {"area_uuids": "area1"}},
+    {"filters": {"market_ids": 5}}])
+def test_offers_bids_request_with_wrong_types_is_answered_with_error(
+        matcher_and_market, request_data):
+    matcher, _ = matcher_and_market
+    matcher.publish_offers_bids({"data": json.dumps(request_data)})
+    _, response = matcher.myco_ext_conn.publish_json.call_args[0]
+    assert response["status"] == "fail"
+
+
+def test_update_area_markets_replaces_the_markets_of_the_area(matcher_and_market):
+    matcher, market = matcher_and_market
+    matcher.markets_mapping = {}
+    other_market = MagicMock(id="other")
+    matcher.update_area_markets("area1", [market])
+    matcher.update_area_markets("area2", [other_market])
+    matcher.update_area_markets("area1", [])
+    assert matcher.markets_mapping == {"other": other_market}
@@ -0,0 +1,84 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from unittest.mock import MagicMock
+
+import pendulum
+
+from d3a.constants import TIME_ZONE
+from d3a.events.event_structures import AreaEvent
+from d3a.models.area import DEFAULT_CONFIG
+from d3a.models.strategy.fleet import create_strategy_fleets
+from d3a.models.strategy.pv import PVStrategy
+
+TIME = pendulum.today(tz=TIME_ZONE).at(hour=10, minute=45, second=0)
+
+
+class FakeMarket:
+    def __init__(self):
+        self.id = "market"
+        self.time_slot = TIME
+
+
+class FakeArea:
+    def __init__(self):
+        self.config = DEFAULT_CONFIG
+        self.current_tick = 0
+        self.name = "FakeArea"
+        self.test_market = FakeMarket()
+
+    @property
+    def all_markets(self):
+        return [self.test_market]
+
+
+def _child_with_pv_strategy(area, **kwargs):
+    strategy = PVStrategy(**kwargs)
+    strategy.area = area
+    strategy.owner = MagicMock()
+    strategy.offer_update.update_and_populate_price_settings(area)
+    return MagicMock(strategy=strategy)
+
+
+def test_strategy_fleets_group_devices_with_equal_price_settings():
+    area = FakeArea()
+    children = [_child_with_pv_strategy(area, initial_selling_rate=30),
+                _child_with_pv_strategy(area, initial_selling_rate=25),
+                _child_with_pv_strategy(area, initial_selling_rate=30),
+                MagicMock(strategy=None)]
+    fleets = create_strategy_fleets(children)
+    assert len(fleets) == 1
+    assert fleets[0].members == [children[0].strategy, children[2].strategy]
+    assert children[0].strategy.offer_update is children[2].strategy.offer_update
+    assert children[0].strategy.fleet is fleets[0]
+    assert children[1].strategy.fleet is None
+
+
+def test_fleet_advances_shared_price_schedule_once_per_tick():
+    area = FakeArea()
+    children = [_child_with_pv_strategy(area) for _ in range(3)]
+    fleet = create_strategy_fleets(children)[0]
+    fleet.dispatch_tick()
+    for child in children:
+        child.strategy.owner.dispatcher.event_listener.assert_called_once_with(AreaEvent.TICK)
+    assert fleet.members[0].offer_update.update_counter[TIME] == 1
+
+    removed = children[0].strategy
+    fleet.remove(removed)
+    assert removed.fleet is None and len(fleet) == 2
+    assert removed.offer_update is not children[1].strategy.offer_update
+    assert removed.offer_update.update_counter[TIME] == 1
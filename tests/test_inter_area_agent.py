@@ -16,6 +16,7 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 from dataclasses import replace
+from unittest.mock import MagicMock
 
 import pytest
 from copy import deepcopy
@@ -23,13 +24,17 @@ import pendulum
 from math import isclose
 from uuid import uuid4
 
+import d3a.constants
 from d3a.constants import TIME_FORMAT
 from d3a.constants import TIME_ZONE
+from d3a.events.event_structures import MarketEvent
 from d3a.models.area import DEFAULT_CONFIG
 from d3a.models.market.market_structures import Offer, Trade, Bid
+from d3a.models.market.one_sided import OneSidedMarket
 from d3a.models.strategy.area_agents.one_sided_agent import OneSidedAgent
+from d3a.models.strategy.area_agents.one_sided_engine import (
+    ForwardingTable, IAAEnginePool, OfferInfo)
 from d3a.models.strategy.area_agents.two_sided_agent import TwoSidedAgent
-from d3a.models.strategy.area_agents.two_sided_engine import BidInfo
 from d3a_interface.constants_limits import ConstSettings
 from d3a.models.market.market_structures import MarketClearingState
 from d3a.models.market import GridFee
@@ -428,9 +433,7 @@ def test_iaa_event_bid_split_and_trade_correctly_populate_forwarded_bid_entries(
 
     source_bid = list(low_to_high_engine.markets.source.bids.values())[0]
     target_bid = list(low_to_high_engine.markets.target.bids.values())[0]
-    bidinfo = BidInfo(source_bid=source_bid, target_bid=target_bid)
-    low_to_high_engine.forwarded_bids[source_bid.id] = bidinfo
-    low_to_high_engine.forwarded_bids[target_bid.id] = bidinfo
+    low_to_high_engine._add_to_forward_bids(source_bid, target_bid)
 
     if partial:
         residual_energy = 0.2
@@ -645,3 +648,190 @@ def test_iaa_event_offer_split_and_trade_correctly_populate_forwarded_offer_entr
     offer_info = engine.forwarded_offers[residual_offer_id]
     assert offer_info.source_offer.id == "uuid"
     assert offer_info.target_offer.id == residual_offer_id
+
+
+def test_iaa_forwards_offers_learnt_from_market_events_once_eligible():
+    lower_market = FakeMarket([], m_id="lower")
+    higher_market = FakeMarket([], m_id="higher")
+    iaa = OneSidedAgent(owner=FakeArea('owner'),
+                        higher_market=higher_market,
+                        lower_market=lower_market,
+                        min_offer_age=2)
+    engine = next(e for e in iaa.engines if e.markets.source == lower_market)
+    iaa.event_tick()
+    offer = Offer('new_offer', pendulum.now(), 1, 1, 'other', 1)
+    lower_market.offers[offer.id] = offer
+    iaa.event_tick()
+    # The offer was not announced by a market event, therefore it is not tracked
+    assert offer.id not in engine.offer_age
+
+    iaa.event_offer(market_id=lower_market.id, offer=offer)
+    iaa.event_tick()
+    assert engine.offer_age[offer.id] == iaa.owner.current_tick
+    assert higher_market.offer_call_count == 0
+
+    iaa.owner.current_tick += 2
+    iaa.event_tick()
+    assert higher_market.offer_call_count == 1
+    assert offer.id in engine.forwarded_offers
+    assert engine._offer_queue == []
+
+
+def test_iaa_forwards_bids_learnt_from_market_events_once_eligible():
+    ConstSettings.IAASettings.MARKET_TYPE = 2
+    lower_market = FakeMarket([], [], m_id="lower")
+    higher_market = FakeMarket([], [], m_id="higher")
+    iaa = TwoSidedAgent(owner=FakeArea('owner'),
+                        higher_market=higher_market,
+                        lower_market=lower_market,
+                        min_bid_age=2)
+    iaa.event_tick()
+    bid = Bid('new_bid', pendulum.now(), 1, 1, 'this', 1)
+    lower_market.bids[bid.id] = bid
+    iaa.event_bid(market_id=lower_market.id, bid=bid)
+    # Events of other markets are ignored by the engines
+    iaa.event_bid(market_id="other_market", bid=Bid('other_bid', pendulum.now(), 1, 1, 'this'))
+    iaa.event_tick()
+    engine = next(e for e in iaa.engines if e.markets.source == lower_market)
+    assert set(engine.bid_age.keys()) == {bid.id}
+    assert higher_market.bid_call_count == 0
+
+    iaa.owner.current_tick += 2
+    iaa.event_tick()
+    assert higher_market.bid_call_count == 1
+    assert bid.id in engine.forwarded_bids
+    assert engine._bid_queue == []
+
+
+def test_iaa_engines_are_created_lazily_and_recycled():
+    engine_pool = IAAEnginePool()
+    lower_market = FakeMarket([], m_id="lower")
+    higher_market = FakeMarket([], m_id="higher")
+    iaa = OneSidedAgent(owner=FakeArea('owner'), higher_market=higher_market,
+                        lower_market=lower_market, engine_pool=engine_pool)
+    offer = Offer('new_offer', pendulum.now(), 1, 1, 'other', 1)
+    iaa.event_tick()
+    iaa.event_offer(market_id="other_market", offer=offer)
+    iaa.event_trade(market_id="other_market",
+                    trade=Trade('trade_id', pendulum.now(), offer, 'other', 'buyer'))
+    assert iaa._engines is None
+
+    lower_market.offers[offer.id] = offer
+    iaa.event_tick()
+    engines = iaa._engines
+    assert len(engines) == 2
+    assert offer.id in next(e for e in engines if e.markets.source == lower_market).offer_age
+
+    iaa.release_engines()
+    assert iaa._engines is None
+    assert len(engine_pool) == 2
+    assert all(e.markets is None and e.offer_age == {} for e in engines)
+
+    next_lower_market = FakeMarket([], m_id="next_lower")
+    next_higher_market = FakeMarket([], m_id="next_higher")
+    next_iaa = OneSidedAgent(owner=FakeArea('owner'), higher_market=next_higher_market,
+                             lower_market=next_lower_market, engine_pool=engine_pool)
+    assert {id(e) for e in next_iaa.engines} == {id(e) for e in engines}
+    assert len(engine_pool) == 0
+    assert {e.markets.source for e in next_iaa.engines} == \
+        {next_lower_market, next_higher_market}
+    assert all(e.owner is next_iaa and not e._is_source_market_scanned
+               for e in next_iaa.engines)
+
+
+def test_forwarding_table_updates_forwardings_of_split_offers_in_place():
+    def offer_info(source_id, target_id, energy):
+        source = Offer(source_id, pendulum.now(), energy, energy, 'seller')
+        target = Offer(target_id, pendulum.now(), 1.1 * energy, energy, 'iaa')
+        return OfferInfo(source, target, source.energy_rate, target.energy_rate)
+
+    table = ForwardingTable()
+    table.add(offer_info('source', 'target', 2))
+    handle = table._handles['source']
+    residual_info = offer_info('residual_source', 'residual_target', 0.5)
+    accepted_info = offer_info('source', 'target', 1.5)
+    table.add(residual_info)
+    table.add(accepted_info)
+
+    assert table._handles['source'] == table._handles['target'] == handle
+    assert table['target'] is table['source'] is accepted_info
+    assert set(table.keys()) == {'source', 'target', 'residual_source', 'residual_target'}
+    assert table.discard('residual_target') is residual_info
+    assert 'residual_source' not in table
+    table.add(offer_info('other_source', 'other_target', 1))
+    assert len(table._entries) == 2
+    assert len(table.infos()) == 2
+    table.discard('source')
+    table.discard('other_source')
+    assert table == {}
+
+
+def _three_level_one_sided_markets():
+    fees = GridFee(grid_fee_percentage=0.1, grid_fee_const=0)
+    leaf_market, middle_market, top_market = (
+        OneSidedMarket(bc=MagicMock(), time_slot=pendulum.now(), grid_fees=fees, name=name)
+        for name in ("leaf", "middle", "top"))
+    lower_iaa = OneSidedAgent(owner=FakeArea('house'), higher_market=middle_market,
+                              lower_market=leaf_market, min_offer_age=5)
+    upper_iaa = OneSidedAgent(owner=FakeArea('street'), higher_market=top_market,
+                              lower_market=middle_market, min_offer_age=5)
+    for market, agents in ((leaf_market, [lower_iaa]), (middle_market, [lower_iaa, upper_iaa]),
+                           (top_market, [upper_iaa])):
+        for agent in agents:
+            market.add_listener(
+                lambda event, _agent=agent, **kwargs: _agent._event_mapping(event)(**kwargs))
+    return (leaf_market, middle_market, top_market), (lower_iaa, upper_iaa)
+
+
+def test_single_tick_propagation_forwards_offer_through_all_levels(monkeypatch):
+    monkeypatch.setattr(d3a.constants, "SINGLE_TICK_PROPAGATION", True)
+    (leaf_market, middle_market, top_market), (lower_iaa, upper_iaa) = \
+        _three_level_one_sided_markets()
+
+    offer = leaf_market.offer(10, 1, 'pv', 'pv')
+
+    middle_offer, = middle_market.offers.values()
+    top_offer, = top_market.offers.values()
+    assert middle_offer.seller == lower_iaa.name
+    assert top_offer.seller == upper_iaa.name
+    assert middle_offer.seller_origin == top_offer.seller_origin == 'pv'
+    # Grid fees are applied once per hop
+    for source_offer, target_market, target_offer in ((offer, middle_market, middle_offer),
+                                                      (middle_offer, top_market, top_offer)):
+        forwarded_price = target_market.fee_class.update_forwarded_offer_with_fee(
+            source_offer.energy_rate, offer.original_offer_price / offer.energy) * offer.energy
+        assert isclose(target_offer.price, target_market._update_new_offer_price_with_fee(
+            forwarded_price, offer.original_offer_price, offer.energy))
+    assert offer.price < middle_offer.price < top_offer.price
+    lower_engine = next(e for e in lower_iaa.engines if e.markets.source == leaf_market)
+    upper_engine = next(e for e in upper_iaa.engines if e.markets.source == middle_market)
+    assert lower_engine.forwarded_offers[offer.id].target_offer.id == middle_offer.id
+    assert upper_engine.forwarded_offers[middle_offer.id].target_offer.id == top_offer.id
+
+
+def test_trade_settles_chain_of_forwarded_offers_in_one_pass(monkeypatch):
+    monkeypatch.setattr(d3a.constants, "SINGLE_TICK_PROPAGATION", True)
+    (leaf_market, middle_market, top_market), (lower_iaa, upper_iaa) = \
+        _three_level_one_sided_markets()
+    leaf_events = []
+    leaf_market.add_listener(lambda event, **kwargs: leaf_events.append(event))
+    offer = leaf_market.offer(10, 1, 'pv', 'pv')
+    lower_engine = next(e for e in lower_iaa.engines if e.markets.source == leaf_market)
+    upper_engine = next(e for e in upper_iaa.engines if e.markets.source == middle_market)
+    monkeypatch.setattr(lower_engine, "_accept_source_offer",
+                        MagicMock(wraps=lower_engine._accept_source_offer))
+    top_offer, = top_market.offers.values()
+
+    top_market.accept_offer(top_offer, 'buyer', energy=1, buyer_origin='buyer')
+
+    assert lower_engine._accept_source_offer.call_count == 1
+    leaf_trade, = leaf_market.trades
+    middle_trade, = middle_market.trades
+    assert leaf_trade.offer.id == offer.id
+    assert leaf_trade.seller == 'pv' and leaf_trade.buyer == lower_iaa.name
+    assert middle_trade.seller == lower_iaa.name and middle_trade.buyer == upper_iaa.name
+    assert leaf_trade.buyer_origin == middle_trade.buyer_origin == 'buyer'
+    assert leaf_trade.offer.price <= middle_trade.offer.price <= top_market.trades[0].offer.price
+    assert leaf_events.count(MarketEvent.TRADE) == 1
+    assert lower_engine.forwarded_offers == {}
+    assert upper_engine.forwarded_offers == {}
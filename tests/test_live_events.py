@@ -1,6 +1,6 @@
 import unittest
 from pathlib import Path
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from d3a.d3a_core.live_events import CreateAreaEvent, UpdateAreaEvent
 from d3a.d3a_core.live_events import LiveEvents
@@ -342,3 +342,47 @@ class TestLiveEvents(unittest.TestCase):
         except Exception:
             assert False
         assert self.area_house1.children == [self.area1, self.area2]
+
+    def test_bulk_update_events_update_strategy_prices_once_per_subtree(self):
+        self.area_grid.activate()
+        for area, grid_fee_constant in [(self.area_house1, 12), (self.area_house1, 13),
+                                        (self.area_grid, 1)]:
+            self.live_events.add_event({
+                "eventType": "update_area", "area_uuid": area.uuid,
+                "area_representation": {"grid_fee_constant": grid_fee_constant}},
+                bulk_event=True)
+
+        with patch.object(Area, "_update_descendants_strategy_prices",
+                          autospec=True) as update_prices_mock:
+            self.live_events.handle_all_events(self.area_grid)
+        update_prices_mock.assert_called_once_with(self.area_grid)
+        assert self.area_house1.grid_fee_constant == 13
+        assert self.area_grid.grid_fee_constant == 1
+
+    @patch("d3a.constants.FLEET_MODE", True)
+    def test_deleted_and_replaced_strategies_leave_the_fleet_of_the_parent(self):
+        loads = [Area(f"fleet load {index}", config=self.config,
+                      strategy=LoadHoursStrategy(avg_power_W=100, hrs_per_day=4,
+                                                 hrs_of_day=[2, 3, 4, 5]))
+                 for index in range(3)]
+        area_house3 = Area("House 3", children=loads, config=self.config)
+        area_house3.parent = self.area_grid
+        self.area_grid.children.append(area_house3)
+        self.area_grid.activate()
+        fleet = area_house3.strategy_fleets[0]
+        assert len(fleet) == 3
+
+        self.live_events.add_event({"eventType": "delete_area", "area_uuid": loads[0].uuid})
+        self.live_events.handle_all_events(self.area_grid)
+        assert fleet.members == [loads[1].strategy, loads[2].strategy]
+        assert area_house3.strategy_fleets == [fleet]
+
+        replaced_strategy = loads[1].strategy
+        self.live_events.add_event({
+            "eventType": "update_area", "area_uuid": loads[1].uuid,
+            "area_representation": {"type": "MarketMaker", "energy_rate": 30}})
+        self.live_events.handle_all_events(self.area_grid)
+        # The fleet fell below the minimum size and was dissolved
+        assert area_house3.strategy_fleets == []
+        assert replaced_strategy.fleet is None
+        assert loads[2].strategy.fleet is None
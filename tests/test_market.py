@@ -422,10 +422,21 @@ def test_market_trade_bid_partial(market=TwoSidedMarket(bc=MagicMock(), time_slo
     assert market.bids[trade.residual.id].buyer == 'A'
 
 
+def test_market_bid_emits_bid_event(called):
+    market = TwoSidedMarket(bc=MagicMock(), time_slot=now())
+    market.add_listener(called)
+    bid = market.bid(20, 20, 'A', 'A')
+    assert len(called.calls) == 1
+    assert called.calls[0][0] == (repr(MarketEvent.BID),)
+    assert called.calls[0][1] == {'market_id': repr(market.id), 'bid': repr(bid)}
+    market.split_bid(bid, 5, 20)
+    assert [c[0] for c in called.calls[1:]] == [(repr(MarketEvent.BID_SPLIT),)]
+
+
 def test_market_accept_bid_emits_bid_split_on_partial_bid(
         called, market=TwoSidedMarket(bc=MagicMock(), time_slot=now())):
-    market.add_listener(called)
     bid = market.bid(20, 20, 'A', 'A')
+    market.add_listener(called)
     trade_offer_info = TradeBidOfferInfo(1, 1, 1, 1, 1)
     trade = market.accept_bid(bid, energy=1, trade_offer_info=trade_offer_info)
     assert all([ev != repr(MarketEvent.BID_DELETED) for c in called.calls for ev in c[0]])
@@ -635,6 +646,29 @@ def test_market_listeners_offer_deleted(market, offer, delete_offer, add_listene
     assert called.calls[1][1] == {'offer': repr(e_offer), 'market_id': repr(market.id)}
 
 
+def test_demand_queue_matches_offers_in_price_priority_order(monkeypatch):
+    monkeypatch.setattr("d3a.constants.DEMAND_QUEUE", True)
+    market = OneSidedMarket(bc=NonBlockchainInterface(str(uuid4())), time_slot=now())
+    called_rates = []
+
+    def buyer(rate, buys):
+        def accept_queued_offer(queue_market, offer):
+            called_rates.append(rate)
+            if buys:
+                queue_market.accept_offer(offer, f"buyer{rate}")
+        return MagicMock(accept_queued_offer=accept_queued_offer)
+
+    # The most expensive buyer doesn't want to buy anymore and the cheapest isn't reached
+    for rate, buys in [(20, True), (30, False), (25, True)]:
+        market.demand_queue.register(buyer(rate, buys), rate, 1)
+    market.offer(35, 1, 'seller', 'seller')
+    assert called_rates == []
+    offer = market.offer(22, 1, 'seller', 'seller')
+    assert called_rates == [30, 25]
+    assert offer.id not in market.offers
+    assert market.trades[0].buyer == "buyer25"
+
+
 @pytest.mark.parametrize(
     ('last_offer_size', 'traded_energy'),
     (
@@ -0,0 +1,76 @@
+from unittest.mock import MagicMock
+
+import pendulum
+import pytest
+
+from d3a.models.market.market_structures import Bid, Offer
+from d3a.models.myco_matcher.order_book_feed import OrderBookFeed
+
+
+def _market(market_id, bids=None, offers=None):
+    market = MagicMock()
+    market.id = market_id
+    market.open_bids_and_offers = (bids or {}, offers or {})
+    return market
+
+
+@pytest.fixture
+def orders():
+    now = pendulum.now()
+    return (Offer("offer1", now, 10, 1, "seller"), Offer("offer2", now, 20, 2, "seller"),
+            Bid("bid1", now, 30, 1, "buyer"))
+
+
+def test_feed_only_reports_changed_orders(orders):
+    offer1, offer2, bid1 = orders
+    feed = OrderBookFeed()
+    market = _market("market1", {"bid1": bid1}, {"offer1": offer1})
+    delta = feed.update({"area1": [market]})
+    assert delta["sequence_number"] == 1
+    assert [o["id"] for o in delta["markets"]["market1"]["offers"]] == ["offer1"]
+    assert [b["id"] for b in delta["markets"]["market1"]["bids"]] == ["bid1"]
+
+    assert feed.update({"area1": [market]}) is None
+    assert feed.sequence_number == 1
+
+    market.open_bids_and_offers = ({"bid1": bid1}, {"offer2": offer2})
+    delta = feed.update({"area1": [market]})
+    assert delta["sequence_number"] == 2
+    assert delta["markets"]["market1"] == {
+        "area_uuid": "area1", "bids": [], "offers": [offer2.serializable_dict()],
+        "deleted_bids": [], "deleted_offers": ["offer1"]}
+
+    assert feed.snapshot() == {"market1": {
+        "area_uuid": "area1", "bids": [bid1.serializable_dict()],
+        "offers": [offer2.serializable_dict()]}}
+
+
+def test_feed_reports_finished_markets_and_filters(orders):
+    offer1, offer2, bid1 = orders
+    feed = OrderBookFeed()
+    market1 = _market("market1", offers={"offer1": offer1})
+    market2 = _market("market2", bids={"bid1": bid1})
+    feed.update({"area1": [market1], "area2": [market2]})
+    feed.update({"area1": [], "area2": [market2]})
+
+    assert list(feed.snapshot(area_uuids=["area2"])) == ["market2"]
+    assert list(feed.snapshot(market_ids=["market1"])) == []
+    deltas = feed.deltas_since(0, area_uuids=["area1"])
+    assert [d["sequence_number"] for d in deltas] == [1, 2]
+    assert list(deltas[0]["markets"]) == ["market1"]
+    assert deltas[1]["finished_markets"] == ["market1"]
+    assert feed.deltas_since(1, area_uuids=["area2"]) == [
+        {"sequence_number": 2, "markets": {}, "finished_markets": []}]
+    assert feed.deltas_since(2) == []
+
+
+def test_feed_requires_snapshot_for_expired_deltas(orders):
+    offer1, offer2, _ = orders
+    feed = OrderBookFeed(history_length=1)
+    market = _market("market1", offers={"offer1": offer1})
+    feed.update({"area1": [market]})
+    market.open_bids_and_offers = ({}, {"offer2": offer2})
+    feed.update({"area1": [market]})
+    assert feed.deltas_since(0) is None
+    assert len(feed.deltas_since(1)) == 1
+    assert feed.deltas_since(3) is None
@@ -0,0 +1,106 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from uuid import uuid4
+
+import pendulum
+import pytest
+
+from d3a.models.market.blockchain_interface import NonBlockchainInterface
+from d3a.models.market.market_structures import BidOfferMatch
+from d3a.models.market.order_flow import (
+    OrderFlowRecordType, order_flow_recorder, read_order_flow)
+from d3a.models.market.two_sided import TwoSidedMarket
+from d3a.models.myco_matcher.order_flow_replay import OrderFlowReplay, create_replay_matcher
+from d3a.models.myco_matcher.pay_as_bid import PayAsBidMatcher
+
+
+@pytest.fixture
+def order_flow_path(tmp_path):
+    path = str(tmp_path / "order_flow.bin")
+    order_flow_recorder.start(path, 15)
+    yield path
+    order_flow_recorder.stop()
+
+
+def _record_market_session():
+    market = TwoSidedMarket(bc=NonBlockchainInterface(str(uuid4())),
+                            time_slot=pendulum.datetime(2021, 1, 1, 12))
+    offer = market.offer(5, 5, 'S', 'S')
+    bid1 = market.bid(4, 2, 'B1', 'B1')
+    bid2 = market.bid(9, 3, 'B2', 'B2')
+    market.bid(1, 1, 'B3', 'B3')
+    order_flow_recorder.record_clearing(market)
+    market.match_recommendation([
+        BidOfferMatch(offer=offer, selected_energy=2, bid=bid1, trade_rate=2),
+    ])
+    market.update_clock(1)
+    order_flow_recorder.record_clearing(market)
+    market.match_recommendation([
+        BidOfferMatch(offer=market.offers[list(market.offers)[0]], selected_energy=3,
+                      bid=bid2, trade_rate=2),
+    ])
+    return market, offer
+
+
+def test_order_flow_recorder_records_order_book_mutations(order_flow_path):
+    market, offer = _record_market_session()
+    order_flow_recorder.stop()
+    tick_length_seconds, records = read_order_flow(order_flow_path)
+    records = list(records)
+    assert tick_length_seconds == 15
+    assert {record.market.time_slot for record in records} == {market.time_slot_str}
+    record_types = [record.type for record in records]
+    assert record_types.count(OrderFlowRecordType.BID) == 3
+    assert record_types.count(OrderFlowRecordType.CLEARING) == 2
+    assert record_types.count(OrderFlowRecordType.TRADE) == 2
+    assert record_types.count(OrderFlowRecordType.BID_TRADE) == 2
+    first_offer = records[0]
+    assert first_offer.type == OrderFlowRecordType.OFFER
+    assert first_offer.order_id == offer.id
+    assert first_offer.owner == 'S'
+    assert first_offer.energy == offer.energy
+    assert first_offer.price == offer.price
+    assert records[-1].tick == 1
+    split = next(record for record in records if record.type == OrderFlowRecordType.OFFER_SPLIT)
+    assert split.order_id == offer.id
+    assert split.accepted_id == offer.id
+    assert split.residual_id != offer.id
+
+
+def test_order_flow_replay_feeds_recorded_books_to_matcher(order_flow_path):
+    _record_market_session()
+    order_flow_recorder.stop()
+    results = OrderFlowReplay(PayAsBidMatcher()).run(order_flow_path)
+    assert results.clearings == 2
+    assert results.recorded_trades == 2
+    assert results.recorded_traded_energy_kWh == 5
+    # The pay as bid matcher selects the highest bid B2 for the offer at both clearings
+    assert results.recommendations == 2
+    assert results.recommended_energy_kWh == 6
+
+
+def test_create_replay_matcher_rejects_unknown_matchers():
+    assert isinstance(create_replay_matcher("pay_as_bid"), PayAsBidMatcher)
+    assert isinstance(create_replay_matcher(
+        "d3a.models.myco_matcher.pay_as_bid.PayAsBidMatcher"), PayAsBidMatcher)
+    with pytest.raises(ValueError):
+        create_replay_matcher("unknown")
+    with pytest.raises(ValueError):
+        create_replay_matcher("d3a.models.market.order_flow.OrderFlowRecorder")
+    with pytest.raises(ValueError):
+        create_replay_matcher("d3a.models.market.order_flow.order_flow_recorder")
@@ -0,0 +1,75 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+from copy import deepcopy
+
+from d3a_interface.constants_limits import GlobalConfig
+from d3a_interface.read_user_profile import InputProfileTypes
+from pendulum import today
+
+from d3a.constants import TIME_ZONE
+from d3a.d3a_core.profile_store import (
+    ProfileStore, SlotProfile, find_profile_value, writable_profile)
+from d3a.d3a_core.util import d3a_path
+
+START = today(tz=TIME_ZONE)
+
+
+def _profile(rate, slot_count=96):
+    return {START + GlobalConfig.slot_length * slot: rate for slot in range(slot_count)}
+
+
+def test_profile_store_interns_identical_profiles_once():
+    store = ProfileStore()
+    profile = store.intern(_profile(30))
+    assert isinstance(profile, SlotProfile)
+    assert store.intern(_profile(30)) is profile
+    assert store.intern(_profile(25)) is not profile
+    assert len(store) == 2
+    assert profile == _profile(30)
+    assert deepcopy(profile) is profile
+
+
+def test_slot_profile_looks_up_values_on_the_slot_grid():
+    profile = ProfileStore().intern(_profile(30))
+    assert profile[START + GlobalConfig.slot_length * 3] == 30
+    assert find_profile_value(profile, START + GlobalConfig.slot_length * 95) == 30
+    assert profile.get(START + GlobalConfig.slot_length * 96) is None
+    assert START + GlobalConfig.slot_length / 2 not in profile
+
+
+def test_profile_store_leaves_irregular_profiles_unchanged():
+    store = ProfileStore()
+    irregular_profile = {START: 1, START + GlobalConfig.slot_length * 1.5: 2}
+    assert store.intern(irregular_profile) is irregular_profile
+    assert len(store) == 0
+
+
+def test_writable_profile_does_not_change_shared_profile():
+    profile = ProfileStore().intern(_profile(30))
+    changed_profile = writable_profile(profile)
+    changed_profile[START] = 10
+    assert profile[START] == 30
+
+
+def test_profile_store_reads_profile_files_once():
+    store = ProfileStore()
+    profile_path = os.path.join(d3a_path, "resources", "Solar_Curve_W_sunny.csv")
+    profile = store.read(InputProfileTypes.POWER, profile_path)
+    assert isinstance(profile, SlotProfile)
+    assert store.read(InputProfileTypes.POWER, profile_path) is profile
@@ -0,0 +1,63 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from unittest.mock import MagicMock
+
+from pendulum import now
+
+from d3a.d3a_core.random_streams import RandomStreams, random_choice, shuffled
+from d3a.models.area import Area
+from d3a.models.market.one_sided import OneSidedMarket
+from d3a.models.strategy.load_hours import LoadHoursStrategy
+
+
+def test_random_streams_do_not_depend_on_draw_order():
+    streams = RandomStreams(seed=42)
+    first_draws = streams.stream("area:Grid/House 1").random(5)
+    streams.stream("area:Grid/House 2").random(100)
+    assert (streams.stream("area:Grid/House 1").random(5) == first_draws).all()
+    assert (RandomStreams(seed=42).stream("area:Grid/House 1").random(5) == first_draws).all()
+    assert not (RandomStreams(seed=43).stream("area:Grid/House 1").random(5) ==
+                first_draws).all()
+    assert not (streams.stream("area:Grid/House 2").random(5) == first_draws).all()
+
+
+def test_shuffled_returns_a_permutation_of_the_items():
+    rng = RandomStreams(seed=1).stream("test")
+    items = list(range(20))
+    shuffled_items = shuffled(rng, items)
+    assert sorted(shuffled_items) == items
+    assert shuffled(rng, {"a": 1}) == ["a"]
+    assert shuffled(rng, []) == []
+    assert random_choice(rng, items) in items
+
+
+def test_random_stream_keys_differ_for_equally_named_areas_of_different_parents():
+    loads = [Area("Load", strategy=LoadHoursStrategy(avg_power_W=100)) for _ in range(2)]
+    Area("Grid", children=[Area("House 1", children=[loads[0]]),
+                           Area("House 2", children=[loads[1]])])
+    markets = []
+    time_slot = now()
+    for load in loads:
+        # As on the activation of the area
+        load.strategy.owner = load
+        market = OneSidedMarket(bc=MagicMock(), time_slot=time_slot, name=load.name)
+        market.area_random_stream_key = load.random_stream_key
+        markets.append(market)
+    assert loads[0].random_stream_key != loads[1].random_stream_key
+    assert loads[0].strategy.random_stream_key != loads[1].strategy.random_stream_key
+    assert markets[0].random_stream_key != markets[1].random_stream_key
@@ -0,0 +1,114 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from queue import Queue
+from threading import Thread
+from uuid import uuid4
+
+import numpy as np
+import pendulum
+import pytest
+
+from d3a.models.market.blockchain_interface import NonBlockchainInterface
+from d3a.models.market.market_structures import Bid, Offer
+from d3a.models.market.two_sided import TwoSidedMarket
+from d3a.models.myco_matcher.pay_as_bid import PayAsBidMatcher
+from d3a.models.myco_matcher.shared_memory_matcher import (
+    ORDER_DTYPE, SharedMemoryMatcher, SharedOrderBookMirror, _matching_process)
+
+
+@pytest.fixture
+def shared_memory_matcher():
+    matcher = SharedMemoryMatcher()
+    yield matcher
+    matcher.shutdown()
+
+
+def _market_with_orders():
+    market = TwoSidedMarket(bc=NonBlockchainInterface(str(uuid4())), time_slot=pendulum.now())
+    market.offer(5, 5, "S1", "S1")
+    market.offer(9, 3, "S2", "S2")
+    market.bid(4, 2, "B1", "B1")
+    market.bid(9, 3, "B2", "B2")
+    market.bid(2, 2, "S1", "S1")
+    return market
+
+
+def test_calculate_match_recommendation_equals_pay_as_bid(shared_memory_matcher):
+    now = pendulum.now()
+    offers = {"o1": Offer("o1", now, 5, 5, "S1"), "o2": Offer("o2", now, 9, 3, "S2")}
+    bids = {"b1": Bid("b1", now, 4, 2, "B1"), "b2": Bid("b2", now, 12, 3, "B2"),
+            "b3": Bid("b3", now, 2, 2, "S1")}
+    recommendations = shared_memory_matcher.calculate_match_recommendation(bids, offers)
+    expected = PayAsBidMatcher().calculate_match_recommendation(bids, offers)
+    assert sorted((r.bid.id, r.offer.id, r.selected_energy, r.trade_rate)
+                  for r in recommendations) == \
+        sorted((r.bid.id, r.offer.id, r.selected_energy, r.trade_rate) for r in expected)
+
+
+def test_order_book_mirror_grows_with_the_order_books():
+    mirror = SharedOrderBookMirror(capacity=2)
+    try:
+        market = _market_with_orders()
+        owner_ids = {}
+        order_objects = mirror.write([market], owner_ids)
+        assert len(order_objects) == 5
+        assert mirror.capacity >= 5
+        orders = np.ndarray((mirror.capacity, ), dtype=ORDER_DTYPE,
+                            buffer=mirror.shared_memory.buf)[:5]
+        assert orders["is_offer"].sum() == 2
+        assert orders["owner"][2] == orders["owner"][3] == owner_ids["S1"]
+        assert [order.energy for _, order in order_objects] == orders["energy"].tolist()
+    finally:
+        mirror.close()
+
+
+def test_match_markets_settles_recommendations_on_next_tick(shared_memory_matcher):
+    market = _market_with_orders()
+    shared_memory_matcher.match_markets("area", [market])
+    assert market.trades == []
+    shared_memory_matcher.match_markets("area", [market])
+    assert len(market.trades) == 2
+    assert {trade.buyer for trade in market.trades} == {"B1", "B2"}
+
+
+def test_match_markets_drops_recommendations_of_changed_orders(shared_memory_matcher):
+    market = _market_with_orders()
+    shared_memory_matcher.match_markets("area", [market])
+    for bid in list(market.bids.values()):
+        market.delete_bid(bid)
+    shared_memory_matcher.match_markets("area", [market])
+    assert market.trades == []
+
+
+def test_matching_process_attaches_the_new_block_of_a_grown_mirror():
+    mirror = SharedOrderBookMirror(capacity=8)
+    request_queue, result_queue = Queue(), Queue()
+    process = Thread(target=_matching_process, args=(request_queue, result_queue))
+    process.start()
+    try:
+        market = _market_with_orders()
+        request_queue.put((1, "area", mirror.name, len(mirror.write([market], {}))))
+        assert len(result_queue.get(timeout=10)[1]) == 2
+        market.offer(1, 1, "S3", "S3")
+        mirror._allocate(16)
+        request_queue.put((2, "area", mirror.name, len(mirror.write([market], {}))))
+        assert len(result_queue.get(timeout=10)[1]) == 3
+    finally:
+        request_queue.put(None)
+        process.join()
+        mirror.close()
@@ -189,6 +189,22 @@ def test_offers_partial_offer(offer1, offers3):
     assert accepted_offer in offers3.sold_in_market('market')
 
 
+def test_offers_keep_market_index_and_energy_up_to_date(offer1, offers3):
+    assert offers3.is_offer_posted('market', 'id2')
+    assert not offers3.is_offer_posted('market2', 'id2')
+    assert offers3.posted_offer_energy('market') == 4
+    offers3.sold_offer(offer1, 'market')
+    assert offers3.open_in_market('market') == [offers3.posted_in_market('market')[1]]
+    assert offers3.sold_offer_energy('market') == 3
+    market = FakeMarket(raises=False, id='market')
+    market.delete_offer = MagicMock()
+    assert offers3.remove_offer_from_cache_and_market(market, 'id2') == ['id2']
+    assert not offers3.is_offer_posted('market', 'id2')
+    assert offers3.posted_offer_energy('market') == 3
+    offers3.sold['market'] = []
+    assert offers3.sold_offer_energy('market') == 0
+
+
 @pytest.fixture
 def offer_to_accept():
     return Offer('new', pendulum.now(), 1.0, 0.5, 'someone')
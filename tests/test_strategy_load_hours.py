@@ -19,7 +19,7 @@ import os
 import unittest
 from copy import deepcopy
 from math import isclose
-from unittest.mock import MagicMock, Mock
+from unittest.mock import MagicMock, Mock, patch
 from uuid import uuid4
 
 import pytest
@@ -576,6 +576,23 @@ def test_load_hour_strategy_increases_rate_when_fit_to_limit_is_false(market_tes
     assert all([rate == -10 for rate in load.bid_update.energy_rate_change_per_update.values()])
 
 
+def test_load_hour_strategy_rate_schedule_follows_reconfigured_rates():
+    load = LoadHoursStrategy(avg_power_W=100, initial_buying_rate=0, final_buying_rate=30,
+                             fit_to_limit=False, energy_rate_increase_per_update=10,
+                             update_interval=5)
+    load.area = FakeArea()
+    load.owner = load.area
+    load.event_activate()
+    load.bid_update.update_counter[TIME] = 2
+    assert load.bid_update.get_updated_rate(TIME) == 20
+    load.bid_update.update_counter[TIME] = 100
+    assert load.bid_update.get_updated_rate(TIME) == 30
+
+    load.area_reconfigure_event(energy_rate_increase_per_update=5)
+    load.bid_update.update_counter[TIME] = 2
+    assert load.bid_update.get_updated_rate(TIME) == 10
+
+
 @pytest.fixture
 def load_hours_strategy_test3(area_test1):
     load = LoadHoursStrategy(avg_power_W=100)
@@ -593,3 +610,45 @@ def test_assert_if_trade_rate_is_higher_than_bid_rate(load_hours_strategy_test3)
 
     with pytest.raises(AssertionError):
         load_hours_strategy_test3.event_trade(market_id=market_id, trade=trade)
+
+
+def _load_with_queued_offer_market():
+    strategy = LoadHoursStrategy(avg_power_W=100)
+    strategy.area = MagicMock()
+    strategy.owner = MagicMock()
+    market = MagicMock(time_slot=TIME)
+    strategy.area.all_markets = [market]
+    strategy._cycled_market = {TIME}
+    strategy._can_buy_in_market = MagicMock(return_value=True)
+    strategy._one_sided_market_event_tick = MagicMock()
+    # The load still needs energy after buying an offer
+    strategy.hrs_per_day = {0: 4}
+    strategy.bid_update.get_updated_rate = MagicMock(return_value=30)
+    strategy.state.get_energy_requirement_Wh = MagicMock(return_value=100)
+    return strategy, market
+
+
+@pytest.mark.parametrize("disable", [
+    lambda s: setattr(s, "enabled", False),
+    lambda s: setattr(s.area.events, "is_enabled", False),
+    lambda s: setattr(s.owner.events, "is_enabled", False),
+    lambda s: setattr(s.owner.events, "is_connected", False)])
+def test_load_does_not_buy_queued_offers_while_it_does_not_trade(disable):
+    strategy, market = _load_with_queued_offer_market()
+    offer = Offer("id", now(), 1, 0.1, "A")
+    strategy.accept_queued_offer(market, offer)
+    strategy._one_sided_market_event_tick.assert_called_once_with(market, offer)
+    market.demand_queue.register.assert_called_once_with(strategy, 30, 0.1)
+
+    strategy._one_sided_market_event_tick.reset_mock()
+    disable(strategy)
+    strategy.accept_queued_offer(market, offer)
+    strategy._one_sided_market_event_tick.assert_not_called()
+    market.demand_queue.unregister.assert_called_once_with(strategy)
+
+
+def test_load_leaves_the_demand_queues_when_disabled():
+    strategy, market = _load_with_queued_offer_market()
+    with patch("d3a.models.strategy.load_hours.is_demand_queue_enabled", return_value=True):
+        strategy.trigger_disable()
+    market.demand_queue.unregister.assert_called_once_with(strategy)
@@ -22,6 +22,7 @@ from logging import getLogger
 from math import isclose
 from copy import deepcopy
 from uuid import uuid4
+from unittest.mock import patch
 
 from d3a_interface.constants_limits import ConstSettings
 from d3a_interface.exceptions import D3ADeviceException
@@ -31,7 +32,8 @@ from d3a.d3a_core.util import change_global_config
 from d3a.constants import TIME_ZONE
 from d3a.models.market.market_structures import Offer, Trade, BalancingOffer, Bid
 from d3a.models.strategy.storage import StorageStrategy
-from d3a.models.state import EnergyOrigin, ESSEnergyOrigin
+from d3a.models.state import (
+    EnergyOrigin, ESSEnergyOrigin, SlotSeries, StorageState, accumulated_energy)
 from d3a.models.config import SimulationConfig
 from d3a.constants import TIME_FORMAT, FLOATING_POINT_TOLERANCE
 from d3a.d3a_core.device_registry import DeviceRegistry
@@ -894,3 +896,66 @@ def test_assert_if_trade_rate_is_higher_than_bid_rate(storage_test11):
 
     with pytest.raises(AssertionError):
         storage_test11.event_trade(market_id=market_id, trade=trade)
+
+
+def test_storage_state_keeps_energy_totals_up_to_date():
+    state = StorageState(initial_soc=50, capacity=10)
+    time_slots = [DateTime.now(tz=TIME_ZONE).add(minutes=15 * i) for i in range(3)]
+    state.add_default_values_to_state_profiles(time_slots)
+    state.set_battery_energy_per_slot(Duration(minutes=15))
+    state.offered_buy_kWh[time_slots[0]] += 1.5
+    state.offered_buy_kWh[time_slots[1]] = 0.5
+    state.pledged_buy_kWh[time_slots[2]] += 1
+    assert state.offered_buy_kWh.total == 2
+    state.offered_buy_kWh.pop(time_slots[0])
+    assert state.offered_buy_kWh.total == 0.5
+    state.offered_buy_kWh[time_slots[0]] = 0
+    energy = state.clamp_energy_to_buy_kWh_for_slot(time_slots[0], time_slots)
+    state.clamp_energy_to_buy_kWh(time_slots)
+    assert energy > 0
+    assert energy == state.energy_to_buy_dict[time_slots[0]]
+
+
+def test_storage_state_deletes_past_slot_values():
+    state = StorageState(initial_soc=50, capacity=10)
+    time_slots = [DateTime.now(tz=TIME_ZONE).start_of("day").add(minutes=15 * i)
+                  for i in range(4)]
+    state.add_default_values_to_state_profiles(time_slots)
+    state.pledged_sell_kWh[time_slots[0]] = 1
+    state.pledged_sell_kWh[time_slots[3]] = 2
+    assert isinstance(state.pledged_sell_kWh, SlotSeries)
+    state.delete_past_state_values(time_slots[2])
+    assert state.pledged_sell_kWh == {time_slots[2]: 0, time_slots[3]: 2}
+    assert state.pledged_sell_kWh.total == 2
+    assert list(state.charge_history.keys()) == time_slots[2:]
+    assert list(state.used_history.keys()) == time_slots[2:]
+
+
+def test_storage_state_accumulates_open_slots_from_the_total_after_market_cycle():
+    state = StorageState(initial_soc=50, capacity=10)
+    time_slots = [DateTime.now(tz=TIME_ZONE).start_of("day").add(minutes=15 * i)
+                  for i in range(4)]
+    state.add_default_values_to_state_profiles(time_slots)
+    state.pledged_sell_kWh[time_slots[0]] = 1
+    state.pledged_sell_kWh[time_slots[1]] = 2
+    state.pledged_sell_kWh[time_slots[3]] = 0.5
+    state.market_cycle(time_slots[0], time_slots[1], time_slots[2:])
+    state.delete_past_state_values(time_slots[1])
+    # The slot of the current market is kept besides the open ones
+    assert list(state.pledged_sell_kWh.keys()) == time_slots[1:]
+    with patch.object(SlotSeries, "__getitem__", side_effect=AssertionError):
+        assert accumulated_energy(state.pledged_sell_kWh, time_slots[2:]) == 0.5
+
+
+def test_storage_state_keeps_the_type_of_slot_values():
+    state = StorageState(initial_soc=50, capacity=10)
+    time_slots = [DateTime.now(tz=TIME_ZONE).start_of("day").add(minutes=15 * i)
+                  for i in range(2)]
+    state.add_default_values_to_state_profiles(time_slots)
+    assert state.charge_history[time_slots[0]] == 50
+    assert isinstance(state.charge_history[time_slots[0]], int)
+    state.charge_history[time_slots[0]] = 42.5
+    assert isinstance(state.charge_history[time_slots[0]], float)
+    assert state.charge_history.total == 92.5
+    state.charge_history.pop(time_slots[1])
+    assert state.charge_history.total == 42.5
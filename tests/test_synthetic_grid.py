@@ -0,0 +1,87 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import json
+
+import pytest
+
+from d3a.d3a_core.area_serializer import area_to_string, are_all_areas_unique
+from d3a.d3a_core.synthetic_grid import (
+    SyntheticGridException, SyntheticGridOptions, create_synthetic_grid, parse_device_mix)
+
+
+def _depth(area):
+    return max((_depth(child) for child in area.children), default=0) + 1
+
+
+def _devices(area):
+    if area.strategy is not None:
+        return [area]
+    return [device for child in area.children for device in _devices(child)]
+
+
+@pytest.mark.parametrize("depth", [2, 3, 5, 8])
+def test_synthetic_grid_has_the_configured_shape(depth):
+    options = SyntheticGridOptions(communities=6, houses_per_community=4, depth=depth,
+                                   device_mix={"load": 1, "pv": 1})
+    grid = create_synthetic_grid(options)
+    # The device level is below the configured levels
+    assert _depth(grid) == depth + 1
+    assert are_all_areas_unique(grid, set())
+    # Plus the commercial producer
+    assert len(_devices(grid)) == 6 * 4 * 2 + 1
+
+
+def test_synthetic_grid_is_reproducible_and_serializable():
+    options = SyntheticGridOptions(communities=2, houses_per_community=3, depth=4,
+                                   device_mix=parse_device_mix("load=1,pv=0.5,storage=0.5"))
+    grid_string = area_to_string(create_synthetic_grid(options))
+    grid = json.loads(grid_string)
+    assert grid["name"] == "Grid"
+    assert grid_string.count('"type": "LoadHoursStrategy"') == 6
+
+    def _strip_uuids(area_dict):
+        area_dict.pop("uuid", None)
+        for child in area_dict.get("children", []):
+            _strip_uuids(child)
+        return area_dict
+    assert (_strip_uuids(json.loads(area_to_string(create_synthetic_grid(options)))) ==
+            _strip_uuids(grid))
+
+
+def test_synthetic_grid_options_are_read_from_the_environment():
+    options = SyntheticGridOptions.from_environment({
+        "D3A_SYNTHETIC_GRID_COMMUNITIES": "50",
+        "D3A_SYNTHETIC_GRID_DEPTH": "6",
+        "D3A_SYNTHETIC_GRID_DEVICE_MIX": "pv=2,storage=0.1"})
+    assert options.communities == 50
+    assert options.depth == 6
+    assert options.device_mix == {"pv": 2, "storage": 0.1}
+    assert options.houses_per_community == SyntheticGridOptions().houses_per_community
+
+
+@pytest.mark.parametrize("options", [
+    SyntheticGridOptions(depth=1), SyntheticGridOptions(depth=9),
+    SyntheticGridOptions(communities=0), SyntheticGridOptions(market_type=4)])
+def test_synthetic_grid_rejects_invalid_options(options):
+    with pytest.raises(SyntheticGridException):
+        create_synthetic_grid(options)
+
+
+def test_parse_device_mix_rejects_unknown_device_types():
+    with pytest.raises(SyntheticGridException):
+        parse_device_mix("load=1,ev=1")
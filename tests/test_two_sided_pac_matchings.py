@@ -16,9 +16,17 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 import unittest
+from uuid import uuid4
+
 import pendulum
 from parameterized import parameterized
-from d3a.models.market.market_structures import Bid, Offer, BidOfferMatch, Trade
+from d3a.d3a_core.exceptions import (
+    InvalidBidOfferPair, MarketReadOnlyException, OfferNotFoundException)
+from d3a.events.event_structures import MarketEvent
+from d3a.models.market.blockchain_interface import NonBlockchainInterface
+from d3a.models.market.grid_fees.base_model import GridFees
+from d3a.models.market.grid_fees.constant_grid_fees import ConstantGridFees
+from d3a.models.market.market_structures import Bid, Offer, BidOfferMatch, TradeBidOfferInfo
 from d3a.models.market.two_sided import TwoSidedMarket
 from d3a.models.myco_matcher.pay_as_clear import PayAsClearMatcher
 
@@ -214,45 +222,95 @@ class TestCreateBidOfferMatchings(unittest.TestCase):
         self.validate_matching(matchings[3], 4, 'offer_id3', 'bid_id')
         self.validate_matching(matchings[4], 5, 'offer_id4', 'bid_id')
 
-    def test_matching_list_gets_updated_with_residual_offers(self):
+    def _create_market_with_orders(self):
+        market = TwoSidedMarket(bc=NonBlockchainInterface(str(uuid4())),
+                                time_slot=pendulum.now())
+        offer = market.offer(5, 5, 'S', 'S')
+        bid1 = market.bid(4, 2, 'B1', 'B1')
+        bid2 = market.bid(6, 3, 'B2', 'B2')
+        return market, offer, bid1, bid2
+
+    def test_match_recommendation_resolves_residual_offers(self):
+        market, offer, bid1, bid2 = self._create_market_with_orders()
         matchings = [
-            BidOfferMatch(offer=Offer('offer_id', pendulum.now(), 1, 1, 'S'), selected_energy=1,
-                          bid=Bid('bid_id', pendulum.now(), 1, 1, 'B', 'S'), trade_rate=1),
-            BidOfferMatch(offer=Offer('offer_id2', pendulum.now(), 2, 2, 'S'), selected_energy=2,
-                          bid=Bid('bid_id2', pendulum.now(), 2, 2, 'B', 'S'), trade_rate=1)
+            BidOfferMatch(offer=offer, selected_energy=2, bid=bid1, trade_rate=2),
+            BidOfferMatch(offer=offer, selected_energy=3, bid=bid2, trade_rate=2),
         ]
-
-        offer_trade = Trade('trade', 1, Offer('offer_id', pendulum.now(), 1, 1, 'S'), 'S', 'B',
-                            residual=Offer('residual_offer', pendulum.now(), 0.5, 0.5, 'S'))
-        bid_trade = Trade('bid_trade', 1, Bid('bid_id2', pendulum.now(), 1, 1, 'S', 'B'), 'S', 'B',
-                          residual=Bid('residual_bid_2', pendulum.now(), 1, 1, 'S', 'B'))
-
-        matchings = TwoSidedMarket._replace_offers_bids_with_residual_in_matching_list(
-            matchings, 0, offer_trade, bid_trade
-        )
-        assert len(matchings) == 2
-        assert matchings[0].offer.id == 'residual_offer'
-        assert matchings[1].bid.id == 'residual_bid_2'
-
-    def test_matching_list_affects_only_matches_after_start_index(self):
+        trades = market.match_recommendation(matchings)
+        assert len(trades) == 2
+        assert trades[0][1].offer.id == offer.id
+        assert trades[0][1].residual is not None
+        assert trades[1][1].offer.id == trades[0][1].residual.id
+        assert trades[1][1].residual is None
+        assert market.offers == {}
+        assert market.bids == {}
+        assert len(market.trades) == 2
+        assert market.accumulated_trade_energy == 5
+
+    def test_match_recommendation_dispatches_notifications_after_settlement(self):
+        market, offer, bid1, bid2 = self._create_market_with_orders()
+        events = []
+
+        def listener(event, market_id, **kwargs):
+            # All matches have been settled when the first notification arrives
+            assert market.offers == {}
+            events.append(event)
+
+        market.add_listener(listener)
+        market.match_recommendation([
+            BidOfferMatch(offer=offer, selected_energy=2, bid=bid1, trade_rate=2),
+            BidOfferMatch(offer=offer, selected_energy=3, bid=bid2, trade_rate=2),
+        ])
+        assert events == [MarketEvent.OFFER_SPLIT, MarketEvent.TRADE, MarketEvent.BID_TRADED,
+                          MarketEvent.TRADE, MarketEvent.BID_TRADED]
+
+    def test_match_recommendation_rejects_overcommitted_offer(self):
+        market, offer, bid1, bid2 = self._create_market_with_orders()
         matchings = [
-            BidOfferMatch(offer=Offer('offer_id', pendulum.now(), 1, 1, 'S'), selected_energy=1,
-                          bid=Bid('bid_id', pendulum.now(), 1, 1, 'B', 'S'), trade_rate=1),
-            BidOfferMatch(offer=Offer('offer_id2', pendulum.now(), 2, 2, 'S'), selected_energy=2,
-                          bid=Bid('bid_id2', pendulum.now(), 2, 2, 'B', 'S'), trade_rate=1),
-            BidOfferMatch(offer=Offer('offer_id', pendulum.now(), 1, 1, 'S'), selected_energy=1,
-                          bid=Bid('bid_id', pendulum.now(), 1, 1, 'B', 'S'), trade_rate=1)
+            BidOfferMatch(offer=offer, selected_energy=2, bid=bid1, trade_rate=2),
+            BidOfferMatch(offer=offer, selected_energy=3, bid=bid2, trade_rate=2),
+            BidOfferMatch(offer=offer, selected_energy=1, bid=bid2, trade_rate=2),
         ]
+        with self.assertRaises(InvalidBidOfferPair):
+            market.match_recommendation(matchings)
+        # No match of the list has been settled
+        assert list(market.offers.values()) == [offer]
+        assert set(market.bids.values()) == {bid1, bid2}
+        assert market.trades == []
+
+    def test_match_recommendation_rejects_unknown_orders_before_settlement(self):
+        market, offer, bid1, bid2 = self._create_market_with_orders()
+        events = []
+        market.add_listener(lambda event, market_id, **kwargs: events.append(event))
+        matchings = [
+            BidOfferMatch(offer=offer, selected_energy=2, bid=bid1, trade_rate=2),
+            BidOfferMatch(offer=Offer("unknown", pendulum.now(), 1, 1, "S"), selected_energy=1,
+                          bid=bid2, trade_rate=2),
+        ]
+        with self.assertRaises(OfferNotFoundException):
+            market.match_recommendation(matchings)
+        assert market.trades == []
+        assert events == []
+
+    def test_match_recommendation_is_rejected_by_readonly_market(self):
+        market, offer, bid1, _ = self._create_market_with_orders()
+        market.readonly = True
+        with self.assertRaises(MarketReadOnlyException):
+            market.match_recommendation([
+                BidOfferMatch(offer=offer, selected_energy=2, bid=bid1, trade_rate=2)])
+        assert market.trades == []
 
-        offer_trade = Trade('trade', 1, Offer('offer_id', pendulum.now(), 1, 1, 'S'), 'S', 'B',
-                            residual=Offer('residual_offer', pendulum.now(), 0.5, 0.5, 'S'))
-        bid_trade = Trade('bid_trade', 1, Bid('bid_id2', pendulum.now(), 1, 1, 'S', 'B'), 'S', 'B',
-                          residual=Bid('residual_bid_2', pendulum.now(), 1, 1, 'S', 'B'))
-
-        matchings = TwoSidedMarket._replace_offers_bids_with_residual_in_matching_list(
-            matchings, 1, offer_trade, bid_trade
-        )
-        assert len(matchings) == 3
-        assert matchings[0].offer.id == 'offer_id'
-        assert matchings[1].bid.id == 'residual_bid_2'
-        assert matchings[2].offer.id == 'residual_offer'
+    @parameterized.expand([
+        (GridFees(0.1), ),
+        (ConstantGridFees(0.5), ),
+    ])
+    def test_bulk_trade_fees_equal_trade_fees_per_match(self, fee_class):
+        infos = [TradeBidOfferInfo(30, 28, 10, 12, 30),
+                 TradeBidOfferInfo(25, 25, 0, 0, 25),
+                 TradeBidOfferInfo(0, 0, 5, 5.5, 0)]
+        bulk_results = fee_class.calculate_trade_price_and_fees_bulk(
+            *zip(*((i.original_bid_rate, i.propagated_bid_rate, i.original_offer_rate,
+                    i.propagated_offer_rate, i.trade_rate) for i in infos)))
+        for index, info in enumerate(infos):
+            expected = fee_class.calculate_trade_price_and_fees(info)
+            assert tuple(r[index] for r in bulk_results) == tuple(expected)
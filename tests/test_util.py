@@ -16,10 +16,12 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 from d3a.d3a_core.cli import available_simulation_scenarios
-from d3a.d3a_core.util import validate_const_settings_for_simulation
+from d3a.d3a_core.util import (
+    ShortLogStr, short_offer_bid_log_str, validate_const_settings_for_simulation)
 from d3a_interface.constants_limits import ConstSettings
 from d3a import setup as d3a_setup
 import os
+from unittest.mock import MagicMock
 from parameterized import parameterized
 import pytest
 
@@ -64,3 +66,10 @@ def test_validate_one_sided_market_when_pricing_scheme_on_comparison(market_type
     assert ConstSettings.IAASettings.MARKET_TYPE == 1
     assert ConstSettings.IAASettings.AlternativePricing.PRICING_SCHEME == alt_pricing
     assert ConstSettings.IAASettings.AlternativePricing.COMPARE_PRICING_SCHEMES
+
+
+def test_short_log_str_is_only_formatted_when_converted_to_str():
+    offer = MagicMock(id="0123456789", energy=1.5)
+    log_str = ShortLogStr(offer)
+    offer.energy = 2
+    assert str(log_str) == short_offer_bid_log_str(offer) == "({012345}: 2 kWh)"